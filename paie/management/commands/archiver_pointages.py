@@ -0,0 +1,42 @@
+# paie/management/commands/archiver_pointages.py
+# Archivage mensuel des pointages au-delà de la durée de rétention
+
+from django.core.management.base import BaseCommand
+
+from paie.services.archivage_pointage import ArchiveurPointages
+
+
+class Command(BaseCommand):
+    help = 'Archive sur disque les pointages plus anciens que l\'horizon de rétention puis les supprime'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--horizon-mois',
+            type=int,
+            default=None,
+            help='Nombre de mois conservés en base (défaut: CLEANUP_OLD_DATA_MONTHS)',
+        )
+        parser.add_argument(
+            '--simulation',
+            action='store_true',
+            help='Lister les mois concernés sans rien écrire ni supprimer',
+        )
+
+    def handle(self, *args, **options):
+        resultat = ArchiveurPointages().archiver(
+            horizon_mois=options['horizon_mois'],
+            simulation=options['simulation']
+        )
+
+        for mois in resultat['mois']:
+            ligne = f"{mois['mois']} : {mois['statut']} - {mois['nb_pointages']} pointage(s)"
+            if mois['statut'] == 'IGNORE':
+                self.stdout.write(self.style.WARNING(
+                    f"{ligne}, {mois['jours_non_valides']} jour(s) sans présence validée"
+                ))
+            else:
+                self.stdout.write(ligne)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultat['nb_supprimes']} pointage(s) archivé(s), {resultat['nb_mois_ignores']} mois ignoré(s)"
+        ))
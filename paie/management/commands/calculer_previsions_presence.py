@@ -0,0 +1,17 @@
+# paie/management/commands/calculer_previsions_presence.py
+# Recalcul nocturne des prévisions de présence (préchauffe le cache du jour)
+
+from django.core.management.base import BaseCommand
+
+from paie.services.prevision_presence import PrevisionPresence
+
+
+class Command(BaseCommand):
+    help = 'Recalcule les prévisions de présence par département et les met en cache pour la journée'
+
+    def handle(self, *args, **options):
+        previsions = PrevisionPresence().calculer()
+        self.stdout.write(self.style.SUCCESS(
+            f"Prévisions calculées sur {previsions['nb_jours']} jours pour "
+            f"{len(previsions['departements'])} département(s)"
+        ))
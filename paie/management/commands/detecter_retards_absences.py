@@ -0,0 +1,47 @@
+# paie/management/commands/detecter_retards_absences.py
+# Détection planifiée des retards et absences (à lancer toutes les quelques minutes)
+
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from paie.services.gestionnaire_pointage import GestionnairePointage
+
+
+class Command(BaseCommand):
+    help = 'Détecte les retards et absences du jour et crée les alertes de présence'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            help='Date à analyser au format YYYY-MM-DD (défaut: aujourd\'hui)',
+        )
+        parser.add_argument(
+            '--sans-alertes',
+            action='store_true',
+            help='Afficher le résultat sans créer d\'AlertePresence',
+        )
+
+    def handle(self, *args, **options):
+        date_detection = None
+        if options['date']:
+            try:
+                date_detection = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('Format de date invalide (YYYY-MM-DD)')
+
+        gestionnaire = GestionnairePointage()
+        resultat = gestionnaire.detecter_retards_absences(
+            date_detection,
+            creer_alertes=not options['sans_alertes']
+        )
+
+        self.stdout.write(
+            f"{resultat['date']:%d/%m/%Y} - {resultat['total_employes']} employés planifiés : "
+            f"{resultat['nb_presents']} présents, {resultat['nb_retards']} retards, "
+            f"{resultat['nb_absences']} absences"
+        )
+        if 'nb_alertes_creees' in resultat:
+            self.stdout.write(
+                self.style.SUCCESS(f"{resultat['nb_alertes_creees']} alerte(s) créée(s)")
+            )
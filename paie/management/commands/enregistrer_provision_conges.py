@@ -0,0 +1,41 @@
+# paie/management/commands/enregistrer_provision_conges.py
+# Instantané mensuel de la provision pour congés payés (clôture comptable)
+
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from paie.services.provision_conges import enregistrer_instantane
+
+
+class Command(BaseCommand):
+    help = 'Calcule et enregistre la provision pour congés payés d\'un mois (par département et site)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--annee',
+            type=int,
+            default=None,
+            help='Année de l\'arrêté (défaut: mois précédent)',
+        )
+        parser.add_argument(
+            '--mois',
+            type=int,
+            default=None,
+            help='Mois de l\'arrêté, 1 à 12 (défaut: mois précédent)',
+        )
+
+    def handle(self, *args, **options):
+        aujourd_hui = date.today()
+        mois_precedent = aujourd_hui.month - 1 or 12
+        annee = options['annee'] or (aujourd_hui.year if aujourd_hui.month > 1 else aujourd_hui.year - 1)
+        mois = options['mois'] or mois_precedent
+        if not 1 <= mois <= 12:
+            raise CommandError('Le mois doit être compris entre 1 et 12')
+
+        calcul = enregistrer_instantane(annee, mois)
+        total = calcul.total()
+        self.stdout.write(self.style.SUCCESS(
+            f"Provision congés au {calcul.date_arrete}: {total['montant']} pour "
+            f"{total['jours_restants']} jour(s) restant(s), {total['nb_employes']} employé(s)"
+        ))
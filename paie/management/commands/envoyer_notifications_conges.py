@@ -0,0 +1,69 @@
+# paie/management/commands/envoyer_notifications_conges.py
+# Worker de la boîte d'envoi des notifications de congés
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from paie.services.gestionnaire_pointage import get_parametre_pointage
+from paie.services.notifications_conges import envoyer_lot, get_metriques_notifications
+
+
+class Command(BaseCommand):
+    help = "Envoie les notifications de congés en attente (un email par destinataire et par lot)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--continu',
+            action='store_true',
+            help='Tourner en boucle (worker) au lieu de vider la boîte d\'envoi une fois',
+        )
+        parser.add_argument(
+            '--intervalle',
+            type=float,
+            default=10.0,
+            help='Attente en secondes quand rien n\'est à envoyer (mode continu)',
+        )
+        parser.add_argument(
+            '--lot',
+            type=int,
+            default=None,
+            help='Nombre de notifications par lot (défaut: BATCH_SIZE)',
+        )
+        parser.add_argument(
+            '--statut',
+            action='store_true',
+            help='Afficher uniquement le backlog de la boîte d\'envoi',
+        )
+
+    def handle(self, *args, **options):
+        if options['statut']:
+            self._afficher_metriques()
+            return
+
+        taille_lot = options['lot'] or get_parametre_pointage('BATCH_SIZE')
+
+        while True:
+            resultat = envoyer_lot(taille_lot)
+            if resultat['envoyees'] or resultat['echecs']:
+                self.stdout.write(
+                    f"{resultat['envoyees']} notification(s) envoyée(s) en {resultat['emails']} email(s), "
+                    f"{resultat['echecs']} en échec, {resultat['restantes']} restante(s)"
+                )
+
+            if resultat['restantes'] and resultat['envoyees']:
+                continue
+            if not options['continu']:
+                break
+            time.sleep(options['intervalle'])
+
+        self._afficher_metriques()
+
+    def _afficher_metriques(self):
+        metriques = get_metriques_notifications()
+        message = (
+            f"Notifications congés : {metriques['en_attente']} en attente dont {metriques['en_reprise']} en reprise "
+            f"(retard {metriques['retard_secondes']:.0f}s), {metriques['en_echec']} en échec définitif"
+        )
+        style = self.style.WARNING if metriques['en_echec'] or metriques['en_reprise'] else self.style.SUCCESS
+        self.stdout.write(style(message))
@@ -0,0 +1,47 @@
+# paie/management/commands/initialiser_jours_feries.py
+# Initialisation du calendrier des jours fériés marocains
+
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from paie.models import JourFerie, Site
+from paie.services.calendrier_ouvrable import FERIES_FIXES_MAROC, estimer_feries_mobiles
+
+
+class Command(BaseCommand):
+    help = 'Crée les jours fériés fixes marocains et, pour une année, une estimation des fériés religieux'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--annee', type=int, help='Année des fériés religieux à estimer')
+        parser.add_argument('--site', type=int, help='ID du site (défaut: fériés nationaux)')
+
+    def handle(self, *args, **options):
+        site = None
+        if options['site']:
+            site = Site.objects.filter(id=options['site']).first()
+            if site is None:
+                raise CommandError(f"Site {options['site']} introuvable")
+
+        nb_crees = 0
+        for mois, jour, nom in FERIES_FIXES_MAROC:
+            # Année de référence bissextile : seuls le jour et le mois comptent
+            _, cree = JourFerie.objects.get_or_create(
+                nom=nom, type_ferie='FIXE', site=site,
+                defaults={'date': date(2000, mois, jour)}
+            )
+            nb_crees += cree
+
+        if options['annee']:
+            for jour, nom in estimer_feries_mobiles(options['annee']):
+                _, cree = JourFerie.objects.get_or_create(
+                    nom=nom, type_ferie='MOBILE', site=site, date__year=options['annee'],
+                    defaults={'date': jour}
+                )
+                nb_crees += cree
+            self.stdout.write(self.style.WARNING(
+                'Dates des fériés religieux estimées (calendrier hégirien tabulaire) : '
+                'à confirmer après l\'annonce officielle'
+            ))
+
+        self.stdout.write(self.style.SUCCESS(f"{nb_crees} jour(s) férié(s) créé(s)"))
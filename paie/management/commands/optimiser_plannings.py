@@ -0,0 +1,60 @@
+# paie/management/commands/optimiser_plannings.py
+# Optimisation mensuelle des affectations de plages horaires
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from paie.services.optimiseur_plannings import OptimiseurPlannings
+
+
+class Command(BaseCommand):
+    help = 'Affecte les plages horaires du mois en minimisant les heures sup sous contrainte de couverture'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--annee', type=int, required=True)
+        parser.add_argument('--mois', type=int, required=True)
+        parser.add_argument('--departement', type=int, help='ID du département à optimiser')
+        parser.add_argument(
+            '--couverture',
+            help='Fichier JSON {departement_id: {plage_horaire_id: nb_minimum}}'
+        )
+        parser.add_argument('--appliquer', action='store_true', help='Enregistrer les affectations')
+
+    def handle(self, *args, **options):
+        couverture = None
+        if options['couverture']:
+            try:
+                with open(options['couverture'], encoding='utf-8') as fichier:
+                    couverture = json.load(fichier)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Couverture illisible: {e}")
+
+        optimiseur = OptimiseurPlannings(
+            options['annee'], options['mois'],
+            couverture=couverture,
+            departement_id=options['departement']
+        )
+        resultat = optimiseur.optimiser()
+        avant, apres = resultat['avant'], resultat['apres']
+
+        self.stdout.write(
+            f"{resultat['periode']}: {resultat['nb_employes']} employés, {resultat['nb_plages']} plages, "
+            f"{resultat['nb_passes']} passes en {resultat['duree_secondes']}s"
+        )
+        self.stdout.write(
+            f"Heures sup {avant['heures_sup']} -> {apres['heures_sup']}, "
+            f"déficit de couverture {avant['deficit_couverture']} -> {apres['deficit_couverture']}, "
+            f"{resultat['nb_changements']} changement(s)"
+        )
+
+        if options['appliquer']:
+            ecriture = optimiseur.appliquer()
+            self.stdout.write(self.style.SUCCESS(
+                f"{ecriture['nb_crees']} horaire(s) créé(s), {ecriture['nb_modifies']} modifié(s), "
+                f"{ecriture['nb_reportes']} reporté(s) après le mois, {ecriture['nb_termines']} terminé(s)"
+            ))
+            if ecriture['nb_ignores']:
+                self.stdout.write(self.style.WARNING(
+                    f"{ecriture['nb_ignores']} employé(s) ignoré(s) : mois déjà couvert par des présences"
+                ))
@@ -0,0 +1,37 @@
+# paie/management/commands/recalculer_soldes_conges.py
+# Écriture périodique des acquisitions et recalcul des soldes de congés de toute l'entreprise
+
+from django.core.management.base import BaseCommand
+
+from paie.models import Employee
+from paie.services.gestionnaire_conges import GestionnaireConges
+
+
+class Command(BaseCommand):
+    help = 'Poste au journal les acquisitions, reports et régularisations de l\'année et met à jour les soldes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--annee', type=int, help='Année à recalculer (défaut: année courante)')
+        parser.add_argument('--departement', type=int, help='ID du département à recalculer')
+        parser.add_argument(
+            '--nouveaux',
+            action='store_true',
+            help='N\'ouvrir que les soldes inexistants',
+        )
+
+    def handle(self, *args, **options):
+        employes = Employee.objects.filter(is_active=True)
+        if options['departement']:
+            employes = employes.filter(department_id=options['departement'])
+
+        resultat = GestionnaireConges().recalculer_soldes_lot(
+            options['annee'],
+            employes=employes,
+            forcer=not options['nouveaux']
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultat['nb_employes']} employé(s): {resultat['nb_crees']} solde(s) créé(s), "
+            f"{resultat['nb_modifies']} modifié(s), {resultat['nb_conserves']} conservé(s), "
+            f"{resultat['nb_mouvements']} mouvement(s) posté(s)"
+        ))
@@ -0,0 +1,42 @@
+# paie/management/commands/reconstruire_statistiques_presence.py
+# Reconstruction des agrégats quotidiens de présence (reprise d'historique, changement d'affectation)
+
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from paie.services.statistiques_presence import reconstruire_statistiques
+
+
+class Command(BaseCommand):
+    help = 'Recalcule les statistiques quotidiennes de présence (département, site) d\'une période'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--debut', required=True, help='Date de début (YYYY-MM-DD)')
+        parser.add_argument('--fin', required=True, help='Date de fin incluse (YYYY-MM-DD)')
+        parser.add_argument(
+            '--jours-par-lot',
+            type=int,
+            default=31,
+            help='Nombre de jours recalculés par transaction (défaut: 31)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            date_debut = datetime.strptime(options['debut'], '%Y-%m-%d').date()
+            date_fin = datetime.strptime(options['fin'], '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError('Format de date invalide (YYYY-MM-DD)')
+        if date_fin < date_debut:
+            raise CommandError('La date de fin doit être postérieure à la date de début')
+
+        nb_lignes = 0
+        debut_lot = date_debut
+        while debut_lot <= date_fin:
+            fin_lot = min(debut_lot + timedelta(days=options['jours_par_lot'] - 1), date_fin)
+            nb_lignes += reconstruire_statistiques(debut_lot, fin_lot)
+            debut_lot = fin_lot + timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{nb_lignes} ligne(s) de statistiques écrite(s) du {date_debut} au {date_fin}"
+        ))
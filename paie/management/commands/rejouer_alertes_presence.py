@@ -0,0 +1,44 @@
+# paie/management/commands/rejouer_alertes_presence.py
+# Rejeu des règles d'alerte sur une période passée (complète les alertes manquantes)
+
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from paie.services.gestionnaire_pointage import get_parametre_pointage
+from paie.services.moteur_alertes import MoteurAlertesPresence
+
+
+class Command(BaseCommand):
+    help = 'Rejoue les présences journalières d\'une période et crée les alertes manquantes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--debut', required=True, help='Date de début (YYYY-MM-DD)')
+        parser.add_argument('--fin', required=True, help='Date de fin incluse (YYYY-MM-DD)')
+        parser.add_argument(
+            '--employe',
+            type=int,
+            action='append',
+            dest='employes',
+            help='Limiter à un employé (option répétable)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            date_debut = datetime.strptime(options['debut'], '%Y-%m-%d').date()
+            date_fin = datetime.strptime(options['fin'], '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError('Format de date invalide (YYYY-MM-DD)')
+        if date_fin < date_debut:
+            raise CommandError('La date de fin doit être postérieure à la date de début')
+
+        resultat = MoteurAlertesPresence.rejouer(
+            date_debut, date_fin,
+            employes_ids=options['employes'],
+            batch_size=get_parametre_pointage('BATCH_SIZE')
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultat['nb_evenements']} présence(s) rejouée(s), "
+            f"{resultat['nb_alertes_creees']} alerte(s) créée(s)"
+        ))
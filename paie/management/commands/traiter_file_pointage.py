@@ -0,0 +1,83 @@
+# paie/management/commands/traiter_file_pointage.py
+# Worker des traitements différés de pointage (présence journalière, alertes)
+
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from paie.services.file_pointage import TraiteurFilePointage, get_metriques_file
+from paie.services.gestionnaire_pointage import get_parametre_pointage
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Traite la file des pointages différés (présence journalière et alertes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--continu',
+            action='store_true',
+            help='Tourner en boucle (worker) au lieu de vider la file une fois',
+        )
+        parser.add_argument(
+            '--intervalle',
+            type=float,
+            default=2.0,
+            help='Attente en secondes quand la file est vide (mode continu)',
+        )
+        parser.add_argument(
+            '--lot',
+            type=int,
+            default=None,
+            help='Nombre de tâches par lot (défaut: BATCH_SIZE)',
+        )
+        parser.add_argument(
+            '--statut',
+            action='store_true',
+            help='Afficher uniquement le backlog de la file',
+        )
+
+    def handle(self, *args, **options):
+        if options['statut']:
+            self._afficher_metriques()
+            return
+
+        taille_lot = options['lot'] or get_parametre_pointage('BATCH_SIZE')
+        traiteur = TraiteurFilePointage()
+
+        while True:
+            try:
+                resultat = traiteur.traiter_lot(taille_lot)
+            except Exception as e:
+                # Erreur hors groupe (base indisponible...) : le worker ne s'arrête pas
+                logger.exception("Erreur du worker de la file de pointage")
+                self.stdout.write(self.style.WARNING(f"Lot interrompu : {e}"))
+                if not options['continu']:
+                    break
+                time.sleep(options['intervalle'])
+                continue
+
+            if resultat['traitees'] or resultat['echecs']:
+                self.stdout.write(
+                    f"{resultat['traitees']} tâche(s) traitée(s), {resultat['echecs']} en échec, "
+                    f"{resultat['restantes']} restante(s)"
+                )
+
+            if resultat['restantes'] and resultat['traitees']:
+                continue
+            if not options['continu']:
+                break
+            time.sleep(options['intervalle'])
+
+        self._afficher_metriques()
+
+    def _afficher_metriques(self):
+        metriques = get_metriques_file()
+        message = (
+            f"File pointage : {metriques['en_attente']} en attente "
+            f"(retard {metriques['retard_secondes']:.0f}s), {metriques['en_echec']} en échec définitif"
+        )
+        style = self.style.WARNING if metriques['en_echec'] else self.style.SUCCESS
+        self.stdout.write(style(message))
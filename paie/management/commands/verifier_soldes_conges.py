@@ -0,0 +1,31 @@
+# paie/management/commands/verifier_soldes_conges.py
+# Contrôle de cohérence des soldes de congés avec leur journal de mouvements
+
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from paie.services.journal_soldes import verifier_soldes
+
+
+class Command(BaseCommand):
+    help = 'Compare les soldes de congés aux sommes de leur journal et reconstruit ceux en écart'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--annee', type=int, help='Année à contrôler (défaut: année courante)')
+        parser.add_argument('--corriger', action='store_true', help='Reconstruire les soldes depuis le journal')
+
+    def handle(self, *args, **options):
+        annee = options['annee'] or datetime.now().year
+        resultat = verifier_soldes(annee, corriger=options['corriger'])
+
+        for ecart in resultat['ecarts'][:20]:
+            self.stdout.write(
+                f"Employé {ecart['employe_id']}, type {ecart['type_conge_id']}: {ecart['ecarts']}"
+            )
+
+        message = f"{resultat['nb_soldes']} solde(s) {annee} contrôlé(s), {resultat['nb_ecarts']} écart(s)"
+        if resultat['nb_ecarts'] and not resultat['corriges']:
+            self.stdout.write(self.style.WARNING(message + ' (relancer avec --corriger)'))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
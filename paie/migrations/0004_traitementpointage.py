@@ -0,0 +1,33 @@
+# paie/migrations/0004_traitementpointage.py
+# File persistante des traitements différés de pointage
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paie', '0003_merge_20250807_1217'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TraitementPointage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_pointage', models.DateField()),
+                ('nb_tentatives', models.IntegerField(default=0)),
+                ('derniere_erreur', models.TextField(blank=True)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('employe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='traitements_pointage', to='paie.employee')),
+                ('pointage', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='traitements_differes', to='paie.pointage')),
+            ],
+            options={
+                'verbose_name': 'Traitement de Pointage',
+                'verbose_name_plural': 'Traitements de Pointage',
+                'ordering': ['date_creation'],
+                'indexes': [models.Index(fields=['nb_tentatives', 'date_creation'], name='paie_traite_nb_tent_69e1e7_idx')],
+            },
+        ),
+    ]
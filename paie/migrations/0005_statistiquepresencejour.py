@@ -0,0 +1,51 @@
+# paie/migrations/0005_statistiquepresencejour.py
+# Agrégat quotidien des présences par département et site
+
+import datetime
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paie', '0004_traitementpointage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatistiquePresenceJour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('nb_lignes', models.IntegerField(default=0)),
+                ('nb_presents', models.IntegerField(default=0)),
+                ('nb_absents', models.IntegerField(default=0)),
+                ('nb_partiels', models.IntegerField(default=0)),
+                ('nb_conges', models.IntegerField(default=0)),
+                ('nb_maladies', models.IntegerField(default=0)),
+                ('nb_missions', models.IntegerField(default=0)),
+                ('nb_teletravail', models.IntegerField(default=0)),
+                ('nb_retards', models.IntegerField(default=0)),
+                ('nb_retards_5', models.IntegerField(default=0)),
+                ('nb_retards_15', models.IntegerField(default=0)),
+                ('nb_retards_30', models.IntegerField(default=0)),
+                ('nb_retards_60', models.IntegerField(default=0)),
+                ('nb_retards_plus', models.IntegerField(default=0)),
+                ('minutes_retard', models.IntegerField(default=0)),
+                ('heures_travaillees', models.DurationField(default=datetime.timedelta(0))),
+                ('heures_theoriques', models.DurationField(default=datetime.timedelta(0))),
+                ('heures_supplementaires', models.DurationField(default=datetime.timedelta(0))),
+                ('date_calcul', models.DateTimeField(auto_now=True)),
+                ('departement', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='statistiques_presence', to='paie.department')),
+                ('site', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='statistiques_presence', to='paie.site')),
+            ],
+            options={
+                'verbose_name': 'Statistique de Présence Journalière',
+                'verbose_name_plural': 'Statistiques de Présence Journalières',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['departement', 'date'], name='paie_statis_departe_b0b2e4_idx'), models.Index(fields=['site', 'date'], name='paie_statis_site_id_7ce69a_idx')],
+                'unique_together': {('date', 'departement', 'site')},
+            },
+        ),
+    ]
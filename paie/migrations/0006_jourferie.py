@@ -0,0 +1,33 @@
+# paie/migrations/0006_jourferie.py
+# Calendrier des jours fériés (nationaux ou par site)
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paie', '0005_statistiquepresencejour'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JourFerie',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=100)),
+                ('date', models.DateField()),
+                ('type_ferie', models.CharField(choices=[('FIXE', 'Fixe (même jour chaque année)'), ('MOBILE', 'Mobile (date propre à une année)')], default='FIXE', max_length=10)),
+                ('actif', models.BooleanField(default=True)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('site', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='jours_feries', to='paie.site')),
+            ],
+            options={
+                'verbose_name': 'Jour Férié',
+                'verbose_name_plural': 'Jours Fériés',
+                'db_table': 'paie_jour_ferie',
+                'ordering': ['date'],
+            },
+        ),
+    ]
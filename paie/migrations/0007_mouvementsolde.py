@@ -0,0 +1,42 @@
+# paie/migrations/0007_mouvementsolde.py
+# Journal des mouvements de soldes de congés
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('paie', '0006_jourferie'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MouvementSolde',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('annee', models.IntegerField()),
+                ('type_mouvement', models.CharField(choices=[('ACQUISITION', 'Acquisition'), ('CONSOMMATION', 'Consommation'), ('REPORT', 'Report'), ('AJUSTEMENT', 'Ajustement manuel')], max_length=15)),
+                ('jours', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('libelle', models.CharField(blank=True, max_length=200)),
+                ('date_mouvement', models.DateTimeField(auto_now_add=True)),
+                ('cree_par', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('demande', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='mouvements_soldes', to='paie.demandeconge')),
+                ('employe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mouvements_soldes', to='paie.employee')),
+                ('type_conge', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='paie.typeconge')),
+            ],
+            options={
+                'verbose_name': 'Mouvement de Solde',
+                'verbose_name_plural': 'Mouvements de Soldes',
+                'db_table': 'paie_mouvement_solde',
+                'ordering': ['date_mouvement', 'id'],
+                'indexes': [
+                    models.Index(fields=['employe', 'type_conge', 'annee'], name='paie_mouvem_employe_a5e19f_idx'),
+                    models.Index(fields=['annee', 'type_mouvement'], name='paie_mouvem_annee_556861_idx'),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# paie/migrations/0008_notificationconge.py
+# Boîte d'envoi des notifications du workflow congés
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paie', '0007_mouvementsolde'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationConge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('destinataire', models.EmailField(max_length=254)),
+                ('type_notification', models.CharField(choices=[('SOUMISSION', 'Soumission'), ('APPROBATION', 'Approbation'), ('REFUS', 'Refus')], max_length=15)),
+                ('sujet', models.CharField(max_length=200)),
+                ('message', models.TextField()),
+                ('statut', models.CharField(choices=[('EN_ATTENTE', 'En attente'), ('ENVOYEE', 'Envoyée'), ('ECHEC', 'Échec définitif')], default='EN_ATTENTE', max_length=15)),
+                ('nb_tentatives', models.IntegerField(default=0)),
+                ('prochaine_tentative', models.DateTimeField(default=django.utils.timezone.now)),
+                ('derniere_erreur', models.TextField(blank=True)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('date_envoi', models.DateTimeField(blank=True, null=True)),
+                ('demande', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='notifications', to='paie.demandeconge')),
+            ],
+            options={
+                'verbose_name': 'Notification de Congé',
+                'verbose_name_plural': 'Notifications de Congés',
+                'db_table': 'paie_notification_conge',
+                'ordering': ['date_creation', 'id'],
+                'indexes': [
+                    models.Index(fields=['statut', 'prochaine_tentative'], name='paie_notifi_statut_96d20d_idx'),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# paie/migrations/0009_provisionconges.py
+# Instantanés mensuels de la provision pour congés payés
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paie', '0008_notificationconge'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProvisionConges',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('annee', models.IntegerField()),
+                ('mois', models.IntegerField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(12)])),
+                ('nb_employes', models.IntegerField(default=0)),
+                ('jours_restants', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('montant', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('date_calcul', models.DateTimeField(auto_now=True)),
+                ('departement', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='provisions_conges', to='paie.department')),
+                ('site', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='provisions_conges', to='paie.site')),
+            ],
+            options={
+                'verbose_name': 'Provision Congés Payés',
+                'verbose_name_plural': 'Provisions Congés Payés',
+                'db_table': 'paie_provision_conges',
+                'ordering': ['-annee', '-mois'],
+                'unique_together': {('annee', 'mois', 'departement', 'site')},
+            },
+        ),
+    ]
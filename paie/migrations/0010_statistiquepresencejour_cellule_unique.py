@@ -0,0 +1,44 @@
+# paie/migrations/0010_statistiquepresencejour_cellule_unique.py
+# Unicité des cellules de statistiques de présence, département ou site vide compris
+
+from django.db import migrations, models
+import django.db.models.functions.comparison
+
+
+def supprimer_doublons(apps, schema_editor):
+    """Garde la ligne calculée en dernier de chaque cellule (les autres sont recalculables)"""
+    StatistiquePresenceJour = apps.get_model('paie', 'StatistiquePresenceJour')
+    vues = set()
+    doublons = []
+    for ligne_id, jour, departement_id, site_id in StatistiquePresenceJour.objects.order_by(
+        '-date_calcul', '-id'
+    ).values_list('id', 'date', 'departement_id', 'site_id'):
+        cle = (jour, departement_id, site_id)
+        if cle in vues:
+            doublons.append(ligne_id)
+        vues.add(cle)
+    StatistiquePresenceJour.objects.filter(id__in=doublons).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paie', '0009_provisionconges'),
+    ]
+
+    operations = [
+        migrations.RunPython(supprimer_doublons, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='statistiquepresencejour',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='statistiquepresencejour',
+            constraint=models.UniqueConstraint(
+                models.F('date'),
+                django.db.models.functions.comparison.Coalesce('departement', 0, output_field=models.BigIntegerField()),
+                django.db.models.functions.comparison.Coalesce('site', 0, output_field=models.BigIntegerField()),
+                name='statistique_presence_cellule_unique'
+            ),
+        ),
+    ]
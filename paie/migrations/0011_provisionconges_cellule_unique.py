@@ -0,0 +1,45 @@
+# paie/migrations/0011_provisionconges_cellule_unique.py
+# Unicité des instantanés de provision congés, département ou site vide compris
+
+from django.db import migrations, models
+import django.db.models.functions.comparison
+
+
+def supprimer_doublons(apps, schema_editor):
+    """Garde l'instantané calculé en dernier de chaque cellule"""
+    ProvisionConges = apps.get_model('paie', 'ProvisionConges')
+    vues = set()
+    doublons = []
+    for ligne_id, annee, mois, departement_id, site_id in ProvisionConges.objects.order_by(
+        '-date_calcul', '-id'
+    ).values_list('id', 'annee', 'mois', 'departement_id', 'site_id'):
+        cle = (annee, mois, departement_id, site_id)
+        if cle in vues:
+            doublons.append(ligne_id)
+        vues.add(cle)
+    ProvisionConges.objects.filter(id__in=doublons).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paie', '0010_statistiquepresencejour_cellule_unique'),
+    ]
+
+    operations = [
+        migrations.RunPython(supprimer_doublons, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='provisionconges',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='provisionconges',
+            constraint=models.UniqueConstraint(
+                models.F('annee'),
+                models.F('mois'),
+                django.db.models.functions.comparison.Coalesce('departement', 0, output_field=models.BigIntegerField()),
+                django.db.models.functions.comparison.Coalesce('site', 0, output_field=models.BigIntegerField()),
+                name='provision_conges_cellule_unique'
+            ),
+        ),
+    ]
@@ -1,5 +1,6 @@
 # paie/models.py - Version corrigée et complète
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.contrib.auth.models import User
 from decimal import Decimal
@@ -599,6 +600,31 @@ class RegleConge(models.Model):
     def __str__(self):
         return f"{self.code} - {self.libelle}"
 
+class JourFerie(models.Model):
+    """Jours fériés, nationaux (sans site) ou propres à un site"""
+    
+    TYPE_FERIE_CHOICES = [
+        ('FIXE', 'Fixe (même jour chaque année)'),
+        ('MOBILE', 'Mobile (date propre à une année)'),
+    ]
+    
+    nom = models.CharField(max_length=100)
+    date = models.DateField()  # Pour un férié fixe, seuls le jour et le mois comptent
+    type_ferie = models.CharField(max_length=10, choices=TYPE_FERIE_CHOICES, default='FIXE')
+    site = models.ForeignKey('Site', on_delete=models.CASCADE, null=True, blank=True, related_name='jours_feries')
+    
+    actif = models.BooleanField(default=True)
+    date_creation = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'paie_jour_ferie'
+        verbose_name = 'Jour Férié'
+        verbose_name_plural = 'Jours Fériés'
+        ordering = ['date']
+    
+    def __str__(self):
+        return f"{self.nom} ({self.date})"
+
 class SoldeConge(models.Model):
     """Soldes de congés par employé, type et année"""
     
@@ -727,8 +753,10 @@ class DemandeConge(models.Model):
         # Calculer date de reprise (jour ouvrable suivant)
         if self.date_fin:
             from datetime import timedelta
-            self.date_reprise = self.date_fin + timedelta(days=1)
-            # TODO: Ajuster pour éviter weekends/jours fériés
+            from .services.calendrier_ouvrable import get_calendrier
+            self.date_reprise = get_calendrier(self.employe.site_id).jour_ouvrable_suivant(
+                self.date_fin + timedelta(days=1)
+            )
         
         super().save(*args, **kwargs)
     
@@ -791,6 +819,138 @@ class ApprobationConge(models.Model):
     def __str__(self):
         return f"{self.demande.numero_demande} - {self.get_action_display()} par {self.utilisateur}"
 
+class MouvementSolde(models.Model):
+    """
+    Journal des mouvements de soldes de congés (ajout seul)
+    
+    SoldeConge en est la projection : jours_acquis, jours_pris, jours_reportes et
+    ajustement_manuel sont les sommes des mouvements de chaque nature.
+    """
+    
+    TYPE_MOUVEMENT_CHOICES = [
+        ('ACQUISITION', 'Acquisition'),
+        ('CONSOMMATION', 'Consommation'),
+        ('REPORT', 'Report'),
+        ('AJUSTEMENT', 'Ajustement manuel'),
+    ]
+    
+    employe = models.ForeignKey('Employee', on_delete=models.CASCADE, related_name='mouvements_soldes')
+    type_conge = models.ForeignKey(TypeConge, on_delete=models.CASCADE)
+    annee = models.IntegerField()
+    
+    type_mouvement = models.CharField(max_length=15, choices=TYPE_MOUVEMENT_CHOICES)
+    jours = models.DecimalField(max_digits=6, decimal_places=2)  # Signé : une annulation restitue des jours
+    
+    # Origine
+    demande = models.ForeignKey(
+        DemandeConge, on_delete=models.SET_NULL, null=True, blank=True, related_name='mouvements_soldes'
+    )
+    libelle = models.CharField(max_length=200, blank=True)
+    cree_par = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    date_mouvement = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'paie_mouvement_solde'
+        verbose_name = 'Mouvement de Solde'
+        verbose_name_plural = 'Mouvements de Soldes'
+        ordering = ['date_mouvement', 'id']
+        indexes = [
+            models.Index(fields=['employe', 'type_conge', 'annee']),
+            models.Index(fields=['annee', 'type_mouvement']),
+        ]
+    
+    def __str__(self):
+        return f"{self.employe} - {self.type_conge} ({self.annee}): {self.get_type_mouvement_display()} {self.jours}"
+    
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValidationError("Un mouvement de solde ne peut pas être modifié ; enregistrer un mouvement correctif")
+        super().save(*args, **kwargs)
+
+class NotificationConge(models.Model):
+    """
+    Boîte d'envoi des notifications du workflow congés
+    
+    Écrite dans la transaction qui change le statut de la demande ; l'envoi est
+    fait ensuite par la commande envoyer_notifications_conges.
+    """
+    
+    TYPE_NOTIFICATION_CHOICES = [
+        ('SOUMISSION', 'Soumission'),
+        ('APPROBATION', 'Approbation'),
+        ('REFUS', 'Refus'),
+    ]
+    
+    STATUT_CHOICES = [
+        ('EN_ATTENTE', 'En attente'),
+        ('ENVOYEE', 'Envoyée'),
+        ('ECHEC', 'Échec définitif'),
+    ]
+    
+    destinataire = models.EmailField()
+    type_notification = models.CharField(max_length=15, choices=TYPE_NOTIFICATION_CHOICES)
+    demande = models.ForeignKey(
+        DemandeConge, on_delete=models.SET_NULL, null=True, blank=True, related_name='notifications'
+    )
+    sujet = models.CharField(max_length=200)
+    message = models.TextField()
+    
+    # Livraison et reprise sur erreur
+    statut = models.CharField(max_length=15, choices=STATUT_CHOICES, default='EN_ATTENTE')
+    nb_tentatives = models.IntegerField(default=0)
+    prochaine_tentative = models.DateTimeField(default=timezone.now)
+    derniere_erreur = models.TextField(blank=True)
+    
+    # Audit
+    date_creation = models.DateTimeField(auto_now_add=True)
+    date_envoi = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'paie_notification_conge'
+        verbose_name = 'Notification de Congé'
+        verbose_name_plural = 'Notifications de Congés'
+        ordering = ['date_creation', 'id']
+        indexes = [
+            models.Index(fields=['statut', 'prochaine_tentative']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_type_notification_display()} -> {self.destinataire} ({self.get_statut_display()})"
+
+class ProvisionConges(models.Model):
+    """Instantané mensuel de la provision pour congés payés par département et site"""
+    
+    annee = models.IntegerField()
+    mois = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(12)])
+    departement = models.ForeignKey('Department', on_delete=models.CASCADE, null=True, blank=True,
+                                    related_name='provisions_conges')
+    site = models.ForeignKey('Site', on_delete=models.CASCADE, null=True, blank=True,
+                             related_name='provisions_conges')
+    
+    nb_employes = models.IntegerField(default=0)
+    jours_restants = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    montant = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    date_calcul = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'paie_provision_conges'
+        verbose_name = 'Provision Congés Payés'
+        verbose_name_plural = 'Provisions Congés Payés'
+        ordering = ['-annee', '-mois']
+        constraints = [
+            # Sans département ou sans site (NULL) compte comme une valeur : un instantané par cellule
+            models.UniqueConstraint(
+                'annee', 'mois',
+                Coalesce('departement', 0, output_field=models.BigIntegerField()),
+                Coalesce('site', 0, output_field=models.BigIntegerField()),
+                name='provision_conges_cellule_unique'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.mois:02d}/{self.annee} - {self.departement_id} / {self.site_id}: {self.montant}"
+
 # ================== EXTENSION MODÈLE EMPLOYEE ==================
 # Ajouter ces champs au modèle Employee existant si pas déjà présents
 
@@ -1240,6 +1400,89 @@ class AlertePresence(models.Model):
         return (timezone.now() - self.date_creation).total_seconds() / 3600
 
 
+class TraitementPointage(models.Model):
+    """File persistante des traitements différés d'un pointage (présence, alertes)"""
+    
+    pointage = models.ForeignKey(Pointage, on_delete=models.CASCADE, related_name='traitements_differes')
+    employe = models.ForeignKey('Employee', on_delete=models.CASCADE, related_name='traitements_pointage')
+    date_pointage = models.DateField()
+    
+    # Reprise sur erreur
+    nb_tentatives = models.IntegerField(default=0)
+    derniere_erreur = models.TextField(blank=True)
+    
+    # Audit
+    date_creation = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = "Traitement de Pointage"
+        verbose_name_plural = "Traitements de Pointage"
+        ordering = ['date_creation']
+        indexes = [
+            models.Index(fields=['nb_tentatives', 'date_creation']),
+        ]
+    
+    def __str__(self):
+        return f"Traitement {self.pointage_id} - {self.date_pointage} ({self.nb_tentatives} tentative(s))"
+
+
+class StatistiquePresenceJour(models.Model):
+    """Agrégat quotidien des présences par département et site (tendances, tableaux de bord)"""
+    
+    date = models.DateField()
+    departement = models.ForeignKey(Department, on_delete=models.CASCADE, null=True, blank=True,
+                                    related_name='statistiques_presence')
+    site = models.ForeignKey(Site, on_delete=models.CASCADE, null=True, blank=True,
+                             related_name='statistiques_presence')
+    
+    # Présences journalières par statut
+    nb_lignes = models.IntegerField(default=0)
+    nb_presents = models.IntegerField(default=0)
+    nb_absents = models.IntegerField(default=0)
+    nb_partiels = models.IntegerField(default=0)
+    nb_conges = models.IntegerField(default=0)
+    nb_maladies = models.IntegerField(default=0)
+    nb_missions = models.IntegerField(default=0)
+    nb_teletravail = models.IntegerField(default=0)
+    
+    # Retards et leur répartition (minutes)
+    nb_retards = models.IntegerField(default=0)
+    nb_retards_5 = models.IntegerField(default=0)  # 1 à 5
+    nb_retards_15 = models.IntegerField(default=0)  # 6 à 15
+    nb_retards_30 = models.IntegerField(default=0)  # 16 à 30
+    nb_retards_60 = models.IntegerField(default=0)  # 31 à 60
+    nb_retards_plus = models.IntegerField(default=0)  # Au-delà de 60
+    minutes_retard = models.IntegerField(default=0)
+    
+    # Heures
+    heures_travaillees = models.DurationField(default=timedelta(0))
+    heures_theoriques = models.DurationField(default=timedelta(0))
+    heures_supplementaires = models.DurationField(default=timedelta(0))
+    
+    date_calcul = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "Statistique de Présence Journalière"
+        verbose_name_plural = "Statistiques de Présence Journalières"
+        ordering = ['-date']
+        constraints = [
+            # Sans département ou sans site (NULL) compte comme une valeur : une seule ligne par cellule
+            models.UniqueConstraint(
+                'date',
+                Coalesce('departement', 0, output_field=models.BigIntegerField()),
+                Coalesce('site', 0, output_field=models.BigIntegerField()),
+                name='statistique_presence_cellule_unique'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['departement', 'date']),
+            models.Index(fields=['site', 'date']),
+        ]
+    
+    def __str__(self):
+        return f"{self.date} - {self.departement_id} / {self.site_id} ({self.nb_lignes} présences)"
+
+
 
 class UserRole(models.TextChoices):
     """Définition des rôles utilisateur"""
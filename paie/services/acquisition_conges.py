@@ -0,0 +1,97 @@
+# paie/services/acquisition_conges.py
+# Acquisition des congés en forme close : fonctions pures, pour une date d'embauche ou toute une liste
+
+from calendar import monthrange
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+from fractions import Fraction
+from typing import Dict, Iterable, List, Optional, Union
+
+CENTIEME = Decimal('0.01')
+
+# Nombre entier de mois, ou fraction exacte du premier mois
+Mois = Union[int, Fraction]
+
+
+def anciennete_mois(date_embauche: Optional[date], date_reference: date) -> int:
+    """
+    Ancienneté en mois calendaires révolus à une date donnée
+
+    Un mois est révolu au même quantième du mois suivant, ou à son dernier jour
+    si ce quantième n'existe pas (embauche le 31 janvier : un mois le 28 février).
+    """
+    if not date_embauche or date_reference < date_embauche:
+        return 0
+    mois = (date_reference.year - date_embauche.year) * 12 + date_reference.month - date_embauche.month
+    dernier_jour = monthrange(date_reference.year, date_reference.month)[1]
+    if date_reference.day < date_embauche.day and date_reference.day != dernier_jour:
+        mois -= 1
+    return mois
+
+
+def mois_acquisition(date_embauche: date, annee: int, date_arret: date) -> Mois:
+    """
+    Mois ouvrant droit à acquisition dans l'année, jusqu'à date_arret incluse
+
+    Chaque début de mois atteint compte pour un mois entier (mois de date_arret
+    inclus). Une embauche en cours de mois donne pour ce premier mois le prorata
+    de ses jours calendaires (arrêté à date_arret si elle tombe dans ce mois),
+    puis un mois entier pour chacun des mois suivants.
+    """
+    date_debut = max(date_embauche, date(annee, 1, 1))
+    date_fin = min(date_arret, date(annee, 12, 31))
+    if date_fin < date_debut:
+        return 0
+
+    mois_suivants = date_fin.month - date_debut.month
+    if date_debut.day == 1:
+        return mois_suivants + 1
+
+    jours_dans_mois = monthrange(date_debut.year, date_debut.month)[1]
+    if mois_suivants == 0:
+        jours_travailles = date_fin.day - date_debut.day + 1
+    else:
+        jours_travailles = jours_dans_mois - date_debut.day + 1
+    return mois_suivants + Fraction(jours_travailles, jours_dans_mois)
+
+
+def appliquer_taux(mois: Mois, jours_par_mois: Decimal) -> Decimal:
+    """Jours acquis arrondis au centième ; la division vient en dernier pour arrondir la valeur exacte"""
+    mois = Fraction(mois)
+    jours = Decimal(mois.numerator) * jours_par_mois / Decimal(mois.denominator)
+    return jours.quantize(CENTIEME, rounding=ROUND_HALF_UP)
+
+
+def jours_acquis(date_embauche: Optional[date], annee: int, date_arret: date,
+                 jours_par_mois: Decimal, anciennete_minimum_mois: int = 0) -> Decimal:
+    """
+    Jours acquis sur l'année à date_arret, en temps constant
+
+    L'ancienneté minimum s'apprécie au début de la période d'acquisition
+    (1er janvier, ou date d'embauche dans l'année).
+    """
+    if not date_embauche or jours_par_mois <= 0:
+        return Decimal('0')
+    if anciennete_mois(date_embauche, max(date_embauche, date(annee, 1, 1))) < anciennete_minimum_mois:
+        return Decimal('0')
+    return appliquer_taux(mois_acquisition(date_embauche, annee, date_arret), jours_par_mois)
+
+
+def jours_acquis_lot(dates_embauche: Iterable[Optional[date]], annee: int, date_arret: date,
+                     jours_par_mois: Decimal, anciennete_minimum_mois: int = 0) -> List[Decimal]:
+    """
+    jours_acquis sur une liste de dates d'embauche, résultats dans le même ordre
+
+    Le résultat ne dépend que de la date d'embauche : il est calculé une fois par
+    date distincte, soit au plus quelques milliers de calculs quel que soit l'effectif.
+    """
+    calcules: Dict[Optional[date], Decimal] = {}
+    resultats = []
+    for date_embauche in dates_embauche:
+        acquis = calcules.get(date_embauche)
+        if acquis is None:
+            acquis = calcules[date_embauche] = jours_acquis(
+                date_embauche, annee, date_arret, jours_par_mois, anciennete_minimum_mois
+            )
+        resultats.append(acquis)
+    return resultats
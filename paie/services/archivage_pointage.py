@@ -0,0 +1,317 @@
+# paie/services/archivage_pointage.py
+# Archivage des pointages anciens en fichiers mensuels compressés (format colonnes)
+
+from calendar import monthrange
+from collections import OrderedDict
+from datetime import date, datetime
+import gzip
+import json
+import logging
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from ..models import Pointage, PresenceJournaliere, TraitementPointage
+from .file_pointage import invalider_etats_jours
+
+logger = logging.getLogger(__name__)
+
+VERSION_FORMAT = 1
+
+COLONNES = [champ.attname for champ in Pointage._meta.concrete_fields]
+COLONNES_DATETIME = {
+    champ.attname for champ in Pointage._meta.concrete_fields
+    if isinstance(champ, models.DateTimeField)
+}
+
+
+def _get_parametre(cle: str):
+    from .gestionnaire_pointage import get_parametre_pointage
+    return get_parametre_pointage(cle)
+
+
+def _decaler_mois(jour: date, nb_mois: int) -> date:
+    """Premier jour du mois situé nb_mois avant celui de `jour`"""
+    index = jour.year * 12 + jour.month - 1 - nb_mois
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _supprimer_lignes(cursor, modele, nom_champ: str, valeurs: List) -> int:
+    """DELETE SQL paramétré sur une colonne (ni chargement des lignes, ni signaux)"""
+    champ = modele._meta.get_field(nom_champ)
+    cursor.execute(
+        'DELETE FROM {} WHERE {} IN ({})'.format(
+            connection.ops.quote_name(modele._meta.db_table),
+            connection.ops.quote_name(champ.column),
+            ', '.join(['%s'] * len(valeurs))
+        ),
+        [champ.get_db_prep_value(valeur, connection) for valeur in valeurs]
+    )
+    return cursor.rowcount
+
+
+# Mois décodés récemment lus, par chemin : (signature du fichier, lignes)
+_mois_decodes: 'OrderedDict[str, tuple]' = OrderedDict()
+_verrou_mois_decodes = threading.Lock()
+NB_MOIS_DECODES = 12
+
+
+class ArchivePointages:
+    """
+    Fichiers d'archive : un fichier gzip par mois (<repertoire>/AAAA/MM.json.gz)
+
+    Chaque fichier stocke les pointages colonne par colonne ({"colonnes": {champ: [...]}}),
+    ce qui compresse bien les colonnes très répétitives (type, statut, employé).
+    """
+
+    def __init__(self, repertoire: str = None):
+        self.repertoire = Path(
+            repertoire or _get_parametre('ARCHIVE_POINTAGES_DIR')
+            or Path(settings.BASE_DIR) / 'archives' / 'pointages'
+        )
+
+    def chemin(self, annee: int, mois: int) -> Path:
+        return self.repertoire / f'{annee:04d}' / f'{mois:02d}.json.gz'
+
+    def existe(self, annee: int, mois: int) -> bool:
+        return self.chemin(annee, mois).exists()
+
+    def lire(self, annee: int, mois: int) -> List[Dict]:
+        """
+        Lignes d'un mois archivé, au format de Pointage.objects.values()
+
+        Les mois décodés sont gardés en mémoire (NB_MOIS_DECODES derniers) tant
+        que le fichier n'a pas été réécrit : les lignes retournées sont partagées
+        et ne doivent pas être modifiées.
+        """
+        chemin = self.chemin(annee, mois)
+        try:
+            infos = chemin.stat()
+        except FileNotFoundError:
+            return []
+
+        cle = str(chemin)
+        signature = (infos.st_mtime_ns, infos.st_size)
+        with _verrou_mois_decodes:
+            memo = _mois_decodes.get(cle)
+            if memo is not None and memo[0] == signature:
+                _mois_decodes.move_to_end(cle)
+                return list(memo[1])
+
+        lignes = self._decoder(chemin)
+        with _verrou_mois_decodes:
+            _mois_decodes[cle] = (signature, lignes)
+            _mois_decodes.move_to_end(cle)
+            while len(_mois_decodes) > NB_MOIS_DECODES:
+                _mois_decodes.popitem(last=False)
+        return list(lignes)
+
+    @staticmethod
+    def _decoder(chemin: Path) -> List[Dict]:
+        with gzip.open(chemin, 'rt', encoding='utf-8') as fichier:
+            contenu = json.load(fichier)
+
+        colonnes = contenu['colonnes']
+        for nom in COLONNES_DATETIME:
+            colonnes[nom] = [datetime.fromisoformat(v) if v else None for v in colonnes[nom]]
+        colonnes['id'] = [uuid.UUID(v) for v in colonnes['id']]
+
+        noms = list(colonnes)
+        return [dict(zip(noms, valeurs)) for valeurs in zip(*(colonnes[nom] for nom in noms))]
+
+    def ecrire(self, annee: int, mois: int, lignes: List[Dict]):
+        """Écrit (ou remplace) l'archive d'un mois de façon atomique"""
+        colonnes = {nom: [] for nom in COLONNES}
+        for ligne in lignes:
+            for nom in COLONNES:
+                valeur = ligne[nom]
+                if isinstance(valeur, (datetime, uuid.UUID)):
+                    valeur = valeur.isoformat() if isinstance(valeur, datetime) else str(valeur)
+                colonnes[nom].append(valeur)
+
+        chemin = self.chemin(annee, mois)
+        chemin.parent.mkdir(parents=True, exist_ok=True)
+        temporaire = chemin.with_suffix('.tmp')
+        with gzip.open(temporaire, 'wt', encoding='utf-8') as fichier:
+            json.dump({
+                'version': VERSION_FORMAT,
+                'annee': annee,
+                'mois': mois,
+                'nb_lignes': len(lignes),
+                'colonnes': colonnes,
+            }, fichier, separators=(',', ':'))
+        os.replace(temporaire, chemin)
+        with _verrou_mois_decodes:
+            _mois_decodes.pop(str(chemin), None)
+
+
+class ArchiveurPointages:
+    """Déplace les pointages au-delà de l'horizon de rétention vers les archives mensuelles"""
+
+    def __init__(self, archive: ArchivePointages = None):
+        self.archive = archive or ArchivePointages()
+
+    def mois_archivables(self, horizon_mois: int, reference: date = None) -> List[date]:
+        """Mois (premier jour) antérieurs à l'horizon contenant encore des pointages"""
+        limite = _decaler_mois(reference or date.today(), horizon_mois)
+        return sorted(
+            mois.date() if isinstance(mois, datetime) else mois
+            for mois in Pointage.objects.filter(heure_pointage__date__lt=limite)
+            .annotate(mois=TruncMonth('heure_pointage')).order_by()
+            .values_list('mois', flat=True).distinct()
+        )
+
+    def jours_non_valides(self, annee: int, mois: int) -> set:
+        """(employé, jour) pointés dans le mois sans présence journalière validée"""
+        debut = date(annee, mois, 1)
+        fin = date(annee, mois, monthrange(annee, mois)[1])
+
+        jours_pointes = set(Pointage.objects.filter(
+            heure_pointage__date__range=[debut, fin]
+        ).annotate(jour=TruncDate('heure_pointage')).order_by().values_list('employe_id', 'jour').distinct())
+
+        jours_valides = set(PresenceJournaliere.objects.filter(
+            date__range=[debut, fin],
+            valide=True
+        ).values_list('employe_id', 'date'))
+
+        return jours_pointes - jours_valides
+
+    def archiver_mois(self, annee: int, mois: int, simulation: bool = False) -> Dict:
+        """
+        Archive puis supprime les pointages d'un mois
+
+        Le mois est ignoré si un jour pointé n'est pas couvert par une présence
+        validée. Le fichier est écrit et relu avant toute suppression ; un mois
+        déjà partiellement archivé (arrêt pendant la suppression) est fusionné.
+        """
+        resultat = {'mois': f'{annee:04d}-{mois:02d}', 'nb_pointages': 0, 'nb_supprimes': 0}
+
+        manquants = self.jours_non_valides(annee, mois)
+        if manquants:
+            resultat.update(statut='IGNORE', jours_non_valides=len(manquants))
+            return resultat
+
+        debut = date(annee, mois, 1)
+        fin = date(annee, mois, monthrange(annee, mois)[1])
+        lignes = list(Pointage.objects.filter(
+            heure_pointage__date__range=[debut, fin]
+        ).order_by('heure_pointage').values(*COLONNES).iterator(chunk_size=_get_parametre('BATCH_SIZE')))
+
+        resultat['nb_pointages'] = len(lignes)
+        if simulation or not lignes:
+            resultat['statut'] = 'SIMULATION' if simulation else 'VIDE'
+            return resultat
+
+        # Fusion avec une archive existante du même mois
+        deja_archivees = self.archive.lire(annee, mois)
+        ids_nouveaux = {ligne['id'] for ligne in lignes}
+        fusion = [l for l in deja_archivees if l['id'] not in ids_nouveaux] + lignes
+        fusion.sort(key=lambda l: l['heure_pointage'])
+        self.archive.ecrire(annee, mois, fusion)
+
+        # Relecture avant suppression
+        ids_archives = {ligne['id'] for ligne in self.archive.lire(annee, mois)}
+        if not ids_nouveaux <= ids_archives:
+            raise RuntimeError(f"Archive {resultat['mois']} incomplète, suppression annulée")
+
+        resultat['nb_supprimes'] = self._supprimer_par_lots(list(ids_nouveaux))
+        # La suppression directe ne déclenche pas le signal de Pointage
+        invalider_etats_jours({(ligne['employe_id'], ligne['heure_pointage'].date()) for ligne in lignes})
+        resultat['statut'] = 'ARCHIVE'
+        logger.info(f"Archivage pointages {resultat['mois']}: {resultat['nb_supprimes']} lignes")
+        return resultat
+
+    def _supprimer_par_lots(self, ids: List) -> int:
+        """
+        Un DELETE ... WHERE id IN (...) par lot, sans charger les lignes
+
+        Les tâches de traitement différé liées (seule relation vers Pointage)
+        sont supprimées d'abord ; l'état du jour en cache est invalidé par
+        l'appelant, une fois pour le mois.
+        """
+        taille_lot = _get_parametre('BATCH_SIZE')
+        nb_supprimes = 0
+        for position in range(0, len(ids), taille_lot):
+            lot = ids[position:position + taille_lot]
+            with transaction.atomic(), connection.cursor() as cursor:
+                _supprimer_lignes(cursor, TraitementPointage, 'pointage', lot)
+                nb_supprimes += _supprimer_lignes(cursor, Pointage, 'id', lot)
+        return nb_supprimes
+
+    def archiver(self, horizon_mois: int = None, simulation: bool = False) -> Dict:
+        """
+        Archive tous les mois au-delà de l'horizon (défaut: CLEANUP_OLD_DATA_MONTHS)
+
+        Returns:
+            Dict avec le détail par mois et les totaux
+        """
+        horizon_mois = horizon_mois or _get_parametre('CLEANUP_OLD_DATA_MONTHS')
+        details = [
+            self.archiver_mois(mois.year, mois.month, simulation=simulation)
+            for mois in self.mois_archivables(horizon_mois)
+        ]
+        return {
+            'horizon_mois': horizon_mois,
+            'simulation': simulation,
+            'mois': details,
+            'nb_supprimes': sum(d['nb_supprimes'] for d in details),
+            'nb_mois_ignores': sum(1 for d in details if d['statut'] == 'IGNORE'),
+        }
+
+
+def lire_pointages(date_debut: date, date_fin: date, employes_ids: Iterable[int] = None,
+                   archive: ArchivePointages = None) -> List[Dict]:
+    """
+    Pointages d'une période, en base et dans les archives (lecture transparente)
+
+    Returns:
+        Lignes au format de Pointage.objects.values(), triées par heure de pointage
+    """
+    archive = archive or ArchivePointages()
+    employes_ids = set(employes_ids) if employes_ids is not None else None
+
+    query = Pointage.objects.filter(heure_pointage__date__range=[date_debut, date_fin])
+    if employes_ids is not None:
+        query = query.filter(employe_id__in=employes_ids)
+    lignes = list(query.values(*COLONNES))
+    # Un mois interrompu pendant la suppression peut être à la fois en base et archivé
+    ids_en_base = {ligne['id'] for ligne in lignes}
+    lignes.extend(lire_archives(date_debut, date_fin, employes_ids, archive=archive, exclure_ids=ids_en_base))
+
+    lignes.sort(key=lambda l: l['heure_pointage'])
+    return lignes
+
+
+def lire_archives(date_debut: date, date_fin: date, employes_ids: Iterable[int] = None,
+                  archive: ArchivePointages = None, exclure_ids: set = frozenset()) -> List[Dict]:
+    """
+    Pointages archivés d'une période, sans lecture de la base
+
+    Pour compléter des pointages déjà lus en base (exclure_ids : identifiants
+    déjà obtenus). Returns: lignes triées par heure de pointage
+    """
+    archive = archive or ArchivePointages()
+    employes_ids = set(employes_ids) if employes_ids is not None else None
+
+    lignes = []
+    mois = date(date_debut.year, date_debut.month, 1)
+    while mois <= date_fin:
+        for ligne in archive.lire(mois.year, mois.month):
+            heure = ligne['heure_pointage']
+            jour = timezone.localtime(heure).date() if timezone.is_aware(heure) else heure.date()
+            if not date_debut <= jour <= date_fin or ligne['id'] in exclure_ids:
+                continue
+            if employes_ids is None or ligne['employe_id'] in employes_ids:
+                lignes.append(ligne)
+        mois = _decaler_mois(mois, -1)
+
+    lignes.sort(key=lambda l: l['heure_pointage'])
+    return lignes
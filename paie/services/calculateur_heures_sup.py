@@ -0,0 +1,138 @@
+# paie/services/calculateur_heures_sup.py
+# Calcul des heures supplémentaires hebdomadaires pour tout un effectif en une passe
+
+from array import array
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, Mapping, Optional
+
+from django.db.models import Sum
+from django.db.models.functions import TruncWeek
+
+from ..models import PresenceJournaliere, ReglePointage
+
+# Seuil légal Maroc : 44h/semaine, premières 8h sup majorées à 25%, au-delà 50%
+SEUIL_HEBDO_DEFAUT = timedelta(hours=44)
+PLAFOND_TAUX_25 = timedelta(hours=8)
+
+
+class CalculateurHeuresSupLot:
+    """
+    Heures supplémentaires par employé, semaine ISO par semaine ISO
+
+    Les présences sont traitées comme des colonnes (employé, jour, secondes) :
+    une passe les cumule par (employé, semaine ISO), une seconde applique les
+    paliers 25%/50% à chaque semaine et reporte les totaux sur l'employé.
+    """
+
+    def __init__(self, seuil_hebdo: timedelta = SEUIL_HEBDO_DEFAUT,
+                 taux_majoration_25: Decimal = Decimal('25'),
+                 taux_majoration_50: Decimal = Decimal('50')):
+        self.seuil_secondes = int(seuil_hebdo.total_seconds())
+        self.plafond_25_secondes = int(PLAFOND_TAUX_25.total_seconds())
+        self.taux_majoration_25 = Decimal(str(taux_majoration_25))
+        self.taux_majoration_50 = Decimal(str(taux_majoration_50))
+
+    @classmethod
+    def depuis_regle(cls, regle: Optional[ReglePointage]) -> 'CalculateurHeuresSupLot':
+        """Construit le calculateur à partir de la règle de pointage active"""
+        if not regle:
+            return cls()
+        return cls(
+            seuil_hebdo=regle.seuil_heures_sup_semaine,
+            taux_majoration_25=regle.taux_majoration_25,
+            taux_majoration_50=regle.taux_majoration_50
+        )
+
+    def calculer(self, employes_ids: Iterable[int], jours: Iterable[date], secondes: Iterable[int],
+                 taux_horaires: Mapping[int, Decimal] = None) -> Dict[int, Dict]:
+        """
+        Calcule les heures sup à partir de colonnes parallèles
+
+        Args:
+            employes_ids: ID employé de chaque ligne
+            jours: date de chaque ligne (jour ou lundi de la semaine)
+            secondes: secondes travaillées de chaque ligne
+            taux_horaires: salaire horaire par employé (défaut: 0)
+
+        Returns:
+            Dict employe_id -> totaux (timedelta) et montants (Decimal)
+        """
+        taux_horaires = taux_horaires or {}
+
+        # 1. Cumul par (employé, semaine ISO)
+        cumuls_semaine: Dict[tuple, int] = {}
+        for employe_id, jour, duree in zip(employes_ids, jours, secondes):
+            annee_iso, semaine_iso, _ = jour.isocalendar()
+            cle = (employe_id, annee_iso, semaine_iso)
+            cumuls_semaine[cle] = cumuls_semaine.get(cle, 0) + duree
+
+        # 2. Paliers par semaine, reportés sur l'employé
+        cles = list(cumuls_semaine)
+        totaux = array('q', cumuls_semaine.values())
+        sup = array('q', (max(0, total - self.seuil_secondes) for total in totaux))
+        sup_25 = array('q', (min(heures, self.plafond_25_secondes) for heures in sup))
+
+        resultats: Dict[int, Dict] = {}
+        for (employe_id, _, _), total, heures_sup, heures_25 in zip(cles, totaux, sup, sup_25):
+            cumul = resultats.setdefault(employe_id, [0, 0, 0, 0, 0])
+            cumul[0] += total
+            cumul[1] += heures_sup
+            cumul[2] += heures_25
+            cumul[3] += heures_sup - heures_25
+            cumul[4] += 1
+
+        return {
+            employe_id: self._formater(cumul, taux_horaires.get(employe_id, Decimal('0.00')))
+            for employe_id, cumul in resultats.items()
+        }
+
+    def calculer_periode(self, employes, date_debut: date, date_fin: date,
+                         taux_horaires: Mapping[int, Decimal] = None) -> Dict[int, Dict]:
+        """
+        Calcule les heures sup des semaines complètes couvrant [date_debut, date_fin]
+
+        `employes` est un queryset d'employés ou une liste d'IDs. Les heures sont pré-sommées par (employé, semaine) côté base, puis passées
+        au calcul par colonnes.
+        """
+        debut_semaine = date_debut - timedelta(days=date_debut.weekday())
+        fin_semaine = date_fin + timedelta(days=6 - date_fin.weekday())
+
+        lignes = PresenceJournaliere.objects.filter(
+            employe__in=employes,
+            date__range=[debut_semaine, fin_semaine],
+            statut_jour__in=['PRESENT', 'PARTIEL']
+        ).annotate(semaine=TruncWeek('date')).order_by().values_list(
+            'employe_id', 'semaine'
+        ).annotate(total_heures=Sum('heures_travaillees'))
+
+        employes_ids = array('q')
+        semaines = []
+        secondes = array('q')
+        for employe_id, semaine, total_heures in lignes:
+            employes_ids.append(employe_id)
+            semaines.append(semaine)
+            secondes.append(int(total_heures.total_seconds()) if total_heures else 0)
+
+        return self.calculer(employes_ids, semaines, secondes, taux_horaires)
+
+    def _formater(self, cumul, taux_horaire: Decimal) -> Dict:
+        """Convertit les cumuls en secondes vers le format de calculer_heures_supplementaires"""
+        total, heures_sup, heures_25, heures_50, nb_semaines = cumul
+        return {
+            'total_heures': timedelta(seconds=total),
+            'heures_sup_total': timedelta(seconds=heures_sup),
+            'heures_sup_25': timedelta(seconds=heures_25),
+            'heures_sup_50': timedelta(seconds=heures_50),
+            'montant_25': self._montant(taux_horaire, heures_25, self.taux_majoration_25),
+            'montant_50': self._montant(taux_horaire, heures_50, self.taux_majoration_50),
+            'nb_semaines': nb_semaines,
+        }
+
+    @staticmethod
+    def _montant(taux_horaire: Decimal, secondes: int, taux_majoration: Decimal) -> Decimal:
+        """Montant majoré des heures sup"""
+        if secondes == 0:
+            return Decimal('0.00')
+        heures = Decimal(str(secondes / 3600))
+        return taux_horaire * heures * (1 + taux_majoration / 100)
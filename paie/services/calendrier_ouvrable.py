@@ -0,0 +1,185 @@
+# paie/services/calendrier_ouvrable.py
+# Calendrier des jours ouvrables (week-ends et jours fériés par site) en sommes cumulées annuelles
+
+from array import array
+from calendar import isleap
+from datetime import date, timedelta
+import logging
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db.models import Q
+
+from ..models import JourFerie
+from .generations import CompteurGeneration
+
+logger = logging.getLogger(__name__)
+
+CLE_GENERATION_CALENDRIER = 'paie:calendrier:generation'
+
+# Lundi=0 ... Vendredi=4
+JOURS_OUVRES_DEFAUT = (0, 1, 2, 3, 4)
+
+# Fériés civils marocains : (mois, jour, nom)
+FERIES_FIXES_MAROC = [
+    (1, 1, "Nouvel An"),
+    (1, 11, "Manifeste de l'Indépendance"),
+    (1, 14, "Nouvel An amazigh"),
+    (5, 1, "Fête du Travail"),
+    (7, 30, "Fête du Trône"),
+    (8, 14, "Allégeance Oued Eddahab"),
+    (8, 20, "Révolution du Roi et du Peuple"),
+    (8, 21, "Fête de la Jeunesse"),
+    (11, 6, "Marche Verte"),
+    (11, 18, "Fête de l'Indépendance"),
+]
+
+# Fériés religieux : (mois hégirien, jour, nom). Leur date grégorienne dépend de
+# l'observation du croissant ; estimer_feries_mobiles n'en donne qu'une approximation.
+FERIES_MOBILES_MAROC = [
+    (1, 1, "1er Moharram"),
+    (3, 12, "Aïd Al Mawlid"),
+    (3, 13, "Aïd Al Mawlid (2e jour)"),
+    (10, 1, "Aïd Al Fitr"),
+    (10, 2, "Aïd Al Fitr (2e jour)"),
+    (12, 10, "Aïd Al Adha"),
+    (12, 11, "Aïd Al Adha (2e jour)"),
+]
+
+# Époque hégirienne civile : 16 juillet 622 julien, soit le 19 juillet en grégorien proleptique
+_ORDINAL_EPOQUE_HEGIRE = date(622, 7, 19).toordinal()
+
+
+_generation = CompteurGeneration(CLE_GENERATION_CALENDRIER)
+
+
+def get_generation_calendrier() -> int:
+    return _generation.lire()
+
+
+def invalider_calendrier():
+    """Appelé par le signal de JourFerie : les calendriers en mémoire sont reconstruits"""
+    _generation.invalider()
+
+
+def hegire_vers_gregorien(annee: int, mois: int, jour: int) -> date:
+    """Conversion par le calendrier hégirien tabulaire (écart possible d'un ou deux jours)"""
+    jours = (jour + math.ceil(29.5 * (mois - 1)) + (annee - 1) * 354
+             + (3 + 11 * annee) // 30 - 1)
+    return date.fromordinal(_ORDINAL_EPOQUE_HEGIRE + jours)
+
+
+def estimer_feries_mobiles(annee: int) -> List[Tuple[date, str]]:
+    """Dates estimées des fériés religieux tombant dans une année grégorienne"""
+    annee_hegire = int((annee - 622) * 33 / 32)
+    feries = []
+    for annee_h in range(annee_hegire - 1, annee_hegire + 3):
+        for mois, jour, nom in FERIES_MOBILES_MAROC:
+            jour_gregorien = hegire_vers_gregorien(annee_h, mois, jour)
+            if jour_gregorien.year == annee:
+                feries.append((jour_gregorien, nom))
+    return sorted(feries)
+
+
+class CalendrierOuvrable:
+    """
+    Jours ouvrables d'un site : jours ouvrés de la semaine moins les jours fériés
+    nationaux et ceux du site
+
+    Pour chaque année consultée, une table de sommes cumulées (cumuls[k] = jours
+    ouvrables parmi les k premiers jours de l'année) est construite une fois ;
+    le nombre de jours ouvrables d'une plage se lit alors par différence, en O(1)
+    par année traversée.
+    """
+
+    def __init__(self, site_id: Optional[int] = None, jours_ouvres: Iterable[int] = JOURS_OUVRES_DEFAUT):
+        self.site_id = site_id
+        self.jours_ouvres = frozenset(jours_ouvres)
+        self.generation = get_generation_calendrier()
+
+        # annee -> (sommes cumulées, fériés de l'année)
+        self._annees: Dict[int, Tuple[array, Dict[date, str]]] = {}
+
+    def est_perime(self) -> bool:
+        return self.generation != get_generation_calendrier()
+
+    def _charger_feries(self, annee: int) -> Dict[date, str]:
+        perimetre = Q(site__isnull=True)
+        if self.site_id is not None:
+            perimetre |= Q(site_id=self.site_id)
+
+        feries = {}
+        for nom, jour, type_ferie in JourFerie.objects.filter(
+            perimetre,
+            Q(type_ferie='FIXE') | Q(date__year=annee),
+            actif=True
+        ).values_list('nom', 'date', 'type_ferie'):
+            if type_ferie == 'FIXE':
+                if (jour.month, jour.day) == (2, 29) and not isleap(annee):
+                    continue
+                jour = jour.replace(year=annee)
+            feries.setdefault(jour, nom)
+        return feries
+
+    def _annee(self, annee: int) -> Tuple[array, Dict[date, str]]:
+        donnees = self._annees.get(annee)
+        if donnees is None:
+            feries = self._charger_feries(annee)
+            cumuls = array('i', [0])
+            jour = date(annee, 1, 1)
+            while jour.year == annee:
+                ouvrable = jour.weekday() in self.jours_ouvres and jour not in feries
+                cumuls.append(cumuls[-1] + ouvrable)
+                jour += timedelta(days=1)
+            donnees = self._annees[annee] = (cumuls, feries)
+        return donnees
+
+    def nb_jours_ouvrables(self, date_debut: date, date_fin: date) -> int:
+        """Jours ouvrables de [date_debut, date_fin], bornes incluses"""
+        if date_debut > date_fin:
+            return 0
+
+        cumuls_debut = self._annee(date_debut.year)[0]
+        rang_debut = date_debut.timetuple().tm_yday - 1
+        if date_debut.year == date_fin.year:
+            return cumuls_debut[date_fin.timetuple().tm_yday] - cumuls_debut[rang_debut]
+
+        total = cumuls_debut[-1] - cumuls_debut[rang_debut]
+        for annee in range(date_debut.year + 1, date_fin.year):
+            total += self._annee(annee)[0][-1]
+        return total + self._annee(date_fin.year)[0][date_fin.timetuple().tm_yday]
+
+    def est_ferie(self, jour: date) -> bool:
+        return jour in self._annee(jour.year)[1]
+
+    def est_ouvrable(self, jour: date) -> bool:
+        cumuls = self._annee(jour.year)[0]
+        rang = jour.timetuple().tm_yday
+        return cumuls[rang] > cumuls[rang - 1]
+
+    def jour_ouvrable_suivant(self, jour: date) -> date:
+        """Premier jour ouvrable à partir de `jour` inclus"""
+        while not self.est_ouvrable(jour):
+            jour += timedelta(days=1)
+        return jour
+
+    def jours_feries(self, date_debut: date, date_fin: date) -> List[Tuple[date, str]]:
+        """Jours fériés de la période (y compris ceux tombant un week-end)"""
+        feries = []
+        for annee in range(date_debut.year, date_fin.year + 1):
+            feries.extend(
+                (jour, nom) for jour, nom in self._annee(annee)[1].items()
+                if date_debut <= jour <= date_fin
+            )
+        return sorted(feries)
+
+
+_calendriers: Dict[Optional[int], CalendrierOuvrable] = {}
+
+
+def get_calendrier(site_id: Optional[int] = None) -> CalendrierOuvrable:
+    """Calendrier d'un site (national si None), partagé dans le processus tant qu'il est à jour"""
+    calendrier = _calendriers.get(site_id)
+    if calendrier is None or calendrier.est_perime():
+        calendrier = _calendriers[site_id] = CalendrierOuvrable(site_id)
+    return calendrier
@@ -0,0 +1,201 @@
+# paie/services/file_pointage.py
+# Traitements différés des pointages : état du jour en cache et file persistante
+
+from datetime import date
+import logging
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.core.cache import cache
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from ..models import Employee, Pointage, TraitementPointage
+from .moteur_alertes import MoteurAlertesPresence
+from .resolveur_horaires import get_generation_horaires
+
+logger = logging.getLogger(__name__)
+
+CLE_ETAT_JOUR = 'paie:pointage:jour:{employe_id}:{jour}'
+CLE_HEURES_THEORIQUES = 'paie:pointage:theorique:{generation}:{employe_id}:{jour}'
+DUREE_ETAT_JOUR = 60 * 60 * 24
+
+# Au-delà, une tâche reste en file pour analyse mais n'est plus reprise
+MAX_TENTATIVES = 5
+
+
+def get_cle_etat_jour(employe_id: int, jour: date) -> str:
+    return CLE_ETAT_JOUR.format(employe_id=employe_id, jour=jour.isoformat())
+
+
+def get_etat_jour(employe_id: int, jour: date) -> Optional[Dict]:
+    """
+    État de pointage d'un employé pour un jour : nom et types déjà pointés
+
+    Lu en cache ; sinon reconstruit depuis la base (employé + pointages du jour)
+    et mis en cache. Retourne None si l'employé n'existe pas. Le cache doit être
+    partagé entre les processus (CACHES, voir README) : un pointage enregistré
+    par un serveur invalide l'état vu par les autres.
+    """
+    cle = get_cle_etat_jour(employe_id, jour)
+    etat = cache.get(cle)
+    if etat is not None:
+        return etat
+
+    employe = Employee.objects.filter(id=employe_id).values('last_name').first()
+    if employe is None:
+        return None
+
+    etat = {
+        'nom': employe['last_name'],
+        'types': list(Pointage.objects.filter(
+            employe_id=employe_id,
+            heure_pointage__date=jour
+        ).order_by('heure_pointage').values_list('type_pointage', flat=True)),
+    }
+    cache.set(cle, etat, DUREE_ETAT_JOUR)
+    return etat
+
+
+def enregistrer_etat_jour(employe_id: int, jour: date, etat: Dict):
+    cache.set(get_cle_etat_jour(employe_id, jour), etat, DUREE_ETAT_JOUR)
+
+
+def invalider_etat_jour(employe_id: int, jour: date):
+    """Appelé par le signal de Pointage (création, correction, suppression)"""
+    cache.delete(get_cle_etat_jour(employe_id, jour))
+
+
+def invalider_etats_jours(jours: Iterable[Tuple[int, date]]):
+    """Invalidation groupée, pour les suppressions en masse qui ne déclenchent pas le signal"""
+    cache.delete_many([get_cle_etat_jour(employe_id, jour) for employe_id, jour in jours])
+
+
+def get_cle_heures_theoriques(employe_id: int, jour: date) -> str:
+    """Clé liée à la génération des horaires : toute réaffectation la rend caduque"""
+    return CLE_HEURES_THEORIQUES.format(
+        generation=get_generation_horaires(), employe_id=employe_id, jour=jour.isoformat()
+    )
+
+
+def get_metriques_file() -> Dict:
+    """Backlog de la file : tâches en attente, en échec et âge de la plus ancienne"""
+    stats = TraitementPointage.objects.aggregate(
+        en_attente=Count('id', filter=Q(nb_tentatives__lt=MAX_TENTATIVES)),
+        en_echec=Count('id', filter=Q(nb_tentatives__gte=MAX_TENTATIVES)),
+        plus_ancienne=Min('date_creation', filter=Q(nb_tentatives__lt=MAX_TENTATIVES))
+    )
+    plus_ancienne = stats['plus_ancienne']
+    return {
+        'en_attente': stats['en_attente'],
+        'en_echec': stats['en_echec'],
+        'plus_ancienne': plus_ancienne,
+        'retard_secondes': (timezone.now() - plus_ancienne).total_seconds() if plus_ancienne else 0,
+    }
+
+
+class TraiteurFilePointage:
+    """
+    Dépile les TraitementPointage : recalcul de la présence journalière puis alertes
+
+    Une tâche n'est supprimée qu'une fois traitée et ses alertes écrites : après un
+    arrêt brutal, les tâches restantes sont reprises au lancement suivant (recalcul
+    et alertes sont idempotents). Un groupe en erreur, au recalcul comme aux
+    alertes, compte une tentative et n'empêche pas le reste du lot. Le moteur d'alertes est conservé d'un lot à l'autre
+    et reconstruit chaque jour ou quand une ReglePointage change.
+    """
+
+    def __init__(self, gestionnaire=None):
+        if gestionnaire is None:
+            from .gestionnaire_pointage import GestionnairePointage
+            gestionnaire = GestionnairePointage()
+        self.gestionnaire = gestionnaire
+        self.moteur: Optional[MoteurAlertesPresence] = None
+
+    def _get_moteur(self) -> MoteurAlertesPresence:
+        if self.moteur is None or self.moteur.est_perime():
+            self.moteur = MoteurAlertesPresence()
+        return self.moteur
+
+    def _traiter_alertes(self, groupes: Dict[tuple, list]):
+        moteur = None
+        try:
+            moteur = self._get_moteur()
+            moteur.traiter_presences(groupes)
+            moteur.vider_alertes()
+        except Exception:
+            if moteur is not None:
+                moteur.abandonner_alertes()
+            raise
+
+    @staticmethod
+    def _marquer_echec(taches: list, erreur: Exception):
+        for tache in taches:
+            tache.nb_tentatives += 1
+            tache.derniere_erreur = str(erreur)
+
+    def traiter_lot(self, taille_lot: int = 500) -> Dict:
+        """
+        Traite un lot de tâches, la présence étant recalculée une seule fois
+        par (employé, jour)
+
+        Returns:
+            Dict avec le nombre de tâches traitées, en échec et restantes
+        """
+        taches = list(TraitementPointage.objects.filter(
+            nb_tentatives__lt=MAX_TENTATIVES
+        ).select_related('employe').order_by('date_creation')[:taille_lot])
+
+        if not taches:
+            return {'traitees': 0, 'echecs': 0, 'restantes': 0}
+
+        groupes: Dict[tuple, list] = {}
+        for tache in taches:
+            groupes.setdefault((tache.employe_id, tache.date_pointage), []).append(tache)
+
+        # Horaires de toute la fenêtre du lot en une requête
+        jours = [jour for _, jour in groupes]
+        self.gestionnaire.charger_horaires(
+            min(jours), max(jours), employes_ids={employe_id for employe_id, _ in groupes}
+        )
+
+        recalcules = {}
+        en_echec = []
+        for couple, taches_groupe in groupes.items():
+            try:
+                self.gestionnaire.recalculer_presence_journaliere(taches_groupe[0].employe, couple[1])
+                recalcules[couple] = taches_groupe
+            except Exception as e:
+                logger.error(f"Erreur traitement différé pointage ({couple[1]}): {e}")
+                self._marquer_echec(taches_groupe, e)
+                en_echec.extend(taches_groupe)
+
+        # Alertes des présences recalculées, écrites en un lot ; en cas d'erreur,
+        # groupe par groupe pour n'écarter que celui qui la provoque
+        reussis = []
+        if recalcules:
+            try:
+                self._traiter_alertes(recalcules)
+                for taches_groupe in recalcules.values():
+                    reussis.extend(taches_groupe)
+            except Exception as e:
+                logger.error(f"Erreur alertes du lot de pointages, reprise par groupe: {e}")
+                for couple, taches_groupe in recalcules.items():
+                    try:
+                        self._traiter_alertes({couple: taches_groupe})
+                        reussis.extend(taches_groupe)
+                    except Exception as e:
+                        logger.error(f"Erreur alertes pointage ({couple[1]}): {e}")
+                        self._marquer_echec(taches_groupe, e)
+                        en_echec.extend(taches_groupe)
+
+        if reussis:
+            TraitementPointage.objects.filter(id__in=[t.id for t in reussis]).delete()
+
+        if en_echec:
+            TraitementPointage.objects.bulk_update(en_echec, ['nb_tentatives', 'derniere_erreur'])
+
+        return {
+            'traitees': len(reussis),
+            'echecs': len(en_echec),
+            'restantes': TraitementPointage.objects.filter(nb_tentatives__lt=MAX_TENTATIVES).count(),
+        }
@@ -0,0 +1,263 @@
+# paie/services/flux_conges.py
+# Flux du calendrier des congés : événements par (département, mois) en cache, abonnements ICS
+
+from collections import namedtuple
+from datetime import date, timedelta, timezone as dt_timezone
+import hashlib
+import json
+import logging
+from typing import Dict, Iterable, List, Optional
+
+from django.core import signing
+from django.core.cache import cache
+from django.utils import timezone
+
+from ..models import DemandeConge, Employee
+from .generations import CompteurGeneration
+
+logger = logging.getLogger(__name__)
+
+# Employés et types de congé (noms, couleurs) : tous les flux
+CLE_GENERATION_FLUX = 'paie:flux_conges:generation'
+# Congés d'un département ('tous' pour le calendrier sans filtre)
+CLE_GENERATION_DEPARTEMENT = 'paie:flux_conges:generation:{departement}'
+
+CLE_PAGE = 'paie:flux_conges:mois:{generation}:{departement}:{annee}-{mois:02d}'
+CLE_FLUX_EMPLOYE = 'paie:flux_conges:employe:{generation}:{employe_id}'
+# Filet de sécurité : les générations périment les pages dès qu'un congé change,
+# à condition que le cache soit partagé entre processus (CACHES, voir README)
+DUREE_CACHE = 60 * 60
+
+STATUTS_CALENDRIER = ['APPROUVEE', 'EN_COURS']
+
+# Fenêtre des abonnements ICS autour du mois courant
+MOIS_ICS_PASSES = 3
+MOIS_ICS_FUTURS = 12
+
+SEL_JETON = 'paie.flux_conges'
+# Au-delà, le client calendrier doit être réabonné avec une nouvelle adresse
+DUREE_JETON = 60 * 60 * 24 * 90
+
+# contenu : octets servis tels quels ; etag et derniere_modification pour les GET conditionnels
+PageCalendrier = namedtuple('PageCalendrier', 'contenu etag derniere_modification')
+
+
+_generation_flux = CompteurGeneration(CLE_GENERATION_FLUX)
+
+
+def _generation_departement(departement) -> CompteurGeneration:
+    return CompteurGeneration(CLE_GENERATION_DEPARTEMENT.format(departement=departement))
+
+
+def _generation(departement) -> str:
+    return '{}.{}'.format(_generation_flux.lire(), _generation_departement(departement).lire())
+
+
+def invalider_flux_conges(departements_ids: Optional[Iterable[Optional[int]]] = None):
+    """
+    Appelé par les signaux : congés de départements donnés, ou tous les flux
+    (departements_ids None : employé ou type de congé modifié)
+    """
+    if departements_ids is None:
+        _generation_flux.invalider()
+        return
+    for departement_id in set(departements_ids):
+        _generation_departement(departement_id).invalider()
+    _generation_departement('tous').invalider()
+
+
+def _calculer_etag(contenu: bytes) -> str:
+    return '"{}"'.format(hashlib.md5(contenu).hexdigest())
+
+
+def _bornes_mois(annee: int, mois: int):
+    debut = date(annee, mois, 1)
+    fin = (date(annee + mois // 12, mois % 12 + 1, 1)) - timedelta(days=1)
+    return debut, fin
+
+
+def _charger_conges(date_debut: date, date_fin: date, departement_id: Optional[int] = None,
+                    employe_id: Optional[int] = None):
+    conges = DemandeConge.objects.filter(
+        statut__in=STATUTS_CALENDRIER,
+        date_fin__gte=date_debut,
+        date_debut__lte=date_fin
+    ).select_related('employe', 'type_conge').only(
+        'numero_demande', 'date_debut', 'date_fin', 'nb_jours_ouvrables', 'statut', 'motif', 'date_modification',
+        'employe__first_name', 'employe__last_name',
+        'type_conge__libelle', 'type_conge__couleur_affichage'
+    ).order_by('date_debut', 'id')
+    if departement_id is not None:
+        conges = conges.filter(employe__department_id=departement_id)
+    if employe_id is not None:
+        conges = conges.filter(employe_id=employe_id)
+    return conges
+
+
+def _evenement(conge: DemandeConge) -> Dict:
+    """Événement au format FullCalendar"""
+    return {
+        'id': conge.id,
+        'title': f"{conge.employe.nom} - {conge.type_conge.libelle}",
+        'start': conge.date_debut.isoformat(),
+        'end': (conge.date_fin + timedelta(days=1)).isoformat(),  # FullCalendar end is exclusive
+        'backgroundColor': conge.type_conge.couleur_affichage,
+        'borderColor': conge.type_conge.couleur_affichage,
+        'extendedProps': {
+            'employe': f"{conge.employe.nom} {conge.employe.prenom}",
+            'type_conge': conge.type_conge.libelle,
+            'nb_jours': float(conge.nb_jours_ouvrables),
+            'statut': conge.get_statut_display(),
+            'motif': conge.motif,
+        }
+    }
+
+
+def _echapper_ics(texte: str) -> str:
+    return texte.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def _plier_ligne(ligne: str) -> str:
+    """Lignes ICS de 75 octets au plus, continuées par une espace (RFC 5545)"""
+    morceaux = []
+    courant = ''
+    for caractere in ligne:
+        if len((courant + caractere).encode('utf-8')) > (75 if not morceaux else 74):
+            morceaux.append(courant)
+            courant = ''
+        courant += caractere
+    morceaux.append(courant)
+    return '\r\n '.join(morceaux)
+
+
+def _vevent(conge: DemandeConge) -> str:
+    """Congé en VEVENT sur journées entières ; le motif n'est pas publié"""
+    horodatage = (conge.date_modification or timezone.now()).astimezone(dt_timezone.utc)
+    lignes = [
+        'BEGIN:VEVENT',
+        f'UID:conge-{conge.id}@paie',
+        f"DTSTAMP:{horodatage.strftime('%Y%m%dT%H%M%SZ')}",
+        f"DTSTART;VALUE=DATE:{conge.date_debut.strftime('%Y%m%d')}",
+        f"DTEND;VALUE=DATE:{(conge.date_fin + timedelta(days=1)).strftime('%Y%m%d')}",
+        'SUMMARY:' + _echapper_ics(f"{conge.employe.nom} {conge.employe.prenom} - {conge.type_conge.libelle}"),
+        'STATUS:CONFIRMED',
+        'TRANSP:TRANSPARENT',
+        'END:VEVENT',
+    ]
+    return ''.join(_plier_ligne(ligne) + '\r\n' for ligne in lignes)
+
+
+def _calendrier_ics(nom: str, vevents: Iterable[str]) -> bytes:
+    entete = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//Paie//Calendrier des conges//FR',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        'X-WR-CALNAME:' + _echapper_ics(nom),
+    ]
+    return (
+        ''.join(_plier_ligne(ligne) + '\r\n' for ligne in entete)
+        + ''.join(vevents)
+        + 'END:VCALENDAR\r\n'
+    ).encode('utf-8')
+
+
+def _page_mois(departement_id: Optional[int], annee: int, mois: int) -> Dict:
+    """
+    Données en cache d'un (département, mois) : JSON du calendrier et VEVENT
+    (identifiant, texte) des congés qui chevauchent le mois
+    """
+    departement = departement_id if departement_id is not None else 'tous'
+    cle = CLE_PAGE.format(generation=_generation(departement), departement=departement, annee=annee, mois=mois)
+    page = cache.get(cle)
+    if page is not None:
+        return page
+
+    date_debut, date_fin = _bornes_mois(annee, mois)
+    evenements = []
+    vevents = []
+    for conge in _charger_conges(date_debut, date_fin, departement_id):
+        evenements.append(_evenement(conge))
+        vevents.append((conge.id, _vevent(conge)))
+
+    contenu = json.dumps({
+        'success': True,
+        'events': evenements,
+        'periode': f"{mois:02d}/{annee}",
+    }).encode('utf-8')
+    page = {
+        'json': contenu,
+        'etag': _calculer_etag(contenu),
+        'vevents': vevents,
+        'modifie': timezone.now(),
+    }
+    cache.set(cle, page, DUREE_CACHE)
+    return page
+
+
+def get_evenements_mois(departement_id: Optional[int], annee: int, mois: int) -> PageCalendrier:
+    """Événements FullCalendar d'un mois, sérialisés une fois par (département, mois) et génération"""
+    page = _page_mois(departement_id, annee, mois)
+    return PageCalendrier(page['json'], page['etag'], page['modifie'])
+
+
+def _mois_fenetre(aujourd_hui: date) -> List[tuple]:
+    rang = aujourd_hui.year * 12 + aujourd_hui.month - 1
+    return [
+        (rang_mois // 12, rang_mois % 12 + 1)
+        for rang_mois in range(rang - MOIS_ICS_PASSES, rang + MOIS_ICS_FUTURS + 1)
+    ]
+
+
+def get_flux_ics_departement(departement_id: int, nom: str, aujourd_hui: Optional[date] = None) -> PageCalendrier:
+    """
+    Abonnement ICS d'un département, assemblé depuis les pages mensuelles en cache
+
+    Un congé à cheval sur plusieurs mois figure sur chacune de leurs pages : il
+    n'est repris qu'une fois, y compris s'il a commencé avant la fenêtre.
+    """
+    pages = [_page_mois(departement_id, annee, mois) for annee, mois in _mois_fenetre(aujourd_hui or date.today())]
+    vevents = {}
+    for page in pages:
+        for conge_id, vevent in page['vevents']:
+            vevents.setdefault(conge_id, vevent)
+    contenu = _calendrier_ics(f"Congés - {nom}", vevents.values())
+    return PageCalendrier(contenu, _calculer_etag(contenu), max(page['modifie'] for page in pages))
+
+
+def get_flux_ics_employe(employe: Employee, aujourd_hui: Optional[date] = None) -> PageCalendrier:
+    """Abonnement ICS d'un employé (invalidé avec les congés de son département)"""
+    cle = CLE_FLUX_EMPLOYE.format(generation=_generation(employe.department_id), employe_id=employe.id)
+    page = cache.get(cle)
+    if page is None:
+        fenetre = _mois_fenetre(aujourd_hui or date.today())
+        date_debut = _bornes_mois(*fenetre[0])[0]
+        date_fin = _bornes_mois(*fenetre[-1])[1]
+        contenu = _calendrier_ics(
+            f"Congés - {employe.first_name} {employe.last_name}",
+            (_vevent(conge) for conge in _charger_conges(date_debut, date_fin, employe_id=employe.id))
+        )
+        page = PageCalendrier(contenu, _calculer_etag(contenu), timezone.now())
+        cache.set(cle, page, DUREE_CACHE)
+    return page
+
+
+def signer_flux(utilisateur_id: int, departement_id: Optional[int] = None, employe_id: Optional[int] = None) -> str:
+    """
+    Jeton d'abonnement : les clients calendrier ne s'authentifient pas par session
+
+    Le jeton porte l'utilisateur qui l'a demandé : ses droits sont revérifiés à
+    chaque lecture (compte désactivé, employé parti ou changé de département).
+    """
+    return signing.TimestampSigner(salt=SEL_JETON).sign_object(
+        {'utilisateur': utilisateur_id, 'departement': departement_id, 'employe': employe_id}
+    )
+
+
+def lire_jeton(jeton: str) -> Optional[Dict]:
+    """Contenu du jeton, ou None s'il est altéré ou a plus de DUREE_JETON secondes"""
+    try:
+        return signing.TimestampSigner(salt=SEL_JETON).unsign_object(jeton, max_age=DUREE_JETON)
+    except signing.BadSignature:
+        return None
@@ -0,0 +1,52 @@
+# paie/services/generations.py
+# Compteurs de génération en cache : invalidation des index en mémoire et des pages en cache
+
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+def _generation_initiale() -> int:
+    """Horodatage en microsecondes : jamais inférieur à une génération déjà servie"""
+    return time.time_ns() // 1000
+
+
+class CompteurGeneration:
+    """
+    Numéro de génération d'une famille de données, partagé par tous les processus
+
+    Un mémo (index en mémoire, page en cache) retient la génération lue à sa
+    construction et est périmé dès qu'elle change. Le cache doit être partagé
+    entre processus (CACHES, voir README). Une clé absente (premier accès,
+    cache vidé ou entrée évincée) repart d'un horodatage plutôt que de 0 : un
+    mémo construit avant la perte ne peut pas retrouver sa génération.
+    """
+
+    def __init__(self, cle: str):
+        self.cle = cle
+
+    def lire(self) -> int:
+        generation = cache.get(self.cle)
+        if generation is None:
+            cache.add(self.cle, _generation_initiale(), None)
+            generation = cache.get(self.cle, 0)
+        return generation
+
+    def incrementer(self):
+        try:
+            cache.incr(self.cle)
+        except ValueError:
+            cache.add(self.cle, _generation_initiale(), None)
+
+    def invalider(self):
+        """
+        Change la génération tout de suite, puis de nouveau au commit
+
+        Le premier changement sert les lectures de la transaction en cours ; le
+        second périme ce qu'un autre processus aurait reconstruit entre-temps à
+        partir des lignes d'avant le commit.
+        """
+        self.incrementer()
+        if transaction.get_connection().in_atomic_block:
+            transaction.on_commit(self.incrementer)
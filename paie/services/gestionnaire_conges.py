@@ -1,18 +1,35 @@
 # paie/services/gestionnaire_conges.py
 # Service métier pour la gestion des congés
 
-from decimal import Decimal, ROUND_HALF_UP
+from decimal import Decimal
 from datetime import datetime, date, timedelta
 from django.db import transaction
+from django.db.models import Count, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
 from django.contrib.auth.models import User
-from django.core.mail import send_mail
-from django.conf import settings
 from typing import Dict, List, Tuple, Optional
 import logging
 import json
 
+from .acquisition_conges import anciennete_mois, jours_acquis, jours_acquis_lot
+from .calendrier_ouvrable import get_calendrier
+from .flux_conges import invalider_flux_conges
+from .index_conges import STATUTS_ACCORDES, STATUTS_EN_ATTENTE, get_index_conges, invalider_index_conges
+from .journal_soldes import (
+    CHAMPS_MOUVEMENT, STATUTS_DECOMPTES, comptabiliser_transition, comptabiliser_transitions, totaux_journal
+)
+from .notifications_conges import mettre_en_file, mettre_en_file_lot, preparer_notification
+from .planning_conges import OccupationConges
+from .regles_conges import get_regles_validation_conges
+from .statistiques_conges import invalider_statistiques_conges
+
 logger = logging.getLogger(__name__)
 
+# Statuts qu'un refus en lot ne rouvre pas
+STATUTS_CLOTURES = ['BROUILLON', 'REFUSEE', 'ANNULEE', 'TERMINEE']
+
+
 class GestionnaireConges:
     """
     Service principal pour la gestion des congés
@@ -23,7 +40,7 @@ class GestionnaireConges:
         # Import des modèles ici pour éviter les imports circulaires
         from paie.models import (
             TypeConge, SoldeConge, DemandeConge, 
-            ApprobationConge, RegleConge, Employee
+            ApprobationConge, RegleConge, Employee, MouvementSolde
         )
         self.TypeConge = TypeConge
         self.SoldeConge = SoldeConge
@@ -31,6 +48,7 @@ class GestionnaireConges:
         self.ApprobationConge = ApprobationConge
         self.RegleConge = RegleConge
         self.Employee = Employee
+        self.MouvementSolde = MouvementSolde
     
     # ================== GESTION DES SOLDES ==================
     
@@ -69,35 +87,17 @@ class GestionnaireConges:
     def _calculer_solde_type_specifique(self, employe, type_conge, annee):
         """Calcule le solde pour un type de congé spécifique"""
         
-        # Récupérer ou créer le solde
-        solde, created = self.SoldeConge.objects.get_or_create(
-            employe=employe,
-            type_conge=type_conge,
-            annee=annee,
-            defaults={
-                'jours_acquis': Decimal('0'),
-                'jours_pris': Decimal('0'),
-                'jours_reportes': Decimal('0'),
-                'ajustement_manuel': Decimal('0'),
-            }
-        )
-        
-        if created or self._doit_recalculer_solde(solde):
-            # Calcul des jours acquis selon les règles
-            jours_acquis = self._calculer_jours_acquis(employe, type_conge, annee)
-            
-            # Calcul des jours pris (demandes approuvées)
-            jours_pris = self._calculer_jours_pris(employe, type_conge, annee)
-            
-            # Calcul des jours reportés de l'année précédente
-            jours_reportes = self._calculer_jours_reportes(employe, type_conge, annee)
-            
-            # Mise à jour du solde
-            solde.jours_acquis = jours_acquis
-            solde.jours_pris = jours_pris
-            solde.jours_reportes = jours_reportes
-            solde.save()
+        # Le solde suit le journal ; seul un solde inexistant est calculé (ouverture)
+        solde = self.SoldeConge.objects.filter(employe=employe, type_conge=type_conge, annee=annee).first()
+        if solde is None:
+            self.recalculer_soldes_lot(
+                annee, self.Employee.objects.filter(pk=employe.pk), [type_conge], forcer=False
+            )
+            solde = self.SoldeConge.objects.get(employe=employe, type_conge=type_conge, annee=annee)
         
+        return self._formater_solde(solde, type_conge)
+    
+    def _formater_solde(self, solde, type_conge):
         return {
             'type_conge': type_conge,
             'jours_acquis': float(solde.jours_acquis),
@@ -110,99 +110,234 @@ class GestionnaireConges:
     
     def _calculer_jours_acquis(self, employe, type_conge, annee):
         """Calcule les jours acquis selon les règles du type de congé"""
+        return jours_acquis(
+            employe.date_embauche, annee, date.today(),
+            type_conge.jours_acquis_par_mois, type_conge.anciennete_minimum_mois
+        )
+    
+    @transaction.atomic
+    def recalculer_soldes_lot(self, annee=None, employes=None, types_conges=None, forcer=True):
+        """
+        Recalcule en une passe les soldes d'un ensemble d'employés pour une année
         
-        if type_conge.jours_acquis_par_mois <= 0:
-            return Decimal('0')
-        
-        # Date d'embauche et ancienneté
-        if not employe.date_embauche:
-            return Decimal('0')
-        
-        date_debut_annee = date(annee, 1, 1)
-        date_fin_annee = date(annee, 12, 31)
-        
-        # Date de début de calcul (embauche ou début d'année)
-        date_debut = max(employe.date_embauche, date_debut_annee)
+        Acquisitions, jours pris et reports sont calculés avec un nombre de requêtes
+        indépendant de l'effectif (jours pris de l'année groupés par (employé, type),
+        soldes de l'année précédente et journal de l'année lus en une fois). L'écart
+        entre ces valeurs et le journal est posté en mouvements (ouverture du journal,
+        acquisition du mois écoulé, régularisation), puis les soldes sont écrits par
+        bulk_create / bulk_update. C'est l'écriture périodique des acquisitions.
         
-        # Vérifier ancienneté minimum
-        anciennete_mois = self._calculer_anciennete_mois(employe.date_embauche, date_debut)
-        if anciennete_mois < type_conge.anciennete_minimum_mois:
-            return Decimal('0')
+        Args:
+            annee: Année (défaut: année courante)
+            employes: QuerySet Employee (défaut: employés actifs)
+            types_conges: TypeConge à traiter (défaut: tous les actifs)
+            forcer: Si False, seuls les soldes inexistants sont ouverts ; les autres
+                suivent le journal et sont conservés
         
-        # Calculer les mois travaillés dans l'année
-        if date_debut > date_fin_annee:
-            return Decimal('0')
+        Returns:
+            Dict avec le nombre d'employés traités, de soldes créés, modifiés ou conservés
+            et de mouvements postés
+        """
+        from .gestionnaire_pointage import get_parametre_pointage
         
-        date_fin_calcul = min(date.today(), date_fin_annee)
-        if date_fin_calcul < date_debut:
-            return Decimal('0')
+        if annee is None:
+            annee = datetime.now().year
+        if employes is None:
+            employes = self.Employee.objects.filter(is_active=True)
+        types_conges = list(types_conges if types_conges is not None else self.TypeConge.objects.filter(actif=True))
+        
+        embauches = dict(employes.order_by().values_list('id', 'hire_date'))
+        ids_employes = employes.order_by().values('id')
+        
+        jours_pris = {
+            (employe_id, type_id): total
+            for employe_id, type_id, total in self.DemandeConge.objects.filter(
+                employe_id__in=ids_employes,
+                type_conge__in=types_conges,
+                statut__in=STATUTS_DECOMPTES,
+                date_debut__year=annee
+            ).order_by().values_list('employe_id', 'type_conge_id').annotate(total=Sum('nb_jours_ouvrables'))
+        }
         
-        # Nombre de mois complets + prorata du mois partiel
-        mois_complets = 0
-        current_date = date_debut
+        disponibles_precedents = {
+            (employe_id, type_id): acquis + reportes + ajustement - pris
+            for employe_id, type_id, acquis, reportes, ajustement, pris in self.SoldeConge.objects.filter(
+                employe_id__in=ids_employes,
+                type_conge__in=types_conges,
+                annee=annee - 1
+            ).values_list('employe_id', 'type_conge_id', 'jours_acquis', 'jours_reportes',
+                          'ajustement_manuel', 'jours_pris')
+        }
         
-        while current_date <= date_fin_calcul:
-            if current_date.day == 1:
-                # Mois complet
-                mois_complets += 1
-                if current_date.month == 12:
-                    current_date = current_date.replace(year=current_date.year + 1, month=1)
-                else:
-                    current_date = current_date.replace(month=current_date.month + 1)
-            else:
-                # Mois partiel - calculer prorata
-                jours_dans_mois = self._jours_dans_mois(current_date.year, current_date.month)
-                jours_travailles = jours_dans_mois - current_date.day + 1
+        existants = {
+            (solde.employe_id, solde.type_conge_id): solde
+            for solde in self.SoldeConge.objects.filter(
+                employe_id__in=ids_employes,
+                type_conge__in=types_conges,
+                annee=annee
+            )
+        }
+        journal = totaux_journal(annee, employes, types_conges)
+        journal_vide = dict.fromkeys(CHAMPS_MOUVEMENT.values(), Decimal('0'))
+        
+        aujourd_hui = date.today()
+        
+        maintenant = timezone.now()
+        a_creer = []
+        a_modifier = []
+        mouvements = []
+        nb_conserves = 0
+        
+        for type_conge in types_conges:
+            max_report = Decimal(str(getattr(type_conge, 'max_jours_report', 5)))
+            acquisitions = jours_acquis_lot(
+                embauches.values(), annee, aujourd_hui,
+                type_conge.jours_acquis_par_mois, type_conge.anciennete_minimum_mois
+            )
+            
+            for (employe_id, date_embauche), jours_acquis_employe in zip(embauches.items(), acquisitions):
+                solde = existants.get((employe_id, type_conge.id))
+                if solde is not None and not forcer:
+                    nb_conserves += 1
+                    continue
+                
+                jours_reportes = Decimal('0')
+                if date_embauche and type_conge.report_autorise and annee > date_embauche.year:
+                    disponible = disponibles_precedents.get((employe_id, type_conge.id), Decimal('0'))
+                    if disponible > 0:
+                        jours_reportes = min(disponible, max_report)
+                
+                valeurs = {
+                    'jours_acquis': jours_acquis_employe,
+                    'jours_pris': jours_pris.get((employe_id, type_conge.id)) or Decimal('0'),
+                    'jours_reportes': jours_reportes,
+                    # Seuls les ajustements faits hors journal donnent lieu à un mouvement
+                    'ajustement_manuel': solde.ajustement_manuel if solde is not None else Decimal('0'),
+                }
                 
-                if date_fin_calcul.month == current_date.month and date_fin_calcul.year == current_date.year:
-                    jours_travailles = date_fin_calcul.day - current_date.day + 1
+                deja_postes = journal.get((employe_id, type_conge.id), journal_vide)
+                for type_mouvement, champ in CHAMPS_MOUVEMENT.items():
+                    ecart = valeurs[champ] - deja_postes[champ]
+                    if ecart:
+                        mouvements.append(self.MouvementSolde(
+                            employe_id=employe_id, type_conge=type_conge, annee=annee,
+                            type_mouvement=type_mouvement, jours=ecart, libelle='Recalcul en lot'
+                        ))
                 
-                prorata = Decimal(str(jours_travailles)) / Decimal(str(jours_dans_mois))
-                mois_complets += float(prorata)
-                break
+                if solde is None:
+                    a_creer.append(self.SoldeConge(
+                        employe_id=employe_id, type_conge=type_conge, annee=annee, **valeurs
+                    ))
+                else:
+                    for champ, valeur in valeurs.items():
+                        setattr(solde, champ, valeur)
+                    # bulk_update ne déclenche pas auto_now
+                    solde.date_derniere_maj = maintenant
+                    a_modifier.append(solde)
+        
+        taille_lot = get_parametre_pointage('BATCH_SIZE')
+        self.MouvementSolde.objects.bulk_create(mouvements, batch_size=taille_lot)
+        self.SoldeConge.objects.bulk_create(a_creer, batch_size=taille_lot)
+        self.SoldeConge.objects.bulk_update(
+            a_modifier,
+            [*CHAMPS_MOUVEMENT.values(), 'date_derniere_maj'],
+            batch_size=taille_lot
+        )
         
-        jours_acquis = Decimal(str(mois_complets)) * type_conge.jours_acquis_par_mois
-        return jours_acquis.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        logger.info(
+            f"Soldes {annee} recalculés pour {len(embauches)} employés: "
+            f"{len(a_creer)} créés, {len(a_modifier)} modifiés, {nb_conserves} conservés, "
+            f"{len(mouvements)} mouvements"
+        )
+        return {
+            'nb_employes': len(embauches),
+            'nb_crees': len(a_creer),
+            'nb_modifies': len(a_modifier),
+            'nb_conserves': nb_conserves,
+            'nb_mouvements': len(mouvements),
+        }
     
-    def _calculer_jours_pris(self, employe, type_conge, annee):
-        """Calcule les jours pris (demandes approuvées) pour l'année"""
+    def get_soldes_lot(self, annee, employes, types_conges=None):
+        """
+        Soldes d'un ensemble restreint d'employés (une page d'écran), lus sur SoldeConge
         
-        demandes_approuvees = self.DemandeConge.objects.filter(
-            employe=employe,
-            type_conge=type_conge,
-            statut__in=['APPROUVEE', 'EN_COURS', 'TERMINEE'],
-            date_debut__year=annee
-        )
+        Les soldes suivent le journal ; seuls ceux qui n'existent pas encore sont ouverts, en un lot.
         
-        total_jours = sum(
-            demande.nb_jours_ouvrables for demande in demandes_approuvees
-        )
+        Returns:
+            Dict {employe_id: {code_type: solde}} au format de calculer_soldes_employe
+        """
+        types_conges = list(types_conges if types_conges is not None else self.TypeConge.objects.filter(actif=True))
+        self.ouvrir_soldes_manquants(annee, employes, types_conges)
         
-        return Decimal(str(total_jours))
+        types_par_id = {type_conge.id: type_conge for type_conge in types_conges}
+        soldes = {employe_id: {} for employe_id in employes.values_list('id', flat=True)}
+        for solde in self._soldes_enregistres(annee, employes, types_conges).order_by('type_conge__ordre_affichage', 'type_conge__libelle'):
+            type_conge = types_par_id[solde.type_conge_id]
+            soldes[solde.employe_id][type_conge.code] = self._formater_solde(solde, type_conge)
+        return soldes
     
-    def _calculer_jours_reportes(self, employe, type_conge, annee):
-        """Calcule les jours reportés de l'année précédente"""
+    def ouvrir_soldes_manquants(self, annee, employes, types_conges=None):
+        """
+        Ouvre en un lot les soldes de l'année qui n'existent pas encore
         
-        if not type_conge.report_autorise or annee <= employe.date_embauche.year:
-            return Decimal('0')
+        Une requête suffit quand tous les soldes existent ; sinon seuls les employés
+        concernés passent par recalculer_soldes_lot (forcer=False).
         
-        try:
-            solde_precedent = self.SoldeConge.objects.get(
-                employe=employe,
-                type_conge=type_conge,
-                annee=annee - 1
+        Returns:
+            Nombre d'employés dont au moins un solde manquait
+        """
+        types_conges = list(types_conges if types_conges is not None else self.TypeConge.objects.filter(actif=True))
+        if not types_conges:
+            return 0
+        incomplets = list(employes.order_by().annotate(
+            nb_soldes=Count('soldes_conges', filter=Q(
+                soldes_conges__annee=annee, soldes_conges__type_conge__in=types_conges
+            ))
+        ).filter(nb_soldes__lt=len(types_conges)).values_list('id', flat=True))
+        if incomplets:
+            self.recalculer_soldes_lot(
+                annee, employes=self.Employee.objects.filter(id__in=incomplets),
+                types_conges=types_conges, forcer=False
             )
-            
-            jours_restants = solde_precedent.jours_disponibles
-            if jours_restants > 0:
-                # Appliquer les règles de report (max 5 jours par exemple)
-                max_report = getattr(type_conge, 'max_jours_report', 5)
-                return min(jours_restants, Decimal(str(max_report)))
-            
-        except self.SoldeConge.DoesNotExist:
-            pass
-        
-        return Decimal('0')
+        return len(incomplets)
+    
+    def _soldes_enregistres(self, annee, employes, types_conges=None):
+        if types_conges is None:
+            types_conges = self.TypeConge.objects.filter(actif=True)
+        return self.SoldeConge.objects.filter(
+            employe_id__in=employes.order_by().values('id'),
+            type_conge__in=types_conges,
+            annee=annee
+        )
+    
+    def _jours_restants_expr(self):
+        """Équivalent SQL de SoldeConge.jours_restants"""
+        disponibles = F('jours_acquis') + F('jours_reportes') + F('ajustement_manuel') - F('jours_pris')
+        return Greatest(disponibles, Value(Decimal('0')), output_field=DecimalField(max_digits=8, decimal_places=2))
+    
+    def get_totaux_soldes(self, annee, employes, types_conges=None):
+        """Totaux des soldes enregistrés d'un ensemble d'employés, en une requête d'agrégat"""
+        totaux = self._soldes_enregistres(annee, employes, types_conges).aggregate(
+            total_acquis=Sum('jours_acquis'),
+            total_pris=Sum('jours_pris'),
+            total_restants=Sum(self._jours_restants_expr()),
+        )
+        return {champ: float(valeur or 0) for champ, valeur in totaux.items()}
+    
+    def get_alertes_soldes(self, annee, employes, types_conges=None, seuil_restants=30, limite=10):
+        """Employés dont le cumul de jours restants dépasse le seuil (congés non pris)"""
+        employes_alerte = self._soldes_enregistres(annee, employes, types_conges).order_by().values(
+            'employe_id', 'employe__first_name', 'employe__last_name'
+        ).annotate(
+            total_restants=Sum(self._jours_restants_expr())
+        ).filter(
+            total_restants__gt=seuil_restants
+        ).order_by('employe__last_name', 'employe__first_name')[:limite]
+        
+        return [
+            f"{ligne['employe__first_name']} {ligne['employe__last_name']} a beaucoup de congés non pris"
+            for ligne in employes_alerte
+        ]
     
     # ================== VALIDATION DES DEMANDES ==================
     
@@ -241,9 +376,12 @@ class GestionnaireConges:
             
             # 2. Calcul du nombre de jours
             nb_jours_calendaires = (date_fin - date_debut).days + 1
-            nb_jours_ouvrables = self.calculer_jours_ouvrables(date_debut, date_fin, type_conge.decompte_weekend)
+            nb_jours_ouvrables = self.calculer_jours_ouvrables(
+                date_debut, date_fin, type_conge.decompte_weekend, site_id=employe.site_id
+            )
             
             # 3. Validation des soldes
+            solde = None
             if type_conge.categorie in ['LEGAL', 'FORMATION']:
                 annee = date_debut.year
                 solde = self._calculer_solde_type_specifique(employe, type_conge, annee)
@@ -252,13 +390,13 @@ class GestionnaireConges:
                     erreurs.append(f"Solde insuffisant. Disponible: {solde['jours_disponibles']} jours")
             
             # 4. Validation des règles spécifiques
-            erreurs_regles = self._valider_regles_metier(demande_data, employe)
+            erreurs_regles = self._valider_regles_metier(employe, type_conge, date_debut, date_fin)
             erreurs.extend(erreurs_regles)
             
             # 5. Validation des conflits
-            conflits = self._detecter_conflits_planning(employe, date_debut, date_fin)
-            if conflits:
-                warnings.extend(conflits)
+            erreurs_conflits, conflits = self._detecter_conflits_planning(employe, date_debut, date_fin, type_conge)
+            erreurs.extend(erreurs_conflits)
+            warnings.extend(conflits)
             
             # 6. Validation justificatifs
             if type_conge.justificatif_requis and not demande_data.get('justificatif'):
@@ -270,7 +408,7 @@ class GestionnaireConges:
                 'warnings': warnings,
                 'nb_jours_calendaires': nb_jours_calendaires,
                 'nb_jours_ouvrables': nb_jours_ouvrables,
-                'solde_apres': solde['jours_disponibles'] - nb_jours_ouvrables if len(erreurs) == 0 else None
+                'solde_apres': solde['jours_disponibles'] - nb_jours_ouvrables if solde and len(erreurs) == 0 else None
             }
             
         except Exception as e:
@@ -283,60 +421,43 @@ class GestionnaireConges:
                 'nb_jours_ouvrables': 0
             }
     
-    def _valider_regles_metier(self, demande_data, employe):
-        """Valide les règles métier configurables"""
-        erreurs = []
-        
-        regles = self.RegleConge.objects.filter(
-            actif=True,
-            types_conge=demande_data['type_conge']
-        )
+    def _valider_regles_metier(self, employe, type_conge, date_debut, date_fin):
+        """Valide les règles métier configurables (compilées, voir regles_conges)"""
+        return get_regles_validation_conges().valider(employe, type_conge, date_debut, date_fin)
+    
+    def _detecter_conflits_planning(self, employe, date_debut, date_fin, type_conge=None):
+        """
+        Détecte les conflits de planning
         
-        for regle in regles:
-            if regle.type_regle == 'VALIDATION':
-                parametres = regle.parametres
-                
-                # Exemple de règles configurables
-                if 'max_jours_consecutifs' in parametres:
-                    nb_jours = (demande_data['date_fin'] - demande_data['date_debut']).days + 1
-                    if nb_jours > parametres['max_jours_consecutifs']:
-                        erreurs.append(f"Maximum {parametres['max_jours_consecutifs']} jours consécutifs autorisés")
-                
-                if 'delai_minimum_demande' in parametres:
-                    delai = (demande_data['date_debut'] - date.today()).days
-                    if delai < parametres['delai_minimum_demande']:
-                        erreurs.append(f"Demande doit être faite {parametres['delai_minimum_demande']} jours à l'avance")
+        Lus sur l'index des congés du département, en mémoire : aucune requête
+        tant qu'aucune demande ni règle n'a changé.
         
-        return erreurs
-    
-    def _detecter_conflits_planning(self, employe, date_debut, date_fin):
-        """Détecte les conflits de planning"""
+        Returns:
+            Tuple (erreurs, warnings) ; une règle de planification bloquante produit une erreur
+        """
+        erreurs = []
         warnings = []
+        index = get_index_conges()
         
         # Vérifier chevauchement avec autres demandes
-        demandes_existantes = self.DemandeConge.objects.filter(
-            employe=employe,
-            statut__in=['SOUMISE', 'EN_ATTENTE_MANAGER', 'EN_ATTENTE_RH', 'APPROUVEE'],
-            date_fin__gte=date_debut,
-            date_debut__lte=date_fin
-        )
-        
-        if demandes_existantes.exists():
+        if index.demandes_employe(employe.id, employe.department_id, date_debut, date_fin):
             warnings.append("Chevauchement avec une demande existante")
         
-        # Vérifier absence simultanée dans l'équipe (si règle configurée)
-        if employe.department:
-            demandes_equipe = self.DemandeConge.objects.filter(
-                employe__department=employe.department,
-                statut='APPROUVEE',
-                date_fin__gte=date_debut,
-                date_debut__lte=date_fin
-            ).exclude(employe=employe)
-            
-            if demandes_equipe.count() >= 2:  # Plus de 2 personnes absentes
-                warnings.append("Plusieurs collègues déjà en congé sur cette période")
+        # Vérifier absence simultanée dans l'équipe (règles de planification)
+        if employe.department_id:
+            for regle in index.regles_planification(employe.department_id, type_conge.id if type_conge else None):
+                statuts = STATUTS_ACCORDES + STATUTS_EN_ATTENTE if regle.inclure_en_attente else STATUTS_ACCORDES
+                nb_absents = index.pic_absences(
+                    employe.department_id, date_debut, date_fin, exclure=employe.id, statuts=statuts
+                )
+                if nb_absents + 1 > regle.max_absents:
+                    message = (
+                        f"Plusieurs collègues déjà en congé sur cette période "
+                        f"({nb_absents} absent(s) le même jour, maximum {regle.max_absents} simultanés)"
+                    )
+                    (erreurs if regle.bloquant else warnings).append(message)
         
-        return warnings
+        return erreurs, warnings
     
     # ================== WORKFLOW D'APPROBATION ==================
     
@@ -355,10 +476,9 @@ class GestionnaireConges:
                 }
             
             # Calculer la date de reprise (jour ouvrable suivant la date_fin)
-            date_reprise = demande_data['date_fin'] + timedelta(days=1)
-            # Ajuster au prochain jour ouvrable si c'est un weekend
-            while date_reprise.weekday() >= 5:  # 5=samedi, 6=dimanche
-                date_reprise += timedelta(days=1)
+            date_reprise = get_calendrier(employe.site_id).jour_ouvrable_suivant(
+                demande_data['date_fin'] + timedelta(days=1)
+            )
             
             # Créer la demande
             demande = self.DemandeConge.objects.create(
@@ -436,9 +556,9 @@ class GestionnaireConges:
             # Enregistrer l'action
             self._enregistrer_action(demande, action, user, role, commentaire, ancien_statut)
             
-            # Mettre à jour les soldes si demande complètement approuvée
+            # Consommer les jours si demande complètement approuvée
             if demande.statut == 'APPROUVEE':
-                self._mettre_a_jour_soldes(demande)
+                self._mettre_a_jour_soldes(demande, ancien_statut, user)
             
             # Notifications
             self._envoyer_notifications_approbation(demande, action)
@@ -485,6 +605,9 @@ class GestionnaireConges:
             
             self._enregistrer_action(demande, action, user, role, commentaire, ancien_statut)
             
+            # Restituer les jours d'une demande refusée après accord
+            self._mettre_a_jour_soldes(demande, ancien_statut, user)
+            
             # Notifications
             self._envoyer_notifications_refus(demande, commentaire)
             
@@ -502,31 +625,135 @@ class GestionnaireConges:
                 'erreur': f'Erreur système: {str(e)}'
             }
     
+    @transaction.atomic
+    def traiter_demandes_lot(self, demande_ids, action, user, commentaire="", role=""):
+        """
+        Approuve ou refuse plusieurs demandes en une transaction
+        
+        Les demandes sont verrouillées en une requête ; statuts, historique,
+        mouvements de soldes et notifications sont écrits en lot. Une demande
+        refusée par les contrôles (introuvable, permissions, statut) n'empêche
+        pas le traitement des autres.
+        
+        Args:
+            action: 'approve' ou 'reject'
+        
+        Returns:
+            Dict avec le résultat de chaque demande, dans l'ordre de demande_ids
+        """
+        demande_ids = list(dict.fromkeys(demande_ids))
+        demandes = self.DemandeConge.objects.select_for_update(of=('self',)).select_related(
+            'employe', 'type_conge', 'manager_assigne'
+        ).in_bulk(demande_ids)
+        
+        resultats = []
+        modifiees = []
+        transitions = []
+        approbations = []
+        notifications = []
+        maintenant = timezone.now()
+        
+        for demande_id in demande_ids:
+            demande = demandes.get(demande_id)
+            if demande is None:
+                resultats.append({'id': demande_id, 'success': False, 'erreur': 'Demande introuvable'})
+                continue
+            
+            if not self._peut_approuver(demande, user, role):
+                resultats.append({
+                    'id': demande_id,
+                    'success': False,
+                    'erreur': 'Permissions insuffisantes'
+                })
+                continue
+            
+            ancien_statut = demande.statut
+            if action == 'approve':
+                if demande.statut == 'EN_ATTENTE_MANAGER':
+                    demande.statut = 'EN_ATTENTE_RH'
+                    action_historique = 'APPROBATION_MANAGER'
+                elif demande.statut == 'EN_ATTENTE_RH':
+                    demande.statut = 'APPROUVEE'
+                    action_historique = 'APPROBATION_RH'
+                else:
+                    resultats.append({
+                        'id': demande_id,
+                        'success': False,
+                        'erreur': f'Impossible d\'approuver une demande au statut {demande.statut}'
+                    })
+                    continue
+                notifications.append(self._preparer_notification_approbation(demande))
+            elif demande.statut in STATUTS_CLOTURES:
+                resultats.append({
+                    'id': demande_id,
+                    'success': False,
+                    'erreur': f'Impossible de refuser une demande au statut {demande.statut}'
+                })
+                continue
+            else:
+                demande.statut = 'REFUSEE'
+                action_historique = 'REFUS_MANAGER' if 'MANAGER' in ancien_statut else 'REFUS_RH'
+                notifications.append(self._preparer_notification_refus(demande, commentaire))
+            
+            demande.date_modification = maintenant
+            modifiees.append(demande)
+            transitions.append((demande, ancien_statut))
+            approbations.append(self.ApprobationConge(
+                demande=demande,
+                action=action_historique,
+                utilisateur=user,
+                role_utilisateur=role,
+                commentaire=commentaire,
+                statut_precedent=ancien_statut,
+                statut_nouveau=demande.statut
+            ))
+            resultats.append({
+                'id': demande_id,
+                'success': True,
+                'numero_demande': demande.numero_demande,
+                'nouveau_statut': demande.statut,
+                'action': action_historique
+            })
+        
+        if modifiees:
+            from .gestionnaire_pointage import get_parametre_pointage
+            
+            taille_lot = get_parametre_pointage('BATCH_SIZE')
+            self.DemandeConge.objects.bulk_update(modifiees, ['statut', 'date_modification'], batch_size=taille_lot)
+            self.ApprobationConge.objects.bulk_create(approbations, batch_size=taille_lot)
+            comptabiliser_transitions(transitions, user)
+            mettre_en_file_lot(notifications)
+            # bulk_update ne déclenche pas le signal de DemandeConge
+            invalider_index_conges()
+            invalider_flux_conges(demande.employe.department_id for demande in modifiees)
+            invalider_statistiques_conges()
+        
+        logger.info(
+            f"Traitement en lot ({action}) par {user}: {len(modifiees)}/{len(demande_ids)} demande(s)"
+        )
+        return {
+            'traitees': len(modifiees),
+            'erreurs': len(demande_ids) - len(modifiees),
+            'resultats': resultats,
+        }
+    
     # ================== UTILITAIRES ==================
     
-    def calculer_jours_ouvrables(self, date_debut, date_fin, inclure_weekend=False):
-        """Calcule le nombre de jours ouvrables entre deux dates"""
+    def calculer_jours_ouvrables(self, date_debut, date_fin, inclure_weekend=False, site_id=None):
+        """
+        Calcule le nombre de jours ouvrables entre deux dates
+        
+        Week-ends et jours fériés (nationaux et du site) exclus, lus sur le
+        calendrier ouvrable du site en temps constant.
+        """
         
         if date_debut > date_fin:
             return 0
         
-        jours_total = (date_fin - date_debut).days + 1
-        
         if inclure_weekend:
-            return jours_total
-        
-        # Exclure weekends
-        jours_ouvrables = 0
-        current_date = date_debut
+            return (date_fin - date_debut).days + 1
         
-        while current_date <= date_fin:
-            if current_date.weekday() < 5:  # Lundi=0, Vendredi=4
-                jours_ouvrables += 1
-            current_date += timedelta(days=1)
-        
-        # TODO: Exclure les jours fériés configurés
-        
-        return jours_ouvrables
+        return get_calendrier(site_id).nb_jours_ouvrables(date_debut, date_fin)
     
     def generer_planning_equipe(self, departement=None, mois=None, annee=None):
         """Génère le planning des congés pour une équipe"""
@@ -548,26 +775,17 @@ class GestionnaireConges:
         if departement:
             employes = employes.filter(department=departement)
         
-        # Congés du mois
-        conges = self.DemandeConge.objects.filter(
-            statut__in=['APPROUVEE', 'EN_COURS'],
-            date_fin__gte=date_debut,
-            date_debut__lte=date_fin,
-            employe__in=employes
-        ).select_related('employe', 'type_conge')
+        # Congés du mois, reportés jour par jour
+        occupation = OccupationConges(date_debut, date_fin, employes.order_by('last_name', 'first_name')).charger()
         
         # Organiser par employé
-        planning = {}
-        for employe in employes:
-            planning[employe] = {
-                'conges': [c for c in conges if c.employe == employe],
-                'jours_absents': sum(
-                    self.calculer_jours_ouvrables(
-                        max(c.date_debut, date_debut),
-                        min(c.date_fin, date_fin)
-                    ) for c in conges if c.employe == employe
-                )
+        planning = {
+            employe: {
+                'conges': occupation.conges_par_employe.get(employe.id, []),
+                'jours_absents': occupation.jours_absents.get(employe.id, 0),
             }
+            for employe in occupation.employes.values()
+        }
         
         return {
             'periode': f"{mois:02d}/{annee}",
@@ -575,34 +793,21 @@ class GestionnaireConges:
             'date_fin': date_fin,
             'departement': departement,
             'planning': planning,
+            'occupation': occupation,
+            'jours_mois': occupation.jours(),
+            'conges_json': occupation.conges_json(),
+            'conflits': occupation.conflits({
+                departement_id: min(regle.max_absents for regle in get_index_conges().regles_planification(departement_id))
+                for departement_id in occupation.absents
+            }),
             'total_jours_ouvrables': self.calculer_jours_ouvrables(date_debut, date_fin),
         }
     
     # ================== MÉTHODES PRIVÉES ==================
     
-    def _doit_recalculer_solde(self, solde):
-        """Détermine si un solde doit être recalculé"""
-        # Recalculer si dernière MAJ > 24h ou si données manquantes
-        if not solde.date_derniere_maj:
-            return True
-        
-        delta = datetime.now() - solde.date_derniere_maj.replace(tzinfo=None)
-        return delta.total_seconds() > 86400  # 24h
-    
     def _calculer_anciennete_mois(self, date_embauche, date_reference):
         """Calcule l'ancienneté en mois"""
-        if not date_embauche:
-            return 0
-        
-        delta = date_reference - date_embauche
-        return int(delta.days / 30.44)  # Moyenne de jours par mois
-    
-    def _jours_dans_mois(self, annee, mois):
-        """Retourne le nombre de jours dans un mois"""
-        if mois == 12:
-            return (date(annee + 1, 1, 1) - date(annee, mois, 1)).days
-        else:
-            return (date(annee, mois + 1, 1) - date(annee, mois, 1)).days
+        return anciennete_mois(date_embauche, date_reference)
     
     def _avancer_workflow(self, demande):
         """Avance automatiquement le workflow selon les règles"""
@@ -643,69 +848,56 @@ class GestionnaireConges:
             statut_nouveau=demande.statut
         )
     
-    def _mettre_a_jour_soldes(self, demande):
-        """Met à jour les soldes après approbation"""
-        
-        # Recalculer le solde pour s'assurer de la cohérence
-        self.calculer_soldes_employe(
-            demande.employe, 
-            demande.date_debut.year, 
-            demande.type_conge
-        )
+    def _mettre_a_jour_soldes(self, demande, ancien_statut, user=None):
+        """Poste au journal la consommation (ou la restitution) de jours du changement de statut"""
+        comptabiliser_transition(demande, ancien_statut, user)
     
     def _envoyer_notifications_soumission(self, demande):
-        """Envoie les notifications de soumission"""
-        
-        try:
-            if demande.manager_assigne and demande.manager_assigne.email:
-                send_mail(
-                    subject=f"Nouvelle demande de congé - {demande.employe}",
-                    message=f"Une nouvelle demande de congé nécessite votre approbation.\n\n"
-                           f"Employé: {demande.employe}\n"
-                           f"Période: {demande.date_debut} au {demande.date_fin}\n"
-                           f"Type: {demande.type_conge}\n"
-                           f"Motif: {demande.motif}",
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[demande.manager_assigne.email],
-                    fail_silently=True
-                )
-        except Exception as e:
-            logger.warning(f"Erreur envoi notification: {e}")
+        """Met en file les notifications de soumission (envoyées par envoyer_notifications_conges)"""
+        
+        if demande.manager_assigne:
+            mettre_en_file(
+                demande.manager_assigne.email,
+                'SOUMISSION',
+                sujet=f"Nouvelle demande de congé - {demande.employe}",
+                message=f"Une nouvelle demande de congé nécessite votre approbation.\n\n"
+                       f"Employé: {demande.employe}\n"
+                       f"Période: {demande.date_debut} au {demande.date_fin}\n"
+                       f"Type: {demande.type_conge}\n"
+                       f"Motif: {demande.motif}",
+                demande=demande
+            )
     
     def _envoyer_notifications_approbation(self, demande, action):
-        """Envoie les notifications d'approbation"""
-        
-        try:
-            if demande.employe.email:
-                statut_readable = demande.get_statut_display()
-                send_mail(
-                    subject=f"Demande de congé {statut_readable.lower()}",
-                    message=f"Votre demande de congé a été mise à jour.\n\n"
-                           f"Statut: {statut_readable}\n"
-                           f"Période: {demande.date_debut} au {demande.date_fin}",
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[demande.employe.email],
-                    fail_silently=True
-                )
-        except Exception as e:
-            logger.warning(f"Erreur envoi notification: {e}")
+        """Met en file les notifications d'approbation"""
+        mettre_en_file_lot([self._preparer_notification_approbation(demande)])
     
     def _envoyer_notifications_refus(self, demande, motif):
-        """Envoie les notifications de refus"""
-        
-        try:
-            if demande.employe.email:
-                send_mail(
-                    subject="Demande de congé refusée",
-                    message=f"Votre demande de congé a été refusée.\n\n"
-                           f"Période: {demande.date_debut} au {demande.date_fin}\n"
-                           f"Motif du refus: {motif}",
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[demande.employe.email],
-                    fail_silently=True
-                )
-        except Exception as e:
-            logger.warning(f"Erreur envoi notification: {e}")
+        """Met en file les notifications de refus"""
+        mettre_en_file_lot([self._preparer_notification_refus(demande, motif)])
+    
+    def _preparer_notification_approbation(self, demande):
+        statut_readable = demande.get_statut_display()
+        return preparer_notification(
+            demande.employe.email,
+            'APPROBATION',
+            sujet=f"Demande de congé {statut_readable.lower()}",
+            message=f"Votre demande de congé a été mise à jour.\n\n"
+                   f"Statut: {statut_readable}\n"
+                   f"Période: {demande.date_debut} au {demande.date_fin}",
+            demande=demande
+        )
+    
+    def _preparer_notification_refus(self, demande, motif):
+        return preparer_notification(
+            demande.employe.email,
+            'REFUS',
+            sujet="Demande de congé refusée",
+            message=f"Votre demande de congé a été refusée.\n\n"
+                   f"Période: {demande.date_debut} au {demande.date_fin}\n"
+                   f"Motif du refus: {motif}",
+            demande=demande
+        )
 
 # ================== FONCTIONS UTILITAIRES GLOBALES ==================
 
@@ -724,25 +916,21 @@ def recalculer_tous_soldes(annee=None):
     if annee is None:
         annee = datetime.now().year
     
-    from paie.models import Employee
-    
     gestionnaire = GestionnaireConges()
-    employes = Employee.objects.filter(is_active=True)
+    
+    try:
+        lot = gestionnaire.recalculer_soldes_lot(annee)
+    except Exception as e:
+        logger.error(f"Erreur recalcul soldes {annee}: {e}")
+        raise
     
     results = {
-        'traites': 0,
+        'traites': lot['nb_employes'],
         'erreurs': 0,
-        'employes_erreur': []
+        'employes_erreur': [],
+        'soldes_crees': lot['nb_crees'],
+        'soldes_modifies': lot['nb_modifies'],
     }
     
-    for employe in employes:
-        try:
-            gestionnaire.calculer_soldes_employe(employe, annee)
-            results['traites'] += 1
-        except Exception as e:
-            results['erreurs'] += 1
-            results['employes_erreur'].append(f"{employe}: {str(e)}")
-            logger.error(f"Erreur recalcul solde {employe}: {e}")
-    
     logger.info(f"Recalcul soldes terminé - Traités: {results['traites']}, Erreurs: {results['erreurs']}")
     return results
\ No newline at end of file
@@ -1,9 +1,11 @@
 # paie/services/gestionnaire_pointage.py
 # Service métier pour la gestion complète du pointage et des présences
 
+from django.conf import settings
+from django.core.cache import cache
 from django.db import transaction
 from django.utils import timezone
-from django.db.models import Q, Sum, Count, Avg
+from django.db.models import Q, Sum, Count, Avg, Min, QuerySet
 from datetime import datetime, date, time, timedelta
 from decimal import Decimal
 import logging
@@ -12,17 +14,61 @@ from typing import Dict, List, Optional, Tuple
 from ..models import (
     Employee, Pointage, PresenceJournaliere, HoraireTravail, 
     PlageHoraire, ReglePointage, ValidationPresence, AlertePresence,
-    TypeConge, DemandeConge
+    TypeConge, DemandeConge, TraitementPointage
 )
+from .calculateur_heures_sup import CalculateurHeuresSupLot
+from .calendrier_ouvrable import get_calendrier
+from .file_pointage import (
+    DUREE_ETAT_JOUR, enregistrer_etat_jour, get_cle_heures_theoriques, get_etat_jour
+)
+from .moteur_alertes import MoteurAlertesPresence, get_moteur_alertes, verrou_moteur_alertes
+from .resolveur_horaires import ResolveurHoraires
+from .statistiques_presence import reconstruire_statistiques
 
 logger = logging.getLogger(__name__)
 
+# Statuts de DemandeConge considérés comme un congé accordé
+STATUTS_CONGE_APPROUVE = ['APPROUVEE', 'EN_COURS', 'TERMINEE']
+
+# Statuts saisis sans pointage (arrêt, mission, télétravail) : conservés par le recalcul d'un jour non pointé
+STATUTS_DECLARES = ['MALADIE', 'MISSION', 'TELETRAVAIL']
+
+# Valeurs par défaut, surchargeables via settings.ATTENDANCE_SETTINGS
+PARAMETRES_POINTAGE_DEFAUT = {
+    'BATCH_SIZE': 1000,
+    # Rétention des pointages en base ; au-delà, archivage (voir archivage_pointage)
+    'CLEANUP_OLD_DATA_MONTHS': 24,
+    'ARCHIVE_POINTAGES_DIR': None,  # défaut: BASE_DIR/archives/pointages
+    # Prévisions de présence (prevision_presence)
+    'PREVISION_HISTORIQUE_JOURS': 365,
+    'PREVISION_HORIZON_MAX_JOURS': 60,
+    # Pointages des terminaux : présence et alertes traitées par traiter_file_pointage
+    'POINTAGE_DIFFERE': False,
+}
+
+
+def get_parametre_pointage(cle: str):
+    """Lit un paramètre du module pointage (settings.ATTENDANCE_SETTINGS)"""
+    parametres = getattr(settings, 'ATTENDANCE_SETTINGS', {})
+    return parametres.get(cle, PARAMETRES_POINTAGE_DEFAUT.get(cle))
+
 
 class GestionnairePointage:
     """Service principal pour la gestion du pointage et des présences"""
     
+    # Résultat du calcul d'un jour sans aucun pointage (en base ni archivé)
+    CALCUL_JOUR_VIDE = {
+        'heures_travaillees': timedelta(0),
+        'heures_theoriques': timedelta(0),
+        'duree_pauses': timedelta(0),
+        'retard_minutes': 0,
+        'depart_anticipe_minutes': 0
+    }
+    
     def __init__(self):
         self.regle_active = self._get_regle_active()
+        # Index des horaires, propre à cette instance (donc à la requête ou au job)
+        self._resolveur_horaires: Optional[ResolveurHoraires] = None
     
     def _get_regle_active(self) -> Optional[ReglePointage]:
         """Récupère la règle de pointage active"""
@@ -35,7 +81,8 @@ class GestionnairePointage:
     @transaction.atomic
     def enregistrer_pointage(self, employe_id: int, type_pointage: str, 
                            heure: datetime = None, cree_par_id: int = None,
-                           ip_address: str = None, justification: str = "") -> Dict:
+                           ip_address: str = None, justification: str = "",
+                           differe: bool = None) -> Dict:
         """
         Enregistre un nouveau pointage pour un employé
         
@@ -46,10 +93,20 @@ class GestionnairePointage:
             cree_par_id: ID de l'utilisateur qui enregistre
             ip_address: Adresse IP pour traçabilité
             justification: Justification éventuelle
+            differe: Différer présence et alertes vers la file de traitement
+                (défaut: paramètre POINTAGE_DIFFERE)
             
         Returns:
             Dict avec le résultat et les détails
         """
+        if differe is None:
+            differe = get_parametre_pointage('POINTAGE_DIFFERE')
+        if differe:
+            return self._enregistrer_pointage_differe(
+                employe_id, type_pointage, heure or timezone.now(),
+                cree_par_id, ip_address, justification
+            )
+        
         try:
             employe = Employee.objects.get(id=employe_id)
             heure = heure or timezone.now()
@@ -100,10 +157,71 @@ class GestionnairePointage:
             logger.error(f"Erreur lors de l'enregistrement du pointage: {e}")
             return {'success': False, 'message': f'Erreur technique: {str(e)}'}
     
+    def _enregistrer_pointage_differe(self, employe_id: int, type_pointage: str, heure: datetime,
+                                      cree_par_id: int = None, ip_address: str = None,
+                                      justification: str = "") -> Dict:
+        """
+        Fast path des terminaux : contrôle sur l'état du jour et l'horaire en cache,
+        insertion du pointage et de sa tâche différée dans la même transaction.
+        Présence journalière et alertes sont traitées par TraiteurFilePointage.
+        """
+        try:
+            jour = heure.date()
+            etat = get_etat_jour(employe_id, jour)
+            if etat is None:
+                return {'success': False, 'message': 'Employé non trouvé'}
+            
+            validation_result = self._valider_sequence_pointage(etat['types'], type_pointage, heure)
+            if not validation_result['valide']:
+                return {
+                    'success': False,
+                    'message': validation_result['message'],
+                    'warnings': validation_result.get('warnings', [])
+                }
+            
+            pointage = Pointage.objects.create(
+                employe_id=employe_id,
+                type_pointage=type_pointage,
+                heure_pointage=heure,
+                heure_theorique=self._get_heures_theoriques_cache(employe_id, jour).get(type_pointage),
+                ip_address=ip_address,
+                justification=justification,
+                cree_par_id=cree_par_id
+            )
+            TraitementPointage.objects.create(pointage=pointage, employe_id=employe_id, date_pointage=jour)
+            
+            etat['types'].append(type_pointage)
+            transaction.on_commit(lambda: enregistrer_etat_jour(employe_id, jour, etat))
+            
+            logger.info(f"Pointage enregistré (différé): {etat['nom']} - {type_pointage} - {heure}")
+            
+            return {
+                'success': True,
+                'pointage_id': str(pointage.id),
+                'message': 'Pointage enregistré avec succès',
+                'retard_minutes': pointage.retard_minutes if type_pointage == 'ARRIVEE' else 0,
+                'statut': pointage.statut
+            }
+            
+        except Exception as e:
+            logger.error(f"Erreur lors de l'enregistrement du pointage: {e}")
+            return {'success': False, 'message': f'Erreur technique: {str(e)}'}
+    
+    def _get_heures_theoriques_cache(self, employe_id: int, jour: date) -> Dict[str, Optional[datetime]]:
+        """Heures théoriques du jour par type de pointage, mises en cache jusqu'au changement d'horaire"""
+        cle = get_cle_heures_theoriques(employe_id, jour)
+        heures = cache.get(cle)
+        if heures is None:
+            horaire_travail = ResolveurHoraires(jour, employes_ids=[employe_id]).get_horaire(employe_id, jour)
+            heures = {
+                type_pointage: self._calculer_heure_theorique(horaire_travail, type_pointage, jour)
+                for type_pointage, _ in Pointage.TYPES_POINTAGE
+            }
+            cache.set(cle, heures, DUREE_ETAT_JOUR)
+        return heures
+    
     def _valider_pointage(self, employe: Employee, type_pointage: str, heure: datetime) -> Dict:
         """Valide les règles métier avant enregistrement"""
-        warnings = []
-        
         # Vérifier les pointages existants du jour
         pointages_jour = Pointage.objects.filter(
             employe=employe,
@@ -111,6 +229,12 @@ class GestionnairePointage:
         ).order_by('heure_pointage')
         
         derniers_pointages = list(pointages_jour.values_list('type_pointage', flat=True))
+        return self._valider_sequence_pointage(derniers_pointages, type_pointage, heure)
+    
+    def _valider_sequence_pointage(self, derniers_pointages: List[str], type_pointage: str,
+                                   heure: datetime) -> Dict:
+        """Règles de cohérence d'un pointage par rapport aux types déjà pointés dans la journée"""
+        warnings = []
         
         # Règles de cohérence
         if type_pointage == 'ARRIVEE':
@@ -165,8 +289,32 @@ class GestionnairePointage:
             'warnings': warnings
         }
     
+    def charger_horaires(self, date_debut: date, date_fin: date = None,
+                         employes_ids: List[int] = None) -> ResolveurHoraires:
+        """
+        Charge en une requête les horaires effectifs d'une fenêtre de dates
+        
+        Le résolveur est conservé sur l'instance : les appels suivants à
+        _get_horaire_employe dans cette fenêtre ne touchent plus la base.
+        Il est reconstruit si une affectation a changé entre-temps.
+        """
+        date_fin = date_fin or date_debut
+        resolveur = self._resolveur_horaires
+        if resolveur is not None and not resolveur.est_perime():
+            if all(resolveur.couvre(date_debut, date_fin, employe_id)
+                   for employe_id in (employes_ids or [None])):
+                return resolveur
+        
+        self._resolveur_horaires = ResolveurHoraires(date_debut, date_fin, employes_ids)
+        return self._resolveur_horaires
+    
     def _get_horaire_employe(self, employe: Employee, date_pointage: date) -> Optional[HoraireTravail]:
         """Récupère l'horaire de travail effectif pour un employé à une date donnée"""
+        resolveur = self._resolveur_horaires
+        if resolveur is not None and resolveur.couvre(date_pointage, employe_id=employe.id) \
+                and not resolveur.est_perime():
+            return resolveur.get_horaire(employe.id, date_pointage)
+        
         return HoraireTravail.objects.filter(
             Q(date_fin__isnull=True) | Q(date_fin__gte=date_pointage),
             employe=employe,
@@ -197,62 +345,70 @@ class GestionnairePointage:
             return None
         
         if heure_theo:
-            return timezone.datetime.combine(date_pointage, heure_theo)
+            heure = timezone.datetime.combine(date_pointage, heure_theo)
+            return timezone.make_aware(heure) if settings.USE_TZ else heure
         return None
     
-    @transaction.atomic
     def _mettre_a_jour_presence_journaliere(self, employe: Employee, date_pointage: date):
         """Met à jour le résumé de présence journalière"""
         try:
-            # Récupérer ou créer la présence journalière
-            presence, created = PresenceJournaliere.objects.get_or_create(
-                employe=employe,
-                date=date_pointage,
-                defaults={
-                    'horaire_travail': self._get_horaire_employe(employe, date_pointage)
-                }
-            )
-            
-            # Récupérer tous les pointages du jour
-            pointages = Pointage.objects.filter(
-                employe=employe,
-                heure_pointage__date=date_pointage
-            ).order_by('heure_pointage')
-            
-            if not pointages.exists():
-                return
-            
-            # Calculer les heures et statut
-            calcul_result = self.calculer_heures_travaillees(employe, date_pointage)
-            
-            # Mettre à jour la présence
-            presence.heure_arrivee = calcul_result.get('heure_arrivee')
-            presence.heure_sortie = calcul_result.get('heure_sortie')
-            presence.pauses = calcul_result.get('pauses', [])
-            presence.heures_travaillees = calcul_result.get('heures_travaillees', timedelta(0))
-            presence.heures_theoriques = calcul_result.get('heures_theoriques', timedelta(0))
-            presence.duree_pauses = calcul_result.get('duree_pauses', timedelta(0))
-            presence.retard_minutes = calcul_result.get('retard_minutes', 0)
-            presence.depart_anticipe_minutes = calcul_result.get('depart_anticipe_minutes', 0)
-            
-            # Déterminer le statut du jour
-            if presence.heure_arrivee and presence.heure_sortie:
-                presence.statut_jour = 'PRESENT'
-            elif presence.heure_arrivee:
-                presence.statut_jour = 'PARTIEL'
-            else:
-                # Vérifier si c'est un congé approuvé
-                conge = self._verifier_conge_approuve(employe, date_pointage)
-                if conge:
-                    presence.statut_jour = 'CONGE'
-                else:
-                    presence.statut_jour = 'ABSENT'
-            
-            presence.save()
-            
+            self.recalculer_presence_journaliere(employe, date_pointage)
         except Exception as e:
             logger.error(f"Erreur mise à jour présence journalière: {e}")
     
+    @transaction.atomic
+    def recalculer_presence_journaliere(self, employe: Employee, date_pointage: date):
+        """
+        Recalcule le résumé de présence journalière ; les erreurs sont propagées
+        (file de pointage : la tâche est alors reprise)
+        """
+        # Récupérer ou créer la présence journalière
+        presence, created = PresenceJournaliere.objects.get_or_create(
+            employe=employe,
+            date=date_pointage,
+            defaults={
+                'horaire_travail': self._get_horaire_employe(employe, date_pointage)
+            }
+        )
+        
+        # Calculer les heures et statut (jour sans pointage, même archivé : absence ou congé)
+        calcul_result = self.calculer_heures_travaillees(employe, date_pointage)
+        
+        # Mettre à jour la présence
+        en_conge = not calcul_result.get('heure_arrivee') and \
+            self._verifier_conge_approuve(employe, date_pointage)
+        self._appliquer_calcul_presence(presence, calcul_result, en_conge)
+        
+        presence.save()
+    
+    def _appliquer_calcul_presence(self, presence: PresenceJournaliere, calcul_result: Dict, en_conge: bool):
+        """Reporte un résultat de calcul sur la présence (sans l'enregistrer)"""
+        presence.heure_arrivee = calcul_result.get('heure_arrivee')
+        presence.heure_sortie = calcul_result.get('heure_sortie')
+        presence.pauses = [
+            {
+                'debut': pause['debut'],
+                'fin': pause['fin'],
+                'duree_minutes': int(pause['duree'].total_seconds() / 60)
+            }
+            for pause in calcul_result.get('pauses', [])
+        ]
+        presence.heures_travaillees = calcul_result.get('heures_travaillees', timedelta(0))
+        presence.heures_theoriques = calcul_result.get('heures_theoriques', timedelta(0))
+        presence.duree_pauses = calcul_result.get('duree_pauses', timedelta(0))
+        presence.retard_minutes = calcul_result.get('retard_minutes', 0)
+        presence.depart_anticipe_minutes = calcul_result.get('depart_anticipe_minutes', 0)
+        
+        # Déterminer le statut du jour
+        if presence.heure_arrivee and presence.heure_sortie:
+            presence.statut_jour = 'PRESENT'
+        elif presence.heure_arrivee:
+            presence.statut_jour = 'PARTIEL'
+        elif en_conge:
+            presence.statut_jour = 'CONGE'
+        elif presence.statut_jour not in STATUTS_DECLARES:
+            presence.statut_jour = 'ABSENT'
+    
     def calculer_heures_travaillees(self, employe: Employee, date_calc: date) -> Dict:
         """
         Calcule les heures travaillées pour un employé à une date donnée
@@ -260,24 +416,36 @@ class GestionnairePointage:
         Returns:
             Dict avec tous les détails des calculs
         """
-        pointages = Pointage.objects.filter(
+        pointages = list(Pointage.objects.filter(
             employe=employe,
             heure_pointage__date=date_calc
-        ).order_by('heure_pointage')
+        ).order_by('heure_pointage').values('type_pointage', 'heure_pointage'))
         
-        if not pointages.exists():
-            return {
-                'heures_travaillees': timedelta(0),
-                'heures_theoriques': timedelta(0),
-                'duree_pauses': timedelta(0),
-                'retard_minutes': 0,
-                'depart_anticipe_minutes': 0
-            }
+        if not pointages:
+            # Jour éventuellement déjà archivé (la base vient d'être lue)
+            from .archivage_pointage import lire_archives
+            pointages = lire_archives(date_calc, date_calc, employes_ids=[employe.id])
+        
+        if not pointages:
+            return dict(self.CALCUL_JOUR_VIDE)
         
+        horaire_travail = self._get_horaire_employe(employe, date_calc)
+        return self._calculer_depuis_pointages(pointages, horaire_travail, date_calc)
+    
+    def _calculer_depuis_pointages(self, pointages: List[Dict], horaire_travail: Optional[HoraireTravail],
+                                   date_calc: date) -> Dict:
+        """
+        Calcule heures, pauses, retard et départ anticipé à partir des pointages du jour
+        
+        Args:
+            pointages: Pointages du jour triés par heure ({'type_pointage', 'heure_pointage'})
+            horaire_travail: Horaire effectif de l'employé ce jour-là
+            date_calc: Date du calcul
+        """
         # Organiser les pointages
         pointages_dict = {}
         for p in pointages:
-            pointages_dict[p.type_pointage] = p.heure_pointage
+            pointages_dict[p['type_pointage']] = p['heure_pointage']
         
         # Calculer les heures travaillées
         heure_arrivee = pointages_dict.get('ARRIVEE')
@@ -285,20 +453,19 @@ class GestionnairePointage:
         
         heures_travaillees = timedelta(0)
         duree_pauses = timedelta(0)
+        pauses = self._calculer_pauses(pointages, date_calc)
         
         if heure_arrivee:
             fin_calcul = heure_sortie or timezone.now()
             heures_brutes = fin_calcul - heure_arrivee
             
             # Calculer les pauses
-            pauses = self._calculer_pauses(pointages, date_calc)
             duree_pauses = sum([p['duree'] for p in pauses], timedelta(0))
             
             # Heures nettes = heures brutes - pauses
             heures_travaillees = max(timedelta(0), heures_brutes - duree_pauses)
         
         # Récupérer les heures théoriques
-        horaire_travail = self._get_horaire_employe(employe, date_calc)
         heures_theoriques = timedelta(0)
         if horaire_travail:
             heures_theoriques = horaire_travail.plage_horaire.duree_theorique
@@ -320,7 +487,7 @@ class GestionnairePointage:
         return {
             'heure_arrivee': heure_arrivee,
             'heure_sortie': heure_sortie,
-            'pauses': self._calculer_pauses(pointages, date_calc),
+            'pauses': pauses,
             'heures_travaillees': heures_travaillees,
             'heures_theoriques': heures_theoriques,
             'duree_pauses': duree_pauses,
@@ -329,12 +496,11 @@ class GestionnairePointage:
         }
     
     def _calculer_pauses(self, pointages, date_calc: date) -> List[Dict]:
-        """Calcule les périodes de pause à partir des pointages"""
+        """Calcule les périodes de pause à partir des pointages (liste de dicts triée)"""
         pauses = []
-        pointages_list = list(pointages.values('type_pointage', 'heure_pointage'))
         
         pause_debut = None
-        for pointage in pointages_list:
+        for pointage in pointages:
             if pointage['type_pointage'] == 'PAUSE_DEBUT':
                 pause_debut = pointage['heure_pointage']
             elif pointage['type_pointage'] == 'PAUSE_FIN' and pause_debut:
@@ -358,60 +524,71 @@ class GestionnairePointage:
         
         return pauses
     
-    def detecter_retards_absences(self, date_detection: date = None) -> Dict:
+    def detecter_retards_absences(self, date_detection: date = None, creer_alertes: bool = False) -> Dict:
         """
         Détecte les retards et absences pour une date donnée
         
+        Traitement ensembliste : horaires, premières arrivées et congés sont
+        chargés en trois requêtes puis rapprochés en mémoire.
+        
         Args:
             date_detection: Date à analyser (défaut: aujourd'hui)
+            creer_alertes: Enregistrer les AlertePresence correspondantes
             
         Returns:
             Dict avec les statistiques et listes des retards/absences
         """
         date_detection = date_detection or date.today()
+        jour_semaine = date_detection.weekday() + 1
+        tolerance = self.regle_active.tolerance_retard_minutes if self.regle_active else 10
+        
+        # Horaires effectifs du jour (une requête pour tous les employés)
+        horaires = {
+            employe_id: horaire
+            for employe_id, horaire in self.charger_horaires(date_detection).horaires_du_jour(date_detection).items()
+            if horaire.employe.is_active
+        }
+        
+        # Première arrivée de chaque employé (une requête groupée)
+        arrivees = dict(
+            Pointage.objects.filter(
+                type_pointage='ARRIVEE',
+                heure_pointage__date=date_detection
+            ).order_by().values('employe_id').annotate(
+                premiere_arrivee=Min('heure_pointage')
+            ).values_list('employe_id', 'premiere_arrivee')
+        )
         
-        # Récupérer tous les employés actifs avec horaires
-        employes_actifs = Employee.objects.filter(
-            is_active=True,
-            horaires__actif=True,
-            horaires__date_debut__lte=date_detection,
-            horaires__date_fin__isnull=True
-        ).distinct()
+        # Employés en congé approuvé ce jour-là
+        employes_en_conge = self._get_employes_en_conge(date_detection)
         
         retards = []
         absences = []
         presents = []
         
-        for employe in employes_actifs:
-            horaire = self._get_horaire_employe(employe, date_detection)
-            if not horaire:
-                continue
-            
+        for employe_id, horaire in horaires.items():
             # Vérifier si c'est un jour travaillé
-            jour_semaine = date_detection.weekday() + 1
             if jour_semaine not in horaire.jours_travailles_effectifs:
                 continue
             
-            # Vérifier les pointages du jour
-            pointage_arrivee = Pointage.objects.filter(
-                employe=employe,
-                type_pointage='ARRIVEE',
-                heure_pointage__date=date_detection
-            ).first()
+            if employe_id in employes_en_conge:
+                continue
             
-            # Vérifier si en congé
-            if self._verifier_conge_approuve(employe, date_detection):
+            employe = horaire.employe
+            # Jour férié (national ou du site) : ni retard ni absence
+            if get_calendrier(employe.site_id).est_ferie(date_detection):
                 continue
             
-            if pointage_arrivee:
-                # Calculer le retard
-                heure_theo = self._calculer_heure_theorique(horaire, 'ARRIVEE', date_detection)
+            heure_theo = self._calculer_heure_theorique(horaire, 'ARRIVEE', date_detection)
+            heure_arrivee = arrivees.get(employe_id)
+            
+            if heure_arrivee:
                 if heure_theo:
-                    retard_minutes = (pointage_arrivee.heure_pointage - heure_theo).total_seconds() / 60
-                    if retard_minutes > (self.regle_active.tolerance_retard_minutes if self.regle_active else 10):
+                    retard_minutes = (heure_arrivee - heure_theo).total_seconds() / 60
+                    if retard_minutes > tolerance:
                         retards.append({
                             'employe': employe,
-                            'heure_arrivee': pointage_arrivee.heure_pointage,
+                            'heure_arrivee': heure_arrivee,
                             'heure_theorique': heure_theo,
                             'retard_minutes': int(retard_minutes)
                         })
@@ -423,19 +600,88 @@ class GestionnairePointage:
                 # Absence détectée
                 absences.append({
                     'employe': employe,
-                    'horaire': horaire
+                    'horaire': horaire,
+                    'heure_theorique': heure_theo
                 })
         
-        return {
+        resultat = {
             'date': date_detection,
             'retards': retards,
             'absences': absences,
             'presents': presents,
-            'total_employes': len(employes_actifs),
+            'total_employes': len(horaires),
             'nb_retards': len(retards),
             'nb_absences': len(absences),
             'nb_presents': len(presents)
         }
+        
+        if creer_alertes:
+            resultat['nb_alertes_creees'] = self._creer_alertes_detection(
+                date_detection, retards, absences, tolerance
+            )
+        
+        return resultat
+    
+    def _get_employes_en_conge(self, date_conge: date) -> set:
+        """Retourne les IDs des employés ayant un congé approuvé à cette date"""
+        return set(DemandeConge.objects.filter(
+            date_debut__lte=date_conge,
+            date_fin__gte=date_conge,
+            statut__in=STATUTS_CONGE_APPROUVE
+        ).values_list('employe_id', flat=True))
+    
+    def _creer_alertes_detection(self, date_detection: date, retards: List[Dict],
+                                 absences: List[Dict], tolerance: int) -> int:
+        """Crée en masse les alertes de retard/absence non encore enregistrées"""
+        deja_alertes = set(AlertePresence.objects.filter(
+            date_concernee=date_detection,
+            type_alerte__in=['RETARD', 'ABSENCE']
+        ).values_list('employe_id', 'type_alerte'))
+        
+        maintenant = timezone.now()
+        alertes = []
+        
+        for retard in retards:
+            employe = retard['employe']
+            if (employe.id, 'RETARD') in deja_alertes:
+                continue
+            alertes.append(AlertePresence(
+                employe=employe,
+                date_concernee=date_detection,
+                type_alerte='RETARD',
+                niveau_gravite='ALERTE' if retard['retard_minutes'] > 60 else 'ATTENTION',
+                titre=f"Retard de {retard['retard_minutes']} minutes",
+                message=f"Arrivée à {timezone.localtime(retard['heure_arrivee']).strftime('%H:%M')} "
+                        f"au lieu de {timezone.localtime(retard['heure_theorique']).strftime('%H:%M')}",
+                details={
+                    'retard_minutes': retard['retard_minutes'],
+                    'heure_pointage': retard['heure_arrivee'].isoformat(),
+                    'heure_theorique': retard['heure_theorique'].isoformat()
+                }
+            ))
+        
+        for absence in absences:
+            employe = absence['employe']
+            heure_theo = absence['heure_theorique']
+            if (employe.id, 'ABSENCE') in deja_alertes:
+                continue
+            # Ne pas signaler d'absence avant l'heure d'arrivée prévue + tolérance
+            if heure_theo and maintenant < heure_theo + timedelta(minutes=tolerance):
+                continue
+            alertes.append(AlertePresence(
+                employe=employe,
+                date_concernee=date_detection,
+                type_alerte='ABSENCE',
+                niveau_gravite='ATTENTION',
+                titre='Absence sans pointage',
+                message=f"Aucun pointage d'arrivée le {date_detection.strftime('%d/%m/%Y')}",
+                details={
+                    'heure_theorique': heure_theo.isoformat() if heure_theo else None
+                }
+            ))
+        
+        AlertePresence.objects.bulk_create(alertes, batch_size=get_parametre_pointage('BATCH_SIZE'))
+        return len(alertes)
     
     def calculer_heures_supplementaires(self, employe: Employee, date_debut: date, date_fin: date = None) -> Dict:
         """
@@ -503,42 +749,89 @@ class GestionnairePointage:
         
         return salaire_horaire * heures * majoration
     
+    def calculer_heures_sup_lot(self, employes, date_debut: date, date_fin: date) -> Dict[int, Dict]:
+        """
+        Calcule les heures supplémentaires de plusieurs employés sur une période
+        
+        Les semaines complètes (lundi-dimanche) couvrant la période sont prises en
+        compte, comme pour un calcul semaine par semaine avec
+        calculer_heures_supplementaires.
+        
+        Args:
+            employes: Employés concernés (queryset ou liste)
+            date_debut: Date de début
+            date_fin: Date de fin
+            
+        Returns:
+            Dict employe_id -> détail des heures supplémentaires (employés sans
+            présence sur la période absents du résultat)
+        """
+        taux_horaires = {
+            employe.id: getattr(employe, 'salaire_horaire', Decimal('0.00'))
+            for employe in employes
+        }
+        
+        # Un queryset est repris tel quel en sous-requête plutôt qu'en liste d'IDs
+        perimetre = employes if isinstance(employes, QuerySet) else list(taux_horaires)
+        
+        calculateur = CalculateurHeuresSupLot.depuis_regle(self.regle_active)
+        return calculateur.calculer_periode(perimetre, date_debut, date_fin, taux_horaires)
+    
     def _verifier_conge_approuve(self, employe: Employee, date_conge: date) -> bool:
         """Vérifie si l'employé a un congé approuvé pour cette date"""
         return DemandeConge.objects.filter(
             employe=employe,
             date_debut__lte=date_conge,
             date_fin__gte=date_conge,
-            statut='APPROUVE'
+            statut__in=STATUTS_CONGE_APPROUVE
         ).exists()
     
     def generer_feuille_presence(self, date_debut: date, date_fin: date = None, 
-                               departement_id: int = None) -> Dict:
+                               departement_id: int = None, inclure_details: bool = True) -> Dict:
         """
         Génère une feuille de présence pour une période donnée
         
+        Les compteurs par employé sont calculés par une requête agrégée groupée ;
+        le détail jour par jour n'est chargé que si inclure_details est vrai.
+        
         Args:
             date_debut: Date de début
             date_fin: Date de fin (défaut: même jour)
             departement_id: ID du département (optionnel)
+            inclure_details: Joindre les PresenceJournaliere de chaque employé
             
         Returns:
             Dict avec les données de la feuille de présence
         """
         date_fin = date_fin or date_debut
         
-        # Filtre employés
-        employes_query = Employee.objects.filter(is_active=True)
-        if departement_id:
-            employes_query = employes_query.filter(department_id=departement_id)
-        
-        employes = employes_query.order_by('nom', 'prenom')
+        employes_query = self._get_employes_feuille(departement_id)
+        employes = list(employes_query.select_related('department').order_by('last_name', 'first_name'))
+        
+        # Compteurs et sommes par employé (une requête groupée)
+        agregats = {
+            ligne['employe_id']: ligne
+            for ligne in PresenceJournaliere.objects.filter(
+                employe__in=employes_query,
+                date__range=[date_debut, date_fin]
+            ).order_by().values('employe_id').annotate(
+                nb_presences=Count('id', filter=Q(statut_jour='PRESENT')),
+                nb_absences=Count('id', filter=Q(statut_jour='ABSENT')),
+                nb_retards=Count('id', filter=Q(retard_minutes__gt=0)),
+                total_heures=Sum('heures_travaillees'),
+                total_retard_minutes=Sum('retard_minutes')
+            )
+        }
         
-        # Récupérer les présences
-        presences = PresenceJournaliere.objects.filter(
-            employe__in=employes,
-            date__range=[date_debut, date_fin]
-        ).select_related('employe', 'horaire_travail')
+        # Détail regroupé par employé en une seule passe
+        details = {}
+        if inclure_details:
+            presences = PresenceJournaliere.objects.filter(
+                employe__in=employes_query,
+                date__range=[date_debut, date_fin]
+            ).select_related('horaire_travail').order_by('employe_id', 'date')
+            for presence in presences.iterator(chunk_size=get_parametre_pointage('BATCH_SIZE')):
+                details.setdefault(presence.employe_id, []).append(presence)
         
         # Organiser les données
         feuille_data = {
@@ -558,35 +851,62 @@ class GestionnairePointage:
             }
         }
         
+        stats = feuille_data['statistiques']
         for employe in employes:
-            employe_presences = [p for p in presences if p.employe_id == employe.id]
-            
-            employe_data = {
-                'employe': employe,
-                'presences': employe_presences,
-                'statistiques': {
-                    'nb_presences': len([p for p in employe_presences if p.statut_jour == 'PRESENT']),
-                    'nb_absences': len([p for p in employe_presences if p.statut_jour == 'ABSENT']),
-                    'nb_retards': len([p for p in employe_presences if p.retard_minutes > 0]),
-                    'total_heures': sum([p.heures_travaillees for p in employe_presences], timedelta(0)),
-                    'total_retard_minutes': sum([p.retard_minutes for p in employe_presences])
-                }
+            agregat = agregats.get(employe.id, {})
+            employe_stats = {
+                'nb_presences': agregat.get('nb_presences', 0),
+                'nb_absences': agregat.get('nb_absences', 0),
+                'nb_retards': agregat.get('nb_retards', 0),
+                'total_heures': agregat.get('total_heures') or timedelta(0),
+                'total_retard_minutes': agregat.get('total_retard_minutes') or 0
             }
             
-            feuille_data['employes'].append(employe_data)
+            feuille_data['employes'].append({
+                'employe': employe,
+                'presences': details.get(employe.id, []),
+                'statistiques': employe_stats
+            })
             
             # Mise à jour des stats globales
-            stats = feuille_data['statistiques']
-            stats['total_presences'] += employe_data['statistiques']['nb_presences']
-            stats['total_absences'] += employe_data['statistiques']['nb_absences']
-            stats['total_retards'] += employe_data['statistiques']['nb_retards']
-            stats['total_heures'] += employe_data['statistiques']['total_heures']
+            stats['total_presences'] += employe_stats['nb_presences']
+            stats['total_absences'] += employe_stats['nb_absences']
+            stats['total_retards'] += employe_stats['nb_retards']
+            stats['total_heures'] += employe_stats['total_heures']
         
         return feuille_data
     
+    def iterer_lignes_presence(self, date_debut: date, date_fin: date = None,
+                               departement_id: int = None):
+        """
+        Parcourt en flux les lignes de détail d'une feuille de présence
+        
+        Les lignes (dicts) sont lues par paquets côté base, triées par employé
+        puis par date, sans être chargées en mémoire d'un bloc : destiné aux exports.
+        """
+        date_fin = date_fin or date_debut
+        
+        lignes = PresenceJournaliere.objects.filter(
+            employe__in=self._get_employes_feuille(departement_id),
+            date__range=[date_debut, date_fin]
+        ).order_by('employe__last_name', 'employe__first_name', 'employe_id', 'date').values(
+            'employe__last_name', 'employe__first_name', 'employe__matricule',
+            'date', 'statut_jour', 'heure_arrivee', 'heure_sortie',
+            'heures_travaillees', 'retard_minutes', 'depart_anticipe_minutes'
+        )
+        
+        yield from lignes.iterator(chunk_size=get_parametre_pointage('BATCH_SIZE'))
+    
+    def _get_employes_feuille(self, departement_id: int = None):
+        """Queryset des employés actifs concernés par une feuille de présence"""
+        employes_query = Employee.objects.filter(is_active=True)
+        if departement_id:
+            employes_query = employes_query.filter(department_id=departement_id)
+        return employes_query
+    
     @transaction.atomic
     def valider_presence_journaliere(self, date_validation: date, validee_par_id: int, 
-                                   employes_ids: List[int] = None) -> Dict:
+                                   employes_ids: List[int] = None, mode_lot: bool = False) -> Dict:
         """
         Valide les présences journalières pour une date donnée
         
@@ -594,6 +914,8 @@ class GestionnairePointage:
             date_validation: Date à valider
             validee_par_id: ID de l'utilisateur validant
             employes_ids: Liste des IDs employés (optionnel, tous si non spécifié)
+            mode_lot: Recalcul ensembliste de la journée et écritures groupées
+                (voir _valider_presences_lot), pour les sites à gros effectif
             
         Returns:
             Dict avec le résultat de la validation
@@ -610,25 +932,13 @@ class GestionnairePointage:
             
             presences = list(presences_query.select_related('employe'))
             
-            # Valider chaque présence
-            validated_count = 0
-            errors = []
+            # Horaires du jour chargés en une fois pour les recalculs
+            self.charger_horaires(date_validation)
             
-            for presence in presences:
-                try:
-                    # Recalculer les heures avant validation
-                    self._mettre_a_jour_presence_journaliere(presence.employe, date_validation)
-                    
-                    # Valider
-                    presence.valide = True
-                    presence.valide_par_id = validee_par_id
-                    presence.date_validation = timezone.now()
-                    presence.save()
-                    
-                    validated_count += 1
-                    
-                except Exception as e:
-                    errors.append(f"Erreur pour {presence.employe.last_name}: {str(e)}")
+            if mode_lot:
+                validated_count, errors = self._valider_presences_lot(presences, date_validation, validee_par_id)
+            else:
+                validated_count, errors = self._valider_presences_unitaire(presences, date_validation, validee_par_id)
             
             # Créer l'enregistrement de validation
             validation = ValidationPresence.objects.create(
@@ -642,10 +952,17 @@ class GestionnairePointage:
             )
             
             # Associer les employés validés
-            if employes_ids:
-                validation.employes.set(employes_ids)
+            employes_valides = employes_ids if employes_ids else [p.employe_id for p in presences]
+            if mode_lot:
+                # Insertion directe dans la table de liaison (validation toute neuve)
+                Liaison = ValidationPresence.employes.through
+                Liaison.objects.bulk_create(
+                    [Liaison(validationpresence_id=validation.id, employee_id=employe_id)
+                     for employe_id in set(employes_valides)],
+                    batch_size=get_parametre_pointage('BATCH_SIZE')
+                )
             else:
-                validation.employes.set([p.employe_id for p in presences])
+                validation.employes.set(employes_valides)
             
             return {
                 'success': True,
@@ -662,10 +979,107 @@ class GestionnairePointage:
                 'message': f"Erreur lors de la validation: {str(e)}"
             }
     
+    def _valider_presences_unitaire(self, presences: List[PresenceJournaliere], date_validation: date,
+                                    validee_par_id: int) -> Tuple[int, List[str]]:
+        """Recalcule puis valide les présences une à une"""
+        validated_count = 0
+        errors = []
+        
+        for presence in presences:
+            try:
+                # Recalculer les heures avant validation
+                self._mettre_a_jour_presence_journaliere(presence.employe, date_validation)
+                presence.refresh_from_db()
+                
+                # Valider
+                presence.valide = True
+                presence.valide_par_id = validee_par_id
+                presence.date_validation = timezone.now()
+                presence.save()
+                
+                validated_count += 1
+                
+            except Exception as e:
+                errors.append(f"Erreur pour {presence.employe.last_name}: {str(e)}")
+        
+        return validated_count, errors
+    
+    @transaction.atomic
+    def _valider_presences_lot(self, presences: List[PresenceJournaliere], date_validation: date,
+                               validee_par_id: int) -> Tuple[int, List[str]]:
+        """
+        Recalcule et valide les présences d'une journée de façon ensembliste
+        
+        Pointages, horaires et congés du jour sont chargés en une requête chacun ;
+        le recalcul se fait en mémoire et toutes les présences sont écrites par un
+        seul bulk_update.
+        """
+        if not presences:
+            return 0, []
+        
+        employes_ids = [p.employe_id for p in presences]
+        
+        # Pointages du jour, groupés par employé (ordre chronologique conservé)
+        pointages_par_employe: Dict[int, List[Dict]] = {}
+        for pointage in Pointage.objects.filter(
+            employe_id__in=employes_ids,
+            heure_pointage__date=date_validation
+        ).order_by('employe_id', 'heure_pointage').values('employe_id', 'type_pointage', 'heure_pointage'):
+            pointages_par_employe.setdefault(pointage['employe_id'], []).append(pointage)
+        
+        # Jours déjà archivés : une lecture de l'archive du mois pour tous les employés restants
+        sans_pointage = set(employes_ids) - set(pointages_par_employe)
+        if sans_pointage:
+            from .archivage_pointage import lire_archives
+            for pointage in lire_archives(date_validation, date_validation, employes_ids=sans_pointage):
+                pointages_par_employe.setdefault(pointage['employe_id'], []).append(pointage)
+        
+        resolveur = self.charger_horaires(date_validation)
+        employes_en_conge = self._get_employes_en_conge(date_validation)
+        
+        maintenant = timezone.now()
+        a_valider = []
+        errors = []
+        
+        for presence in presences:
+            try:
+                pointages = pointages_par_employe.get(presence.employe_id)
+                # Sans pointage : même résultat que le recalcul unitaire (absence ou congé)
+                calcul_result = self._calculer_depuis_pointages(
+                    pointages, resolveur.get_horaire(presence.employe_id, date_validation), date_validation
+                ) if pointages else self.CALCUL_JOUR_VIDE
+                self._appliquer_calcul_presence(
+                    presence, calcul_result, presence.employe_id in employes_en_conge
+                )
+                
+                presence.valide = True
+                presence.valide_par_id = validee_par_id
+                presence.date_validation = maintenant
+                presence.date_modification = maintenant
+                a_valider.append(presence)
+                
+            except Exception as e:
+                errors.append(f"Erreur pour {presence.employe.last_name}: {str(e)}")
+        
+        PresenceJournaliere.objects.bulk_update(a_valider, [
+            'heure_arrivee', 'heure_sortie', 'pauses', 'heures_travaillees', 'heures_theoriques',
+            'duree_pauses', 'retard_minutes', 'depart_anticipe_minutes', 'statut_jour',
+            'valide', 'valide_par', 'date_validation', 'date_modification'
+        ], batch_size=get_parametre_pointage('BATCH_SIZE'))
+        
+        # bulk_update ne déclenche pas les signaux : agrégats du jour recalculés d'un bloc
+        transaction.on_commit(lambda: reconstruire_statistiques(date_validation))
+        
+        return len(a_valider), errors
+    
     def exporter_donnees_paie(self, mois: int, annee: int, departement_id: int = None) -> Dict:
         """
         Exporte les données de présence pour intégration dans le calcul de paie
         
+        Le nombre de requêtes est borné quel que soit l'effectif : une requête
+        agrégée pour les présences validées du mois et une requête groupée par
+        semaine pour les heures supplémentaires (voir calculer_heures_sup_lot).
+        
         Args:
             mois: Mois à exporter (1-12)
             annee: Année
@@ -688,6 +1102,26 @@ class GestionnairePointage:
         
         employes = employes_query.order_by('matricule')
         
+        # Totaux du mois par employé (présences validées uniquement)
+        totaux = {
+            ligne['employe_id']: ligne
+            for ligne in PresenceJournaliere.objects.filter(
+                employe__in=employes_query,
+                date__range=[date_debut, date_fin],
+                valide=True
+            ).order_by().values('employe_id').annotate(
+                nb_presences=Count('id'),
+                total_heures_travaillees=Sum('heures_travaillees'),
+                total_heures_theoriques=Sum('heures_theoriques'),
+                total_retard_minutes=Sum('retard_minutes'),
+                nb_absences=Count('id', filter=Q(statut_jour='ABSENT')),
+                nb_conges=Count('id', filter=Q(statut_jour='CONGE'))
+            )
+        }
+        
+        # Heures supplémentaires du mois (par semaine), tous employés en une passe
+        heures_sup = self.calculer_heures_sup_lot(employes, date_debut, date_fin)
+        
         donnees_paie = {
             'periode': {
                 'mois': mois,
@@ -704,25 +1138,22 @@ class GestionnairePointage:
             }
         }
         
+        aucune_heure_sup = {
+            'heures_sup_total': timedelta(0), 'heures_sup_25': timedelta(0), 'heures_sup_50': timedelta(0),
+            'montant_25': Decimal('0.00'), 'montant_50': Decimal('0.00')
+        }
+        
         for employe in employes:
-            # Récupérer toutes les présences du mois
-            presences = PresenceJournaliere.objects.filter(
-                employe=employe,
-                date__range=[date_debut, date_fin],
-                valide=True  # Seulement les présences validées
-            )
-            
-            # Calculer les totaux
-            total_heures_travaillees = sum([p.heures_travaillees for p in presences], timedelta(0))
-            total_heures_theoriques = sum([p.heures_theoriques for p in presences], timedelta(0))
-            total_retard_minutes = sum([p.retard_minutes for p in presences])
+            total = totaux.get(employe.id, {})
+            total_heures_travaillees = total.get('total_heures_travaillees') or timedelta(0)
+            total_heures_theoriques = total.get('total_heures_theoriques') or timedelta(0)
+            total_retard_minutes = total.get('total_retard_minutes') or 0
+            nb_presences = total.get('nb_presences', 0)
+            nb_absences = total.get('nb_absences', 0)
+            nb_conges = total.get('nb_conges', 0)
             
-            # Calculer les heures sup du mois (par semaine)
-            heures_sup_details = self._calculer_heures_sup_mensuel(employe, date_debut, date_fin)
-            
-            # Compter les absences
-            nb_absences = presences.filter(statut_jour='ABSENT').count()
-            nb_conges = presences.filter(statut_jour='CONGE').count()
+            heures_sup_details = heures_sup.get(employe.id, aucune_heure_sup)
+            jours_ouvrables = get_calendrier(employe.site_id).nb_jours_ouvrables(date_debut, date_fin)
             
             # Données employé pour la paie
             employe_data = {
@@ -732,9 +1163,9 @@ class GestionnairePointage:
                 'heures_normales': total_heures_travaillees.total_seconds() / 3600,
                 'heures_theoriques': total_heures_theoriques.total_seconds() / 3600,
                 'heures_supplementaires': {
-                    'total': heures_sup_details['total'].total_seconds() / 3600,
-                    'taux_25': heures_sup_details['25%'].total_seconds() / 3600,
-                    'taux_50': heures_sup_details['50%'].total_seconds() / 3600,
+                    'total': heures_sup_details['heures_sup_total'].total_seconds() / 3600,
+                    'taux_25': heures_sup_details['heures_sup_25'].total_seconds() / 3600,
+                    'taux_50': heures_sup_details['heures_sup_50'].total_seconds() / 3600,
                     'montant_25': heures_sup_details['montant_25'],
                     'montant_50': heures_sup_details['montant_50']
                 },
@@ -747,8 +1178,9 @@ class GestionnairePointage:
                     'total_minutes': total_retard_minutes,
                     'montant_retenue': self._calculer_retenue_retards(employe, total_retard_minutes)
                 },
-                'presences_validees': len(presences),
-                'taux_presence': (len(presences) / monthrange(annee, mois)[1]) * 100 if monthrange(annee, mois)[1] > 0 else 0
+                'presences_validees': nb_presences,
+                'jours_ouvrables': jours_ouvrables,
+                'taux_presence': (nb_presences / jours_ouvrables) * 100 if jours_ouvrables else 0
             }
             
             donnees_paie['employes'].append(employe_data)
@@ -756,43 +1188,12 @@ class GestionnairePointage:
             # Mise à jour stats globales
             stats = donnees_paie['statistiques_globales']
             stats['total_heures_normales'] += total_heures_travaillees
-            stats['total_heures_sup'] += heures_sup_details['total']
+            stats['total_heures_sup'] += heures_sup_details['heures_sup_total']
             stats['total_absences'] += nb_absences
             stats['total_retards_minutes'] += total_retard_minutes
         
         return donnees_paie
     
-    def _calculer_heures_sup_mensuel(self, employe: Employee, date_debut: date, date_fin: date) -> Dict:
-        """Calcule les heures supplémentaires sur un mois (semaine par semaine)"""
-        heures_sup_total = timedelta(0)
-        heures_sup_25 = timedelta(0)
-        heures_sup_50 = timedelta(0)
-        
-        # Parcourir chaque semaine du mois
-        current_date = date_debut
-        while current_date <= date_fin:
-            # Début de semaine (lundi)
-            debut_semaine = current_date - timedelta(days=current_date.weekday())
-            fin_semaine = debut_semaine + timedelta(days=6)
-            
-            # Calculer les heures sup de cette semaine
-            heures_sup_semaine = self.calculer_heures_supplementaires(employe, debut_semaine, fin_semaine)
-            
-            heures_sup_total += heures_sup_semaine['heures_sup_total']
-            heures_sup_25 += heures_sup_semaine['heures_sup_25']
-            heures_sup_50 += heures_sup_semaine['heures_sup_50']
-            
-            # Semaine suivante
-            current_date = fin_semaine + timedelta(days=1)
-        
-        return {
-            'total': heures_sup_total,
-            '25%': heures_sup_25,
-            '50%': heures_sup_50,
-            'montant_25': self._calculer_montant_heures_sup(employe, heures_sup_25, 25),
-            'montant_50': self._calculer_montant_heures_sup(employe, heures_sup_50, 50)
-        }
-    
     def _calculer_retenue_retards(self, employe: Employee, total_retard_minutes: int) -> Decimal:
         """Calcule le montant de retenue pour retards"""
         if total_retard_minutes == 0:
@@ -812,49 +1213,29 @@ class GestionnairePointage:
         return salaire_horaire * heures_retard
     
     def _verifier_alertes_pointage(self, employe: Employee, pointage: Pointage):
-        """Vérifie et crée les alertes nécessaires après un pointage"""
-        try:
-            # Alerte retard important
-            if pointage.type_pointage == 'ARRIVEE' and pointage.retard_minutes > 30:
-                AlertePresence.objects.get_or_create(
-                    employe=employe,
-                    date_concernee=pointage.heure_pointage.date(),
-                    type_alerte='RETARD',
-                    defaults={
-                        'niveau_gravite': 'ALERTE' if pointage.retard_minutes > 60 else 'ATTENTION',
-                        'titre': f'Retard important de {int(pointage.retard_minutes)} minutes',
-                        'message': f'Arrivée à {pointage.heure_pointage.strftime("%H:%M")} au lieu de {pointage.heure_theorique.strftime("%H:%M") if pointage.heure_theorique else "N/A"}',
-                        'details': {
-                            'retard_minutes': pointage.retard_minutes,
-                            'heure_pointage': pointage.heure_pointage.isoformat(),
-                            'heure_theorique': pointage.heure_theorique.isoformat() if pointage.heure_theorique else None
-                        }
-                    }
-                )
-            
-            # Vérifier les retards répétés (3 retards dans les 7 derniers jours)
-            retards_recents = Pointage.objects.filter(
-                employe=employe,
-                type_pointage='ARRIVEE',
-                statut='RETARD',
-                heure_pointage__date__gte=pointage.heure_pointage.date() - timedelta(days=7)
-            ).count()
-            
-            if retards_recents >= 3:
-                AlertePresence.objects.get_or_create(
-                    employe=employe,
-                    date_concernee=pointage.heure_pointage.date(),
-                    type_alerte='RETARDS_REPETES',
-                    defaults={
-                        'niveau_gravite': 'CRITIQUE',
-                        'titre': f'{retards_recents} retards dans les 7 derniers jours',
-                        'message': 'Retards répétés nécessitant une intervention RH',
-                        'actions_recommandees': 'Entretien avec le manager, vérification des horaires'
-                    }
-                )
-                
-        except Exception as e:
-            logger.error(f"Erreur lors de la vérification des alertes: {e}")
+        """
+        Vérifie et crée les alertes nécessaires après un pointage
+        
+        Les règles (ReglePointage actives) sont évaluées par le moteur partagé
+        du processus (get_moteur_alertes), dont la fenêtre de l'employé est
+        amorcée à son premier pointage du jour. Un pointage sur un autre jour
+        (saisie a posteriori) passe par un moteur dédié à cet employé.
+        """
+        jour = pointage.heure_pointage.date()
+        with verrou_moteur_alertes():
+            moteur = None
+            try:
+                moteur = get_moteur_alertes()
+                if moteur.reference != jour:
+                    moteur = MoteurAlertesPresence(reference=jour, employes_ids=[employe.id])
+                moteur.amorcer_employes([employe.id])
+                moteur.traiter_presences([(employe.id, jour)])
+                moteur.vider_alertes()
+                    
+            except Exception as e:
+                if moteur is not None:
+                    moteur.abandonner_alertes()
+                logger.error(f"Erreur lors de la vérification des alertes: {e}")
     
     def get_statut_presence_temps_reel(self) -> Dict:
         """Retourne le statut de présence en temps réel pour tous les employés"""
@@ -864,6 +1245,9 @@ class GestionnairePointage:
         # Tous les employés actifs
         employes = Employee.objects.filter(is_active=True).select_related('department')
         
+        # Horaires du jour chargés en une fois
+        self.charger_horaires(aujourd_hui)
+        
         statuts = {
             'presents': [],
             'absents': [],
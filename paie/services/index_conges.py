@@ -0,0 +1,218 @@
+# paie/services/index_conges.py
+# Index en mémoire des congés par département (arbres d'intervalles) et règles de planification
+
+from collections import defaultdict, namedtuple
+from datetime import date, timedelta
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from ..models import DemandeConge, RegleConge
+from .generations import CompteurGeneration
+
+logger = logging.getLogger(__name__)
+
+CLE_GENERATION_INDEX_CONGES = 'paie:index_conges:generation'
+
+STATUTS_ACCORDES = ['APPROUVEE', 'EN_COURS']
+STATUTS_EN_ATTENTE = ['SOUMISE', 'EN_ATTENTE_MANAGER', 'EN_ATTENTE_RH']
+
+# Les congés terminés depuis plus longtemps ne sont pas indexés
+HORIZON_JOURS = 366
+
+# Règle de planification (RegleConge de type PLANIFICATION), paramètres :
+#   max_absents_simultanes : absents simultanés autorisés dans le département, demandeur compris
+#   inclure_en_attente     : compter aussi les demandes des collègues non encore approuvées
+#   bloquant               : refuser la demande au lieu d'avertir
+ReglePlanification = namedtuple('ReglePlanification', 'code max_absents inclure_en_attente bloquant')
+
+# Sans règle configurée : avertissement dès que 2 collègues sont déjà absents
+REGLE_PLANIFICATION_DEFAUT = ReglePlanification('DEFAUT', 2, False, False)
+
+# (début, fin, employé, demande, statut) ; dates en ordinaux
+Intervalle = Tuple[int, int, int, int, str]
+
+
+_generation = CompteurGeneration(CLE_GENERATION_INDEX_CONGES)
+
+
+def get_generation_index_conges() -> int:
+    return _generation.lire()
+
+
+def invalider_index_conges():
+    """Appelé par les signaux de DemandeConge, RegleConge et Employee (génération changée aussi au commit)"""
+    _generation.invalider()
+
+
+class ArbreIntervalles:
+    """
+    Arbre d'intervalles statique
+
+    Les intervalles sont triés par début ; le nœud d'une tranche [bas, haut) est
+    son milieu, augmenté de la plus grande fin de la tranche. Une recherche
+    élague les sous-arbres qui finissent avant la période et ceux qui commencent
+    après : O(log n + k) pour k intervalles trouvés.
+    """
+
+    def __init__(self, intervalles: List[Intervalle]):
+        self.intervalles = sorted(intervalles)
+        self.debuts = [intervalle[0] for intervalle in self.intervalles]
+        self.fin_max = [intervalle[1] for intervalle in self.intervalles]
+        self._augmenter(0, len(self.intervalles))
+
+    def __len__(self):
+        return len(self.intervalles)
+
+    def _augmenter(self, bas: int, haut: int) -> int:
+        if bas >= haut:
+            return -1
+        milieu = (bas + haut) // 2
+        self.fin_max[milieu] = max(
+            self.fin_max[milieu], self._augmenter(bas, milieu), self._augmenter(milieu + 1, haut)
+        )
+        return self.fin_max[milieu]
+
+    def chevauchements(self, debut: int, fin: int) -> List[Intervalle]:
+        """Intervalles qui rencontrent [debut, fin]"""
+        trouves = []
+        tranches = [(0, len(self.intervalles))]
+        while tranches:
+            bas, haut = tranches.pop()
+            if bas >= haut:
+                continue
+            milieu = (bas + haut) // 2
+            if self.fin_max[milieu] < debut:
+                continue
+            tranches.append((bas, milieu))
+            # Le nœud et sa moitié droite commencent après `fin` : rien à y trouver
+            if self.debuts[milieu] > fin:
+                continue
+            if self.intervalles[milieu][1] >= debut:
+                trouves.append(self.intervalles[milieu])
+            tranches.append((milieu + 1, haut))
+        return trouves
+
+
+class IndexConges:
+    """
+    Congés accordés et en attente, un arbre d'intervalles par département
+
+    Chaque arbre est chargé au premier accès à son département, puis servi
+    depuis la mémoire du processus jusqu'à la prochaine invalidation.
+    """
+
+    def __init__(self):
+        self.generation = get_generation_index_conges()
+        self.depuis = date.today() - timedelta(days=HORIZON_JOURS)
+        self._arbres: Dict[Optional[int], ArbreIntervalles] = {}
+        self._regles: Optional[List[Tuple[ReglePlanification, frozenset, frozenset]]] = None
+
+    def est_perime(self) -> bool:
+        return self.generation != get_generation_index_conges()
+
+    def _arbre(self, departement_id: Optional[int]) -> ArbreIntervalles:
+        arbre = self._arbres.get(departement_id)
+        if arbre is None:
+            conges = DemandeConge.objects.filter(
+                statut__in=STATUTS_ACCORDES + STATUTS_EN_ATTENTE,
+                date_fin__gte=self.depuis
+            )
+            if departement_id is None:
+                conges = conges.filter(employe__department__isnull=True)
+            else:
+                conges = conges.filter(employe__department_id=departement_id)
+
+            arbre = self._arbres[departement_id] = ArbreIntervalles([
+                (date_debut.toordinal(), date_fin.toordinal(), employe_id, demande_id, statut)
+                for demande_id, employe_id, statut, date_debut, date_fin in conges.values_list(
+                    'id', 'employe_id', 'statut', 'date_debut', 'date_fin'
+                )
+            ])
+            logger.debug(f"Index congés du département {departement_id}: {len(arbre)} demandes")
+        return arbre
+
+    def conges(self, departement_id: Optional[int], date_debut: date, date_fin: date,
+               statuts: Optional[List[str]] = None) -> List[Intervalle]:
+        """Demandes du département qui chevauchent la période"""
+        trouves = self._arbre(departement_id).chevauchements(date_debut.toordinal(), date_fin.toordinal())
+        if statuts is not None:
+            trouves = [intervalle for intervalle in trouves if intervalle[4] in statuts]
+        return trouves
+
+    def demandes_employe(self, employe_id: int, departement_id: Optional[int],
+                         date_debut: date, date_fin: date) -> List[int]:
+        """Demandes de l'employé (accordées ou en attente) qui chevauchent la période"""
+        return [
+            intervalle[3] for intervalle in self.conges(departement_id, date_debut, date_fin)
+            if intervalle[2] == employe_id
+        ]
+
+    def pic_absences(self, departement_id: Optional[int], date_debut: date, date_fin: date,
+                     exclure: Optional[int] = None, statuts: List[str] = STATUTS_ACCORDES) -> int:
+        """Nombre maximal d'employés absents le même jour sur [date_debut, date_fin]"""
+        debut, fin = date_debut.toordinal(), date_fin.toordinal()
+
+        # Un employé n'est compté qu'une fois par jour, même avec deux demandes
+        par_employe = defaultdict(list)
+        for intervalle in self.conges(departement_id, date_debut, date_fin, statuts):
+            if intervalle[2] != exclure:
+                par_employe[intervalle[2]].append((max(intervalle[0], debut), min(intervalle[1], fin)))
+
+        evenements = []
+        for periodes in par_employe.values():
+            periodes.sort()
+            courant_debut, courant_fin = periodes[0]
+            for periode_debut, periode_fin in periodes[1:]:
+                if periode_debut <= courant_fin + 1:
+                    courant_fin = max(courant_fin, periode_fin)
+                else:
+                    evenements += [(courant_debut, 1), (courant_fin + 1, -1)]
+                    courant_debut, courant_fin = periode_debut, periode_fin
+            evenements += [(courant_debut, 1), (courant_fin + 1, -1)]
+
+        pic = absents = 0
+        # À date égale, les départs (-1) passent avant les arrivées
+        for _, delta in sorted(evenements):
+            absents += delta
+            pic = max(pic, absents)
+        return pic
+
+    def regles_planification(self, departement_id: Optional[int],
+                             type_conge_id: Optional[int] = None) -> List[ReglePlanification]:
+        """Règles de planification applicables (la règle par défaut si aucune n'est configurée)"""
+        if self._regles is None:
+            self._regles = []
+            for regle in RegleConge.objects.filter(actif=True, type_regle='PLANIFICATION').prefetch_related(
+                'types_conge', 'departements'
+            ):
+                parametres = regle.parametres or {}
+                if 'max_absents_simultanes' not in parametres:
+                    continue
+                self._regles.append((
+                    ReglePlanification(
+                        regle.code,
+                        int(parametres['max_absents_simultanes']),
+                        bool(parametres.get('inclure_en_attente', False)),
+                        bool(parametres.get('bloquant', False)),
+                    ),
+                    frozenset(type_conge.id for type_conge in regle.types_conge.all()),
+                    frozenset(departement.id for departement in regle.departements.all()),
+                ))
+
+        # Une règle sans type ni département s'applique à tous
+        applicables = [
+            regle for regle, types, departements in self._regles
+            if (not types or type_conge_id in types) and (not departements or departement_id in departements)
+        ]
+        return applicables or [REGLE_PLANIFICATION_DEFAUT]
+
+
+_index: Optional[IndexConges] = None
+
+
+def get_index_conges() -> IndexConges:
+    """Index partagé dans le processus tant qu'aucune demande ni règle n'a changé"""
+    global _index
+    if _index is None or _index.est_perime():
+        _index = IndexConges()
+    return _index
@@ -0,0 +1,262 @@
+# paie/services/journal_soldes.py
+# Journal des mouvements de soldes de congés : écriture, comptabilisation du workflow, contrôle
+
+from collections import defaultdict
+from decimal import Decimal
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from ..models import DemandeConge, Employee, MouvementSolde, SoldeConge, TypeConge
+
+logger = logging.getLogger(__name__)
+
+# Statuts dont les jours sont décomptés du solde
+STATUTS_DECOMPTES = ['APPROUVEE', 'EN_COURS', 'TERMINEE']
+
+# Nature du mouvement -> champ de SoldeConge alimenté
+CHAMPS_MOUVEMENT = {
+    'ACQUISITION': 'jours_acquis',
+    'CONSOMMATION': 'jours_pris',
+    'REPORT': 'jours_reportes',
+    'AJUSTEMENT': 'ajustement_manuel',
+}
+
+
+@transaction.atomic
+def enregistrer_mouvement(employe_id: int, type_conge_id: int, annee: int, type_mouvement: str,
+                          jours: Decimal, demande: DemandeConge = None, libelle: str = '',
+                          user=None) -> Optional[MouvementSolde]:
+    """
+    Ajoute un mouvement au journal et le reporte sur le solde en une mise à jour
+
+    Si le solde n'existe pas encore, il est ouvert par le recalcul en lot, qui
+    tient compte du mouvement déjà journalisé.
+    """
+    jours = Decimal(str(jours))
+    if not jours:
+        return None
+
+    mouvement = MouvementSolde.objects.create(
+        employe_id=employe_id,
+        type_conge_id=type_conge_id,
+        annee=annee,
+        type_mouvement=type_mouvement,
+        jours=jours,
+        demande=demande,
+        libelle=libelle,
+        cree_par=user
+    )
+
+    champ = CHAMPS_MOUVEMENT[type_mouvement]
+    nb_modifies = SoldeConge.objects.filter(
+        employe_id=employe_id, type_conge_id=type_conge_id, annee=annee
+    ).update(**{champ: F(champ) + jours, 'date_derniere_maj': timezone.now()})
+
+    if not nb_modifies:
+        from .gestionnaire_conges import GestionnaireConges
+
+        GestionnaireConges().recalculer_soldes_lot(
+            annee,
+            Employee.objects.filter(pk=employe_id),
+            TypeConge.objects.filter(pk=type_conge_id),
+            forcer=False
+        )
+    return mouvement
+
+
+def comptabiliser_transition(demande: DemandeConge, ancien_statut: str, user=None) -> Optional[MouvementSolde]:
+    """
+    Consommation (ou restitution) de jours quand une demande entre dans les
+    statuts décomptés ou en sort : approbation, annulation ou refus après accord
+    """
+    avant = ancien_statut in STATUTS_DECOMPTES
+    apres = demande.statut in STATUTS_DECOMPTES
+    if avant == apres:
+        return None
+
+    jours = demande.nb_jours_ouvrables if apres else -demande.nb_jours_ouvrables
+    return enregistrer_mouvement(
+        demande.employe_id, demande.type_conge_id, demande.date_debut.year, 'CONSOMMATION', jours,
+        demande=demande,
+        libelle=f"{demande.numero_demande}: {ancien_statut} -> {demande.statut}",
+        user=user
+    )
+
+
+@transaction.atomic
+def enregistrer_mouvements_lot(mouvements: List[MouvementSolde]) -> int:
+    """
+    Journalise des mouvements en une insertion, puis reporte sur chaque solde
+    une seule mise à jour par (employé, type, année) et champ
+
+    Les soldes manquants sont ouverts par le recalcul en lot, une fois par année.
+
+    Returns:
+        Nombre de mouvements enregistrés
+    """
+    from .gestionnaire_pointage import get_parametre_pointage
+
+    mouvements = [mouvement for mouvement in mouvements if mouvement.jours]
+    if not mouvements:
+        return 0
+    MouvementSolde.objects.bulk_create(mouvements, batch_size=get_parametre_pointage('BATCH_SIZE'))
+
+    deltas = defaultdict(lambda: defaultdict(Decimal))
+    for mouvement in mouvements:
+        cle = (mouvement.employe_id, mouvement.type_conge_id, mouvement.annee)
+        deltas[cle][CHAMPS_MOUVEMENT[mouvement.type_mouvement]] += mouvement.jours
+
+    maintenant = timezone.now()
+    manquants = defaultdict(set)
+    for (employe_id, type_id, annee), champs in deltas.items():
+        nb_modifies = SoldeConge.objects.filter(
+            employe_id=employe_id, type_conge_id=type_id, annee=annee
+        ).update(**{champ: F(champ) + jours for champ, jours in champs.items()}, date_derniere_maj=maintenant)
+        if not nb_modifies:
+            manquants[annee].add((employe_id, type_id))
+
+    if manquants:
+        from .gestionnaire_conges import GestionnaireConges
+
+        gestionnaire = GestionnaireConges()
+        for annee, cles in manquants.items():
+            gestionnaire.recalculer_soldes_lot(
+                annee,
+                Employee.objects.filter(pk__in={employe_id for employe_id, _ in cles}),
+                TypeConge.objects.filter(pk__in={type_id for _, type_id in cles}),
+                forcer=False
+            )
+    return len(mouvements)
+
+
+def comptabiliser_transitions(transitions: List[Tuple[DemandeConge, str]], user=None) -> int:
+    """Version en lot de comptabiliser_transition : une liste de (demande, ancien statut)"""
+    mouvements = []
+    for demande, ancien_statut in transitions:
+        avant = ancien_statut in STATUTS_DECOMPTES
+        apres = demande.statut in STATUTS_DECOMPTES
+        if avant == apres:
+            continue
+        mouvements.append(MouvementSolde(
+            employe_id=demande.employe_id,
+            type_conge_id=demande.type_conge_id,
+            annee=demande.date_debut.year,
+            type_mouvement='CONSOMMATION',
+            jours=demande.nb_jours_ouvrables if apres else -demande.nb_jours_ouvrables,
+            demande=demande,
+            libelle=f"{demande.numero_demande}: {ancien_statut} -> {demande.statut}",
+            cree_par=user
+        ))
+    return enregistrer_mouvements_lot(mouvements)
+
+
+@transaction.atomic
+def ajuster_solde(solde: SoldeConge, jours: Decimal, motif: str, user=None) -> Optional[MouvementSolde]:
+    """Ajustement manuel d'un solde (API d'ajustement des RH), tracé au journal"""
+    mouvement = enregistrer_mouvement(
+        solde.employe_id, solde.type_conge_id, solde.annee, 'AJUSTEMENT', jours, libelle=motif, user=user
+    )
+    SoldeConge.objects.filter(pk=solde.pk).update(
+        motif_ajustement=motif, ajuste_par=user, date_ajustement=timezone.now()
+    )
+    return mouvement
+
+
+def totaux_journal(annee: int, employes=None, types_conges=None) -> Dict[Tuple[int, int], Dict[str, Decimal]]:
+    """Sommes des mouvements par (employé, type) et par champ de SoldeConge, en une requête groupée"""
+    mouvements = MouvementSolde.objects.filter(annee=annee)
+    if employes is not None:
+        mouvements = mouvements.filter(employe_id__in=employes.order_by().values('id'))
+    if types_conges is not None:
+        mouvements = mouvements.filter(type_conge__in=types_conges)
+
+    totaux = defaultdict(lambda: dict.fromkeys(CHAMPS_MOUVEMENT.values(), Decimal('0')))
+    for employe_id, type_id, type_mouvement, jours in mouvements.order_by().values_list(
+        'employe_id', 'type_conge_id', 'type_mouvement'
+    ).annotate(jours=Sum('jours')):
+        totaux[(employe_id, type_id)][CHAMPS_MOUVEMENT[type_mouvement]] = jours
+    return totaux
+
+
+@transaction.atomic
+def verifier_soldes(annee: int, corriger: bool = False) -> Dict:
+    """
+    Compare chaque SoldeConge de l'année aux sommes de son journal
+
+    Comme dans recalculer_soldes_lot, un ajustement_manuel modifié hors journal
+    fait foi : la correction journalise l'écart en mouvement AJUSTEMENT. Les
+    autres champs sont reconstruits depuis le journal.
+
+    Args:
+        corriger: Corriger les soldes en écart
+
+    Returns:
+        Dict avec le nombre de soldes contrôlés et le détail des écarts
+    """
+    from .gestionnaire_pointage import get_parametre_pointage
+
+    totaux = totaux_journal(annee)
+    vides = dict.fromkeys(CHAMPS_MOUVEMENT.values(), Decimal('0'))
+    ecarts = []
+    a_corriger = []
+    regularisations = []
+    nb_soldes = 0
+
+    for solde in SoldeConge.objects.filter(annee=annee).select_for_update():
+        nb_soldes += 1
+        attendus = totaux.pop((solde.employe_id, solde.type_conge_id), vides)
+        differences = {
+            champ: float(getattr(solde, champ) - valeur)
+            for champ, valeur in attendus.items() if getattr(solde, champ) != valeur
+        }
+        if differences:
+            ecarts.append({
+                'solde_id': solde.id,
+                'employe_id': solde.employe_id,
+                'type_conge_id': solde.type_conge_id,
+                'ecarts': differences,
+            })
+            ecart_ajustement = solde.ajustement_manuel - attendus['ajustement_manuel']
+            if ecart_ajustement:
+                regularisations.append(MouvementSolde(
+                    employe_id=solde.employe_id, type_conge_id=solde.type_conge_id, annee=annee,
+                    type_mouvement='AJUSTEMENT', jours=ecart_ajustement, libelle='Contrôle du journal'
+                ))
+            for champ, valeur in attendus.items():
+                if champ != 'ajustement_manuel':
+                    setattr(solde, champ, valeur)
+            solde.date_derniere_maj = timezone.now()
+            a_corriger.append(solde)
+
+    # Mouvements sans solde (solde supprimé) : le solde est recréé depuis le journal
+    a_creer = []
+    for (employe_id, type_id), attendus in totaux.items():
+        ecarts.append({
+            'solde_id': None,
+            'employe_id': employe_id,
+            'type_conge_id': type_id,
+            'ecarts': {champ: -float(valeur) for champ, valeur in attendus.items() if valeur},
+        })
+        a_creer.append(SoldeConge(employe_id=employe_id, type_conge_id=type_id, annee=annee, **attendus))
+
+    if corriger:
+        taille_lot = get_parametre_pointage('BATCH_SIZE')
+        SoldeConge.objects.bulk_update(
+            a_corriger, [*CHAMPS_MOUVEMENT.values(), 'date_derniere_maj'], batch_size=taille_lot
+        )
+        SoldeConge.objects.bulk_create(a_creer, batch_size=taille_lot)
+        MouvementSolde.objects.bulk_create(regularisations, batch_size=taille_lot)
+
+    if ecarts:
+        logger.warning(f"Soldes {annee}: {len(ecarts)} écart(s) avec le journal sur {nb_soldes}")
+    return {
+        'annee': annee,
+        'nb_soldes': nb_soldes,
+        'nb_ecarts': len(ecarts),
+        'corriges': corriger,
+        'ecarts': ecarts,
+    }
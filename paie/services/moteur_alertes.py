@@ -0,0 +1,391 @@
+# paie/services/moteur_alertes.py
+# Moteur de règles d'alertes de présence sur fenêtres glissantes en mémoire
+
+from bisect import insort
+from collections import namedtuple
+from datetime import date, timedelta
+import logging
+import threading
+from typing import Callable, Dict, Iterable, List, Optional
+
+from ..models import AlertePresence, PresenceJournaliere, ReglePointage
+from .calculateur_heures_sup import PLAFOND_TAUX_25
+from .generations import CompteurGeneration
+
+logger = logging.getLogger(__name__)
+
+CLE_GENERATION_REGLES = 'paie:regles_pointage:generation'
+
+# Fenêtres des règles : compteurs "par mois" et cumul d'heures sur 7 jours
+FENETRE_MOIS = timedelta(days=30)
+FENETRE_SEMAINE = timedelta(days=7)
+
+# Retard au-delà duquel l'alerte passe de ATTENTION à ALERTE
+RETARD_GRAVE_MINUTES = 60
+
+EvenementPresence = namedtuple(
+    'EvenementPresence', ['employe_id', 'jour', 'statut_jour', 'retard_minutes', 'secondes']
+)
+
+CHAMPS_EVENEMENT = ('employe_id', 'date', 'statut_jour', 'retard_minutes', 'heures_travaillees')
+
+
+_generation = CompteurGeneration(CLE_GENERATION_REGLES)
+
+
+def get_generation_regles() -> int:
+    return _generation.lire()
+
+
+def invalider_regles_alertes():
+    """Force la recompilation des règles par les moteurs en cours d'exécution"""
+    _generation.invalider()
+
+
+def evenement_depuis_ligne(ligne) -> EvenementPresence:
+    """Construit un événement depuis une ligne values_list(*CHAMPS_EVENEMENT)"""
+    employe_id, jour, statut_jour, retard_minutes, heures_travaillees = ligne
+    return EvenementPresence(
+        employe_id, jour, statut_jour, retard_minutes or 0,
+        int(heures_travaillees.total_seconds()) if heures_travaillees else 0
+    )
+
+
+class FenetreEmploye:
+    """
+    Jours récents d'un employé (30 jours au plus) et compteurs associés
+
+    Un jour déjà présent est remplacé (la présence d'un jour est recalculée à
+    chaque pointage) : ses contributions sont retirées avant d'ajouter les
+    nouvelles. La fenêtre étant bornée à 30 jours, chaque opération est en
+    temps constant.
+    """
+
+    __slots__ = ('jours', 'evenements', 'nb_retards', 'nb_absences')
+
+    def __init__(self):
+        self.jours: List[date] = []     # triés
+        self.evenements: Dict[date, tuple] = {}  # jour -> (est_retard, est_absent, secondes)
+        self.nb_retards = 0
+        self.nb_absences = 0
+
+    def ajouter(self, jour: date, est_retard: bool, est_absent: bool, secondes: int) -> bool:
+        """Intègre un jour ; retourne False s'il est déjà sorti de la fenêtre"""
+        if self.jours and jour <= self.jours[-1] - FENETRE_MOIS:
+            return False
+
+        ancien = self.evenements.get(jour)
+        if ancien:
+            self.nb_retards -= ancien[0]
+            self.nb_absences -= ancien[1]
+        else:
+            insort(self.jours, jour)
+
+        self.evenements[jour] = (est_retard, est_absent, secondes)
+        self.nb_retards += est_retard
+        self.nb_absences += est_absent
+
+        while self.jours[0] <= self.jours[-1] - FENETRE_MOIS:
+            retard, absent, _ = self.evenements.pop(self.jours.pop(0))
+            self.nb_retards -= retard
+            self.nb_absences -= absent
+        return True
+
+    def secondes_semaine(self, jour: date) -> int:
+        """Heures travaillées (en secondes) sur les 7 jours se terminant à `jour`"""
+        total = 0
+        for jour_fenetre in reversed(self.jours):
+            if jour_fenetre > jour:
+                continue
+            if jour_fenetre <= jour - FENETRE_SEMAINE:
+                break
+            total += self.evenements[jour_fenetre][2]
+        return total
+
+
+class ReglesCompilees:
+    """Prédicats d'alerte compilés depuis une ReglePointage, valables sur sa période"""
+
+    def __init__(self, regle: Optional[ReglePointage]):
+        self.regle_id = regle.id if regle else None
+        self.date_debut = regle.date_debut if regle else date.min
+        self.date_fin = (regle.date_fin if regle else None) or date.max
+
+        self.tolerance_retard = regle.tolerance_retard_minutes if regle else 10
+        seuil_retard = regle.seuil_retard_alerte_minutes if regle else 15
+        nb_retards = regle.nb_retards_alerte_mois if regle else 3
+        nb_absences = regle.nb_absences_alerte_mois if regle else 2
+        seuil_semaine = regle.seuil_heures_sup_semaine if regle else timedelta(hours=44)
+        seuil_excessif = int((seuil_semaine + PLAFOND_TAUX_25).total_seconds())
+
+        self.predicats: List[Callable] = [
+            self._compiler_retard(seuil_retard),
+            self._compiler_retards_repetes(nb_retards),
+            self._compiler_absences_repetees(nb_absences),
+            self._compiler_heures_sup_excessives(seuil_excessif),
+        ]
+
+    def couvre(self, jour: date) -> bool:
+        return self.date_debut <= jour <= self.date_fin
+
+    def est_retard(self, evenement: EvenementPresence) -> bool:
+        return evenement.retard_minutes > self.tolerance_retard
+
+    @staticmethod
+    def _compiler_retard(seuil: int) -> Callable:
+        def predicat(fenetre: FenetreEmploye, evenement: EvenementPresence) -> Optional[Dict]:
+            if evenement.retard_minutes <= seuil:
+                return None
+            return {
+                'type_alerte': 'RETARD',
+                'niveau_gravite': 'ALERTE' if evenement.retard_minutes > RETARD_GRAVE_MINUTES else 'ATTENTION',
+                'titre': f'Retard important de {evenement.retard_minutes} minutes',
+                'message': f'Retard de {evenement.retard_minutes} minutes (seuil: {seuil} minutes)',
+                'details': {'retard_minutes': evenement.retard_minutes, 'seuil_minutes': seuil},
+            }
+        return predicat
+
+    def _compiler_retards_repetes(self, nb_max: int) -> Callable:
+        def predicat(fenetre: FenetreEmploye, evenement: EvenementPresence) -> Optional[Dict]:
+            if not self.est_retard(evenement) or fenetre.nb_retards < nb_max:
+                return None
+            return {
+                'type_alerte': 'RETARDS_REPETES',
+                'niveau_gravite': 'CRITIQUE',
+                'titre': f'{fenetre.nb_retards} retards sur les 30 derniers jours',
+                'message': 'Retards répétés nécessitant une intervention RH',
+                'details': {'nb_retards': fenetre.nb_retards, 'seuil': nb_max},
+                'actions_recommandees': 'Entretien avec le manager, vérification des horaires',
+            }
+        return predicat
+
+    @staticmethod
+    def _compiler_absences_repetees(nb_max: int) -> Callable:
+        def predicat(fenetre: FenetreEmploye, evenement: EvenementPresence) -> Optional[Dict]:
+            if evenement.statut_jour != 'ABSENT' or fenetre.nb_absences < nb_max:
+                return None
+            return {
+                'type_alerte': 'ABSENCES_REPETEES',
+                'niveau_gravite': 'CRITIQUE',
+                'titre': f'{fenetre.nb_absences} absences sur les 30 derniers jours',
+                'message': 'Absences répétées nécessitant une intervention RH',
+                'details': {'nb_absences': fenetre.nb_absences, 'seuil': nb_max},
+                'actions_recommandees': 'Entretien avec le manager, vérification des justificatifs',
+            }
+        return predicat
+
+    @staticmethod
+    def _compiler_heures_sup_excessives(seuil_secondes: int) -> Callable:
+        def predicat(fenetre: FenetreEmploye, evenement: EvenementPresence) -> Optional[Dict]:
+            total = fenetre.secondes_semaine(evenement.jour)
+            if total <= seuil_secondes:
+                return None
+            return {
+                'type_alerte': 'HEURES_SUP_EXCESSIVES',
+                'niveau_gravite': 'ALERTE',
+                'titre': f'{total / 3600:.1f}h travaillées sur 7 jours',
+                'message': 'Heures supplémentaires au-delà du palier à 25%',
+                'details': {'heures_7_jours': round(total / 3600, 2), 'seuil_heures': seuil_secondes / 3600},
+            }
+        return predicat
+
+
+class MoteurAlertesPresence:
+    """
+    Évalue les règles d'alerte à chaque présence journalière, en O(1) par événement
+
+    Les fenêtres sont amorcées par une seule requête sur les 30 jours précédant
+    la date de référence, puis alimentées événement par événement. Les alertes
+    sont accumulées et écrites par lots (vider_alertes), sans doublon par
+    (employé, date, type).
+    """
+
+    def __init__(self, reference: date = None, employes_ids: Iterable[int] = None, amorcer: bool = True):
+        self.reference = reference or date.today()
+        self.employes_ids = set(employes_ids) if employes_ids is not None else None
+        self.generation = get_generation_regles()
+        self.regles = self._compiler_regles()
+        self.fenetres: Dict[int, FenetreEmploye] = {}
+        self._alertes: Dict[tuple, Dict] = {}
+        # Employés dont la fenêtre est amorcée (None : tous)
+        self._employes_amorces: Optional[set] = None if amorcer else set()
+        if amorcer:
+            self._amorcer()
+
+    @staticmethod
+    def _compiler_regles() -> List[ReglesCompilees]:
+        regles = [ReglesCompilees(r) for r in ReglePointage.objects.filter(actif=True).order_by('-date_debut')]
+        # Seuils par défaut pour les jours non couverts par une règle
+        regles.append(ReglesCompilees(None))
+        return regles
+
+    def est_perime(self) -> bool:
+        """Vrai si une règle a changé ou si la date de référence est dépassée"""
+        return self.generation != get_generation_regles() or self.reference != date.today()
+
+    def _regles_du_jour(self, jour: date) -> ReglesCompilees:
+        for regles in self.regles:
+            if regles.couvre(jour):
+                return regles
+        return self.regles[-1]
+
+    def _filtrer_employes(self, queryset):
+        if self.employes_ids is not None:
+            return queryset.filter(employe_id__in=self.employes_ids)
+        return queryset
+
+    def _amorcer(self):
+        """Charge les 30 jours précédant la date de référence (exclue) en une requête"""
+        lignes = self._filtrer_employes(PresenceJournaliere.objects.filter(
+            date__gt=self.reference - FENETRE_MOIS,
+            date__lt=self.reference
+        )).order_by('date').values_list(*CHAMPS_EVENEMENT)
+
+        for ligne in lignes.iterator(chunk_size=2000):
+            self._alimenter(evenement_depuis_ligne(ligne))
+
+    def amorcer_employes(self, employes_ids: Iterable[int]):
+        """Amorce à la demande les fenêtres d'employés pas encore chargés (moteur créé sans amorçage)"""
+        if self._employes_amorces is None:
+            return
+        nouveaux = set(employes_ids) - self._employes_amorces
+        if not nouveaux:
+            return
+        self._employes_amorces |= nouveaux
+        lignes = PresenceJournaliere.objects.filter(
+            employe_id__in=nouveaux,
+            date__gt=self.reference - FENETRE_MOIS,
+            date__lt=self.reference
+        ).order_by('date').values_list(*CHAMPS_EVENEMENT)
+        for ligne in lignes:
+            self._alimenter(evenement_depuis_ligne(ligne))
+
+    def _alimenter(self, evenement: EvenementPresence) -> Optional[ReglesCompilees]:
+        regles = self._regles_du_jour(evenement.jour)
+        fenetre = self.fenetres.get(evenement.employe_id)
+        if fenetre is None:
+            fenetre = self.fenetres[evenement.employe_id] = FenetreEmploye()
+        if not fenetre.ajouter(
+            evenement.jour, regles.est_retard(evenement),
+            evenement.statut_jour == 'ABSENT', evenement.secondes
+        ):
+            return None
+        return regles
+
+    def traiter(self, evenement: EvenementPresence) -> int:
+        """Intègre un événement et évalue les règles ; retourne le nombre d'alertes levées"""
+        regles = self._alimenter(evenement)
+        if regles is None:
+            return 0
+        fenetre = self.fenetres[evenement.employe_id]
+
+        nb_alertes = 0
+        for predicat in regles.predicats:
+            alerte = predicat(fenetre, evenement)
+            if alerte is None:
+                continue
+            cle = (evenement.employe_id, evenement.jour, alerte['type_alerte'])
+            if cle not in self._alertes:
+                alerte['details']['regle_pointage_id'] = regles.regle_id
+                self._alertes[cle] = alerte
+                nb_alertes += 1
+        return nb_alertes
+
+    @property
+    def nb_alertes_en_attente(self) -> int:
+        return len(self._alertes)
+
+    def abandonner_alertes(self):
+        """Oublie les alertes en attente (écriture en échec, reprise ultérieure)"""
+        self._alertes.clear()
+
+    def vider_alertes(self, batch_size: int = 1000) -> int:
+        """Écrit les alertes accumulées (une requête de dédoublonnage, un bulk_create)"""
+        if not self._alertes:
+            return 0
+
+        cles = list(self._alertes)
+        jours = [jour for _, jour, _ in cles]
+        existantes = set(AlertePresence.objects.filter(
+            employe_id__in={employe_id for employe_id, _, _ in cles},
+            date_concernee__range=[min(jours), max(jours)],
+            type_alerte__in={type_alerte for _, _, type_alerte in cles}
+        ).values_list('employe_id', 'date_concernee', 'type_alerte'))
+
+        alertes = [
+            AlertePresence(employe_id=employe_id, date_concernee=jour, **donnees)
+            for (employe_id, jour, _), donnees in self._alertes.items()
+            if (employe_id, jour, donnees['type_alerte']) not in existantes
+        ]
+        AlertePresence.objects.bulk_create(alertes, batch_size=batch_size)
+        self._alertes.clear()
+        return len(alertes)
+
+    @classmethod
+    def rejouer(cls, date_debut: date, date_fin: date, employes_ids: Iterable[int] = None,
+                batch_size: int = 1000) -> Dict:
+        """
+        Rejoue les présences d'une période passée pour compléter les alertes manquantes
+
+        Returns:
+            Dict avec le nombre d'événements rejoués et d'alertes créées
+        """
+        moteur = cls(reference=date_debut, employes_ids=employes_ids)
+        lignes = moteur._filtrer_employes(PresenceJournaliere.objects.filter(
+            date__range=[date_debut, date_fin]
+        )).order_by('date', 'employe_id').values_list(*CHAMPS_EVENEMENT)
+
+        nb_evenements = 0
+        nb_alertes = 0
+        for ligne in lignes.iterator(chunk_size=2000):
+            moteur.traiter(evenement_depuis_ligne(ligne))
+            nb_evenements += 1
+            if moteur.nb_alertes_en_attente >= batch_size:
+                nb_alertes += moteur.vider_alertes(batch_size)
+        nb_alertes += moteur.vider_alertes(batch_size)
+
+        logger.info(f"Rejeu alertes {date_debut} - {date_fin}: {nb_evenements} événements, {nb_alertes} alertes")
+        return {
+            'date_debut': date_debut,
+            'date_fin': date_fin,
+            'nb_evenements': nb_evenements,
+            'nb_alertes_creees': nb_alertes,
+        }
+
+    def traiter_presences(self, couples: Iterable[tuple]) -> int:
+        """Charge en une requête les présences (employé, jour) données et les évalue"""
+        couples = set(couples)
+        if not couples:
+            return 0
+        lignes = PresenceJournaliere.objects.filter(
+            employe_id__in={employe_id for employe_id, _ in couples},
+            date__in={jour for _, jour in couples}
+        ).order_by('date').values_list(*CHAMPS_EVENEMENT)
+
+        nb_alertes = 0
+        for ligne in lignes:
+            if (ligne[0], ligne[1]) in couples:
+                nb_alertes += self.traiter(evenement_depuis_ligne(ligne))
+        return nb_alertes
+
+
+_moteur: Optional[MoteurAlertesPresence] = None
+_verrou_moteur = threading.Lock()
+
+
+def get_moteur_alertes() -> MoteurAlertesPresence:
+    """
+    Moteur partagé dans le processus pour les pointages synchrones
+
+    Règles compilées une fois par jour ou génération ; la fenêtre d'un employé
+    est amorcée à son premier pointage (amorcer_employes). À utiliser sous
+    verrou_moteur_alertes() : les requêtes de plusieurs threads le partagent.
+    """
+    global _moteur
+    if _moteur is None or _moteur.est_perime():
+        _moteur = MoteurAlertesPresence(amorcer=False)
+    return _moteur
+
+
+def verrou_moteur_alertes() -> threading.Lock:
+    return _verrou_moteur
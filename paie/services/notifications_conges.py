@@ -0,0 +1,195 @@
+# paie/services/notifications_conges.py
+# Boîte d'envoi des notifications de congés : mise en file transactionnelle, envoi groupé par destinataire
+
+from collections import defaultdict
+from datetime import timedelta
+import logging
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+from ..models import DemandeConge, NotificationConge
+
+logger = logging.getLogger(__name__)
+
+# Au-delà, la notification passe en échec définitif
+MAX_TENTATIVES = 5
+
+# Attente avant reprise, doublée à chaque échec (1 min, 2 min, 4 min...) et plafonnée
+DELAI_REPRISE = 60
+DELAI_REPRISE_MAX = 6 * 60 * 60
+
+# Une notification réservée par un worker qui s'arrête est reprise après ce délai
+DUREE_RESERVATION = 10 * 60
+
+SEPARATEUR_RECAPITULATIF = '\n\n' + '-' * 40 + '\n\n'
+
+
+def preparer_notification(destinataire: str, type_notification: str, sujet: str, message: str,
+                          demande: DemandeConge = None) -> Optional[NotificationConge]:
+    """Notification non enregistrée (None sans adresse de destinataire)"""
+    if not destinataire:
+        return None
+    return NotificationConge(
+        destinataire=destinataire,
+        type_notification=type_notification,
+        sujet=sujet[:200],
+        message=message,
+        demande=demande
+    )
+
+
+def mettre_en_file(destinataire: str, type_notification: str, sujet: str, message: str,
+                   demande: DemandeConge = None) -> Optional[NotificationConge]:
+    """
+    Écrit une notification dans la boîte d'envoi
+
+    Appelée dans la transaction du workflow : la notification n'existe que si
+    le changement de statut est validé, et aucun envoi SMTP n'est fait sous verrou.
+    """
+    notification = preparer_notification(destinataire, type_notification, sujet, message, demande)
+    if notification is not None:
+        notification.save()
+    return notification
+
+
+def mettre_en_file_lot(notifications: List[Optional[NotificationConge]]) -> int:
+    """Écrit en une insertion les notifications préparées (les None sont ignorées)"""
+    notifications = [notification for notification in notifications if notification is not None]
+    NotificationConge.objects.bulk_create(notifications)
+    return len(notifications)
+
+
+def get_delai_reprise(nb_tentatives: int) -> timedelta:
+    return timedelta(seconds=min(DELAI_REPRISE * 2 ** (nb_tentatives - 1), DELAI_REPRISE_MAX))
+
+
+def _composer_email(destinataire: str, notifications: List[NotificationConge], connection) -> EmailMessage:
+    """Un seul email par destinataire : la notification telle quelle, ou un récapitulatif"""
+    if len(notifications) == 1:
+        sujet, message = notifications[0].sujet, notifications[0].message
+    else:
+        sujet = f"{len(notifications)} notifications de congés"
+        message = SEPARATEUR_RECAPITULATIF.join(
+            f"{notification.sujet}\n\n{notification.message}" for notification in notifications
+        )
+    return EmailMessage(
+        subject=sujet,
+        body=message,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[destinataire],
+        connection=connection
+    )
+
+
+def _reserver_lot(taille_lot: int) -> List[NotificationConge]:
+    """Notifications dues, réservées le temps de l'envoi pour qu'un autre worker ne les reprenne pas"""
+    maintenant = timezone.now()
+    with transaction.atomic():
+        ids = list(NotificationConge.objects.filter(
+            statut='EN_ATTENTE',
+            prochaine_tentative__lte=maintenant
+        ).select_for_update(skip_locked=True).order_by('prochaine_tentative', 'id').values_list(
+            'id', flat=True
+        )[:taille_lot])
+        NotificationConge.objects.filter(id__in=ids).update(
+            prochaine_tentative=maintenant + timedelta(seconds=DUREE_RESERVATION)
+        )
+    return list(NotificationConge.objects.filter(id__in=ids).order_by('date_creation', 'id'))
+
+
+def envoyer_lot(taille_lot: int = 500, connection=None) -> Dict:
+    """
+    Envoie un lot de notifications dues sur une seule connexion au serveur de mail
+
+    Les notifications d'un même destinataire sont regroupées en un email. Un envoi
+    en erreur est reprogrammé avec un délai croissant, puis abandonné après
+    MAX_TENTATIVES.
+
+    Returns:
+        Dict avec le nombre de notifications envoyées, d'emails, d'échecs et de notifications encore dues
+    """
+    notifications = _reserver_lot(taille_lot)
+    if not notifications:
+        return {'envoyees': 0, 'emails': 0, 'echecs': 0, 'restantes': 0}
+
+    par_destinataire: Dict[str, List[NotificationConge]] = defaultdict(list)
+    for notification in notifications:
+        par_destinataire[notification.destinataire.lower()].append(notification)
+
+    envoyees: List[NotificationConge] = []
+    nb_emails = 0
+    en_echec: Dict[str, List[NotificationConge]] = {}
+    connection = connection or get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        logger.error(f"Connexion au serveur de mail impossible: {e}")
+        en_echec[str(e)] = notifications
+    else:
+        try:
+            for destinataire, groupe in par_destinataire.items():
+                try:
+                    connection.send_messages([_composer_email(destinataire, groupe, connection)])
+                    envoyees.extend(groupe)
+                    nb_emails += 1
+                except Exception as e:
+                    logger.warning(f"Erreur envoi notification à {destinataire}: {e}")
+                    en_echec.setdefault(str(e), []).extend(groupe)
+        finally:
+            connection.close()
+
+    maintenant = timezone.now()
+    if envoyees:
+        NotificationConge.objects.filter(id__in=[notification.id for notification in envoyees]).update(
+            statut='ENVOYEE',
+            date_envoi=maintenant,
+            nb_tentatives=F('nb_tentatives') + 1,
+            derniere_erreur=''
+        )
+
+    echecs = []
+    for erreur, groupe in en_echec.items():
+        for notification in groupe:
+            notification.nb_tentatives += 1
+            notification.derniere_erreur = erreur
+            if notification.nb_tentatives >= MAX_TENTATIVES:
+                notification.statut = 'ECHEC'
+            notification.prochaine_tentative = maintenant + get_delai_reprise(notification.nb_tentatives)
+            echecs.append(notification)
+    if echecs:
+        NotificationConge.objects.bulk_update(
+            echecs, ['nb_tentatives', 'derniere_erreur', 'statut', 'prochaine_tentative']
+        )
+
+    return {
+        'envoyees': len(envoyees),
+        'emails': nb_emails,
+        'echecs': len(echecs),
+        'restantes': NotificationConge.objects.filter(
+            statut='EN_ATTENTE', prochaine_tentative__lte=maintenant
+        ).count(),
+    }
+
+
+def get_metriques_notifications() -> Dict:
+    """Backlog de la boîte d'envoi : notifications en attente, en reprise, en échec et âge de la plus ancienne"""
+    en_attente = Q(statut='EN_ATTENTE')
+    stats = NotificationConge.objects.aggregate(
+        en_attente=Count('id', filter=en_attente),
+        en_reprise=Count('id', filter=en_attente & Q(nb_tentatives__gt=0)),
+        en_echec=Count('id', filter=Q(statut='ECHEC')),
+        plus_ancienne=Min('date_creation', filter=en_attente)
+    )
+    plus_ancienne = stats['plus_ancienne']
+    return {
+        'en_attente': stats['en_attente'],
+        'en_reprise': stats['en_reprise'],
+        'en_echec': stats['en_echec'],
+        'plus_ancienne': plus_ancienne,
+        'retard_secondes': (timezone.now() - plus_ancienne).total_seconds() if plus_ancienne else 0,
+    }
@@ -0,0 +1,486 @@
+# paie/services/optimiseur_plannings.py
+# Affectation mensuelle des plages horaires : minimise les heures sup sous contrainte de couverture
+
+from calendar import monthrange
+from datetime import date, timedelta
+import logging
+import time
+from typing import Dict, Iterable, List, Mapping, Optional
+
+from django.db import transaction
+from django.db.models import Max
+
+from ..models import DemandeConge, Employee, HoraireTravail, PlageHoraire, PresenceJournaliere
+from .gestionnaire_pointage import STATUTS_CONGE_APPROUVE, get_parametre_pointage
+from .resolveur_horaires import ResolveurHoraires, invalider_cache_horaires
+
+logger = logging.getLogger(__name__)
+
+# Coûts exprimés en heures : une personne-jour manquante pèse bien plus que
+# n'importe quel volume d'heures sup, un changement d'affectation un peu moins qu'une heure.
+# Une heure sous le contrat compte moitié moins qu'une heure sup.
+PENALITE_COUVERTURE = 1000.0
+PENALITE_CHANGEMENT = 0.5
+POIDS_SOUS_CONTRAT = 0.5
+
+HEURES_CONTRAT_DEFAUT = 44.0
+
+
+class OptimiseurPlannings:
+    """
+    Choisit une PlageHoraire par employé pour un mois
+
+    Le coût d'une affectation est la somme, semaine par semaine, des heures au-delà
+    du contrat (prorata des jours disponibles, congés approuvés déduits) et des
+    heures manquantes sous le contrat. La couverture exige, par (département, plage),
+    un nombre minimum d'employés présents chaque jour travaillé de la plage.
+
+    Recherche locale : on part de l'affectation actuelle (démarrage à chaud), puis
+    chaque employé est déplacé vers la plage qui fait le plus baisser le coût total,
+    jusqu'à ce qu'une passe complète ne trouve plus d'amélioration. Le delta d'un
+    déplacement ne touche que les jours de l'employé : une passe coûte
+    O(employés × plages × jours).
+    """
+
+    def __init__(self, annee: int, mois: int, couverture: Mapping[int, Mapping[int, int]] = None,
+                 departement_id: Optional[int] = None, plages_ids: Iterable[int] = None,
+                 max_passes: int = 20):
+        """
+        Args:
+            couverture: {departement_id: {plage_horaire_id: nb_employes_minimum}}
+            departement_id: limite l'optimisation à un département
+            plages_ids: plages candidates (défaut: toutes les plages actives)
+        """
+        self.debut = date(annee, mois, 1)
+        self.fin = date(annee, mois, monthrange(annee, mois)[1])
+        self.nb_jours = (self.fin - self.debut).days + 1
+        self.besoins = {
+            (int(departement), int(plage)): int(nb)
+            for departement, plages in (couverture or {}).items()
+            for plage, nb in plages.items() if int(nb) > 0
+            if departement_id is None or int(departement) == departement_id
+        }
+        self.departement_id = departement_id
+        self.plages_ids = set(plages_ids) if plages_ids is not None else None
+        self.max_passes = max_passes
+
+        self.plages: Dict[int, PlageHoraire] = {}
+        self.employes: List[Dict] = []
+        self.initiale: Dict[int, Optional[int]] = {}
+        self.affectation: Dict[int, Optional[int]] = {}
+        self._charge = False
+
+    @property
+    def periode(self) -> str:
+        return f'{self.debut.year:04d}-{self.debut.month:02d}'
+
+    # ------------------------------------------------------------------
+    # Chargement
+    # ------------------------------------------------------------------
+
+    def charger(self) -> 'OptimiseurPlannings':
+        """Plages, employés, congés et affectations actuelles : une requête chacun"""
+        plages_query = PlageHoraire.objects.filter(actif=True)
+        if self.plages_ids is not None:
+            plages_query = plages_query.filter(id__in=self.plages_ids)
+        self.plages = {plage.id: plage for plage in plages_query if plage.jours_travailles}
+
+        # Jours du mois travaillés par chaque plage (index 0 = premier du mois)
+        jours = [self.debut + timedelta(days=i) for i in range(self.nb_jours)]
+        self._semaine_du_jour = []
+        self._jours_par_semaine = []
+        for jour in jours:
+            if not self._jours_par_semaine or jour.weekday() == 0:
+                self._jours_par_semaine.append(0)
+            self._jours_par_semaine[-1] += 1
+            self._semaine_du_jour.append(len(self._jours_par_semaine) - 1)
+
+        self._jours_plage = {
+            plage_id: [i for i, jour in enumerate(jours) if jour.isoweekday() in plage.jours_travailles]
+            for plage_id, plage in self.plages.items()
+        }
+        self._heures_plage = {
+            plage_id: plage.duree_theorique.total_seconds() / 3600
+            for plage_id, plage in self.plages.items()
+        }
+
+        employes_query = Employee.objects.filter(is_active=True)
+        if self.departement_id is not None:
+            employes_query = employes_query.filter(department_id=self.departement_id)
+        self.employes = list(employes_query.order_by('id').values('id', 'department_id', 'nb_heures_semaine'))
+        employes_ids = [employe['id'] for employe in self.employes]
+
+        conges: Dict[int, set] = {}
+        for employe_id, date_debut, date_fin in DemandeConge.objects.filter(
+            employe_id__in=employes_ids,
+            statut__in=STATUTS_CONGE_APPROUVE,
+            date_debut__lte=self.fin,
+            date_fin__gte=self.debut
+        ).values_list('employe_id', 'date_debut', 'date_fin'):
+            premier = (max(date_debut, self.debut) - self.debut).days
+            dernier = (min(date_fin, self.fin) - self.debut).days
+            conges.setdefault(employe_id, set()).update(range(premier, dernier + 1))
+
+        resolveur = ResolveurHoraires(self.debut, self.fin, employes_ids=employes_ids)
+        for employe in self.employes:
+            employe['conges'] = frozenset(conges.get(employe['id'], ()))
+            employe['contrat'] = float(employe['nb_heures_semaine'] or HEURES_CONTRAT_DEFAUT)
+            horaire = resolveur.get_horaire(employe['id'], self.debut)
+            plage_id = horaire.plage_horaire_id if horaire else None
+            self.initiale[employe['id']] = plage_id if plage_id in self.plages else None
+
+        self._couts = self._calculer_couts()
+        self._charge = True
+        return self
+
+    def _calculer_couts(self) -> List[Dict[int, tuple]]:
+        """
+        (coût, heures sup, heures sous contrat) de chaque plage pour chaque employé
+
+        Le coût ne dépend que du contrat et des jours de congé : il est calculé
+        une fois par combinaison distincte, pas par employé.
+        """
+        par_profil: Dict[tuple, Dict[int, tuple]] = {}
+        couts = []
+        for employe in self.employes:
+            profil = (employe['contrat'], employe['conges'])
+            if profil not in par_profil:
+                par_profil[profil] = {
+                    plage_id: self._cout_plage(plage_id, *profil) for plage_id in self.plages
+                }
+            couts.append(par_profil[profil])
+        return couts
+
+    def _cout_plage(self, plage_id: int, contrat: float, conges: frozenset) -> tuple:
+        heures_semaine = [0.0] * len(self._jours_par_semaine)
+        jours_disponibles = list(self._jours_par_semaine)
+        for jour in conges:
+            jours_disponibles[self._semaine_du_jour[jour]] -= 1
+        for jour in self._jours_plage[plage_id]:
+            if jour not in conges:
+                heures_semaine[self._semaine_du_jour[jour]] += self._heures_plage[plage_id]
+
+        heures_sup = 0.0
+        heures_manquantes = 0.0
+        for heures, disponibles in zip(heures_semaine, jours_disponibles):
+            attendues = contrat * disponibles / 7
+            heures_sup += max(0.0, heures - attendues)
+            heures_manquantes += max(0.0, attendues - heures)
+        return heures_sup + POIDS_SOUS_CONTRAT * heures_manquantes, heures_sup, heures_manquantes
+
+    # ------------------------------------------------------------------
+    # Optimisation
+    # ------------------------------------------------------------------
+
+    def optimiser(self, depart: Mapping[int, Optional[int]] = None) -> Dict:
+        """
+        Lance la recherche locale
+
+        Args:
+            depart: affectation de départ {employe_id: plage_id} (défaut: affectation actuelle)
+
+        Returns:
+            Dict avec les indicateurs avant/après et les affectations modifiées
+        """
+        if not self._charge:
+            self.charger()
+        debut_calcul = time.monotonic()
+
+        depart = self.initiale if depart is None else depart
+        self.affectation = {}
+        for index, employe in enumerate(self.employes):
+            plage_id = depart.get(employe['id'])
+            if plage_id not in self.plages:
+                # Sans affectation exploitable : la plage la moins coûteuse pour l'employé
+                plage_id = min(self._couts[index], key=lambda p: self._couts[index][p][0], default=None)
+            self.affectation[employe['id']] = plage_id
+
+        couvert = self._compter_couverture(self.affectation)
+        avant = self._indicateurs(self.initiale)
+
+        nb_passes = 0
+        while nb_passes < self.max_passes:
+            nb_passes += 1
+            if not self._passe(couvert):
+                break
+
+        apres = self._indicateurs(self.affectation)
+        modifications = [
+            {
+                'employe_id': employe['id'],
+                'plage_horaire_id': self.affectation[employe['id']],
+                'plage_actuelle_id': self.initiale[employe['id']],
+            }
+            for employe in self.employes
+            if self.affectation[employe['id']] != self.initiale[employe['id']]
+        ]
+
+        resultat = {
+            'periode': self.periode,
+            'nb_employes': len(self.employes),
+            'nb_plages': len(self.plages),
+            'nb_passes': nb_passes,
+            'duree_secondes': round(time.monotonic() - debut_calcul, 3),
+            'avant': avant,
+            'apres': apres,
+            'nb_changements': len(modifications),
+            'affectations': modifications,
+            'couverture': self._deficits(couvert),
+        }
+        logger.info(
+            f"Optimisation plannings {self.periode}: {len(modifications)} changements, "
+            f"heures sup {avant['heures_sup']} -> {apres['heures_sup']}"
+        )
+        return resultat
+
+    def _jours_effectifs(self, index: int, plage_id: int) -> List[int]:
+        conges = self.employes[index]['conges']
+        jours = self._jours_plage[plage_id]
+        return [jour for jour in jours if jour not in conges] if conges else jours
+
+    def _compter_couverture(self, affectation: Mapping[int, Optional[int]]) -> Dict[tuple, List[int]]:
+        """Présents par (département, plage) et par jour, pour les plages soumises à couverture"""
+        couvert = {cle: [0] * self.nb_jours for cle in self.besoins}
+        for index, employe in enumerate(self.employes):
+            cle = (employe['department_id'], affectation.get(employe['id']))
+            if cle in couvert:
+                compteurs = couvert[cle]
+                for jour in self._jours_effectifs(index, cle[1]):
+                    compteurs[jour] += 1
+        return couvert
+
+    def _passe(self, couvert: Dict[tuple, List[int]]) -> bool:
+        """Une passe sur tous les employés ; vrai si au moins un déplacement a été appliqué"""
+        ameliore = False
+        for index, employe in enumerate(self.employes):
+            employe_id = employe['id']
+            departement_id = employe['department_id']
+            couts = self._couts[index]
+            actuelle = self.affectation[employe_id]
+            if actuelle is None:
+                continue
+
+            # Ce que l'on perd en quittant la plage actuelle
+            cout_depart = couts[actuelle][0]
+            if actuelle != self.initiale[employe_id]:
+                cout_depart += PENALITE_CHANGEMENT
+            cle = (departement_id, actuelle)
+            if cle in self.besoins:
+                besoin = self.besoins[cle]
+                compteurs = couvert[cle]
+                cout_depart -= PENALITE_COUVERTURE * sum(
+                    1 for jour in self._jours_effectifs(index, actuelle) if compteurs[jour] <= besoin
+                )
+
+            meilleure, meilleur_delta = None, -1e-9
+            for plage_id, (cout, _, _) in couts.items():
+                if plage_id == actuelle:
+                    continue
+                delta = cout - cout_depart
+                if plage_id != self.initiale[employe_id]:
+                    delta += PENALITE_CHANGEMENT
+                cle = (departement_id, plage_id)
+                if cle in self.besoins:
+                    besoin = self.besoins[cle]
+                    compteurs = couvert[cle]
+                    delta -= PENALITE_COUVERTURE * sum(
+                        1 for jour in self._jours_effectifs(index, plage_id) if compteurs[jour] < besoin
+                    )
+                if delta < meilleur_delta:
+                    meilleure, meilleur_delta = plage_id, delta
+
+            if meilleure is not None:
+                for plage_id, increment in ((actuelle, -1), (meilleure, 1)):
+                    cle = (departement_id, plage_id)
+                    if cle in couvert:
+                        compteurs = couvert[cle]
+                        for jour in self._jours_effectifs(index, plage_id):
+                            compteurs[jour] += increment
+                self.affectation[employe_id] = meilleure
+                ameliore = True
+        return ameliore
+
+    def _deficits(self, couvert: Dict[tuple, List[int]]) -> List[Dict]:
+        """Personnes-jours manquantes par (département, plage)"""
+        deficits = []
+        for (departement_id, plage_id), besoin in self.besoins.items():
+            compteurs = couvert[(departement_id, plage_id)]
+            jours = self._jours_plage.get(plage_id, [])
+            deficits.append({
+                'departement_id': departement_id,
+                'plage_horaire_id': plage_id,
+                'besoin': besoin,
+                'deficit': sum(max(0, besoin - compteurs[jour]) for jour in jours),
+                'jours_non_couverts': sum(1 for jour in jours if compteurs[jour] < besoin),
+            })
+        return deficits
+
+    def _indicateurs(self, affectation: Mapping[int, Optional[int]]) -> Dict:
+        heures_sup = 0.0
+        heures_manquantes = 0.0
+        for index, employe in enumerate(self.employes):
+            plage_id = affectation.get(employe['id'])
+            if plage_id is not None:
+                _, sup, manquantes = self._couts[index][plage_id]
+                heures_sup += sup
+                heures_manquantes += manquantes
+        deficits = self._deficits(self._compter_couverture(affectation))
+        return {
+            'heures_sup': round(heures_sup, 2),
+            'heures_sous_contrat': round(heures_manquantes, 2),
+            'deficit_couverture': sum(d['deficit'] for d in deficits),
+            'nb_sans_plage': sum(1 for employe in self.employes if affectation.get(employe['id']) is None),
+        }
+
+    # ------------------------------------------------------------------
+    # Écriture
+    # ------------------------------------------------------------------
+
+    def _reprise(self, employe_id: int, suivants: Mapping[tuple, HoraireTravail]) -> Optional[date]:
+        """Lendemain du mois, ou des horaires déjà enchaînés à sa suite (None : un horaire permanent suit)"""
+        reprise = self.fin + timedelta(days=1)
+        while (employe_id, reprise) in suivants:
+            suivant = suivants[(employe_id, reprise)]
+            if suivant.date_fin is None:
+                return None
+            reprise = suivant.date_fin + timedelta(days=1)
+        return reprise
+
+    @transaction.atomic
+    def appliquer(self, cree_par=None) -> Dict:
+        """
+        Enregistre les affectations modifiées en masse
+
+        Chaque changement devient un HoraireTravail borné au mois, qui prime sur
+        l'horaire permanent (le plus récent l'emporte) puis le laisse reprendre.
+        Un horaire commençant le premier du mois (un seul par employé et date de
+        début) est modifié sur place s'il s'arrête dans le mois ; s'il se
+        poursuit au-delà, il est décalé au lendemain du mois pour y reprendre.
+
+        Un horaire auquel des présences sont rattachées n'est ni supprimé (elles
+        le seraient en cascade) ni modifié : il est terminé la veille du premier
+        jour sans présence, où commence le nouvel horaire, et sa suite après le
+        mois est recréée à l'identique. Si ses présences couvrent le mois,
+        l'employé est laissé tel quel.
+        """
+        changements = {
+            employe_id: plage_id for employe_id, plage_id in self.affectation.items()
+            if plage_id is not None and plage_id != self.initiale.get(employe_id)
+        }
+        if not changements:
+            return {'nb_crees': 0, 'nb_modifies': 0, 'nb_reportes': 0, 'nb_termines': 0, 'nb_ignores': 0}
+
+        existants = {}
+        suivants = {}
+        dates_prises = set()
+        for horaire in HoraireTravail.objects.filter(employe_id__in=changements, date_debut__gte=self.debut):
+            dates_prises.add((horaire.employe_id, horaire.date_debut))
+            if horaire.date_debut == self.debut:
+                existants[horaire.employe_id] = horaire
+            elif horaire.date_debut > self.fin:
+                suivants[(horaire.employe_id, horaire.date_debut)] = horaire
+
+        # Dernier jour de présence rattaché à chaque horaire du premier du mois
+        dernieres_presences = dict(PresenceJournaliere.objects.filter(
+            horaire_travail_id__in=[horaire.id for horaire in existants.values()]
+        ).order_by().values('horaire_travail_id').annotate(derniere=Max('date')).values_list(
+            'horaire_travail_id', 'derniere'
+        ))
+
+        commentaire = f'Optimisation planning {self.periode}'
+        a_modifier = []
+        a_decaler = []
+        a_terminer = []
+        a_supprimer = []
+        a_creer = []
+        suites = []
+        ignores = set()
+        for employe_id, plage_id in changements.items():
+            horaire = existants.get(employe_id)
+            debut = self.debut
+
+            if horaire is not None and horaire.id in dernieres_presences:
+                debut = dernieres_presences[horaire.id] + timedelta(days=1)
+                if debut > self.fin or (employe_id, debut) in dates_prises:
+                    ignores.add(employe_id)
+                    continue
+                if horaire.date_fin is None or horaire.date_fin > self.fin:
+                    reprise = self._reprise(employe_id, suivants)
+                    if reprise is not None and (horaire.date_fin is None or reprise <= horaire.date_fin):
+                        suites.append(HoraireTravail(
+                            employe_id=employe_id,
+                            plage_horaire_id=horaire.plage_horaire_id,
+                            date_debut=reprise,
+                            date_fin=horaire.date_fin,
+                            heure_debut_personnalisee=horaire.heure_debut_personnalisee,
+                            heure_fin_personnalisee=horaire.heure_fin_personnalisee,
+                            jours_travailles_personnalises=horaire.jours_travailles_personnalises,
+                            commentaire=horaire.commentaire,
+                            actif=horaire.actif,
+                            cree_par_id=horaire.cree_par_id
+                        ))
+                if horaire.date_fin is None or horaire.date_fin >= debut:
+                    horaire.date_fin = debut - timedelta(days=1)
+                    a_terminer.append(horaire)
+
+            elif horaire is not None and horaire.date_fin is not None and horaire.date_fin <= self.fin:
+                horaire.plage_horaire_id = plage_id
+                horaire.date_fin = self.fin
+                horaire.heure_debut_personnalisee = None
+                horaire.heure_fin_personnalisee = None
+                horaire.jours_travailles_personnalises = None
+                horaire.actif = True
+                horaire.commentaire = commentaire
+                a_modifier.append(horaire)
+                continue
+
+            elif horaire is not None:
+                # Sans présence rattachée : reprise après le mois, ou supprimé si rien n'en reste
+                reprise = self._reprise(employe_id, suivants)
+                if reprise is None or (horaire.date_fin is not None and reprise > horaire.date_fin):
+                    a_supprimer.append(horaire.id)
+                else:
+                    horaire.date_debut = reprise
+                    a_decaler.append(horaire)
+
+            a_creer.append(HoraireTravail(
+                employe_id=employe_id,
+                plage_horaire_id=plage_id,
+                date_debut=debut,
+                date_fin=self.fin,
+                commentaire=commentaire,
+                actif=True,
+                cree_par=cree_par
+            ))
+
+        taille_lot = get_parametre_pointage('BATCH_SIZE')
+        HoraireTravail.objects.filter(id__in=a_supprimer).delete()
+        HoraireTravail.objects.bulk_update(a_decaler, ['date_debut'], batch_size=taille_lot)
+        HoraireTravail.objects.bulk_update(a_terminer, ['date_fin'], batch_size=taille_lot)
+        HoraireTravail.objects.bulk_update(
+            a_modifier,
+            ['plage_horaire', 'date_fin', 'heure_debut_personnalisee', 'heure_fin_personnalisee',
+             'jours_travailles_personnalises', 'actif', 'commentaire'],
+            batch_size=taille_lot
+        )
+        HoraireTravail.objects.bulk_create(a_creer + suites, batch_size=taille_lot)
+
+        # Les opérations en masse ne déclenchent pas les signaux de HoraireTravail
+        transaction.on_commit(invalider_cache_horaires)
+        self.initiale.update(
+            (employe_id, plage_id) for employe_id, plage_id in changements.items() if employe_id not in ignores
+        )
+
+        resultat = {
+            'nb_crees': len(a_creer),
+            'nb_modifies': len(a_modifier),
+            'nb_reportes': len(a_decaler) + len(suites),
+            'nb_termines': len(a_terminer),
+            'nb_ignores': len(ignores),
+        }
+        logger.info(
+            f"Plannings {self.periode} appliqués: {resultat['nb_crees']} créés, {resultat['nb_modifies']} modifiés, "
+            f"{resultat['nb_reportes']} reportés après le mois, {resultat['nb_termines']} terminés, "
+            f"{resultat['nb_ignores']} ignorés (mois déjà pointé)"
+        )
+        return resultat
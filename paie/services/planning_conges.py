@@ -0,0 +1,176 @@
+# paie/services/planning_conges.py
+# Chronologie d'occupation des congés : qui est absent, jour par jour et par département
+
+from collections import defaultdict
+from datetime import date, timedelta
+import json
+import logging
+from typing import Dict, Iterable, List, Optional, Set
+
+from ..models import DemandeConge, Employee
+from .calendrier_ouvrable import get_calendrier
+from .index_conges import REGLE_PLANIFICATION_DEFAUT
+
+logger = logging.getLogger(__name__)
+
+# Statuts affichés au planning (congés acquis ou en cours)
+STATUTS_PLANNING = ['APPROUVEE', 'EN_COURS']
+
+CHAMPS_EMPLOYE = ['first_name', 'last_name', 'matricule', 'site', 'department', 'department__name']
+
+
+class OccupationConges:
+    """
+    Absences d'une période, indexées par jour
+
+    Une seule requête charge les congés qui chevauchent la période ; chaque congé
+    est ensuite reporté sur les jours qu'il couvre. Pour chaque département,
+    absents[departement_id][i] est l'ensemble des employés en congé le i-ème jour.
+    Les jours ouvrables d'absence se lisent sur le calendrier du site en O(1).
+    """
+
+    def __init__(self, date_debut: date, date_fin: date, employes=None,
+                 statuts: Iterable[str] = STATUTS_PLANNING):
+        self.date_debut = date_debut
+        self.date_fin = date_fin
+        self.nb_jours = (date_fin - date_debut).days + 1
+        self.statuts = list(statuts)
+        self.employes_query = employes if employes is not None else Employee.objects.filter(is_active=True)
+
+        self.employes: Dict[int, Employee] = {}
+        self.conges_par_employe: Dict[int, List[DemandeConge]] = defaultdict(list)
+        self.jours_absents: Dict[int, int] = defaultdict(int)
+        self.absents: Dict[Optional[int], List[Set[int]]] = {}
+
+    def charger(self) -> 'OccupationConges':
+        # Seuls les champs affichés au planning : l'instanciation complète domine sinon le coût
+        self.employes = {
+            employe.id: employe
+            for employe in self.employes_query.select_related('department').only(*CHAMPS_EMPLOYE)
+        }
+
+        conges = DemandeConge.objects.filter(
+            statut__in=self.statuts,
+            date_fin__gte=self.date_debut,
+            date_debut__lte=self.date_fin,
+            employe__in=self.employes_query.order_by().values('id')
+        ).select_related('type_conge').order_by('date_debut')
+
+        for conge in conges:
+            employe = self.employes[conge.employe_id]
+            # Évite un chargement de l'employé par congé dans les gabarits
+            conge.employe = employe
+            self.conges_par_employe[employe.id].append(conge)
+
+            debut = max(conge.date_debut, self.date_debut)
+            fin = min(conge.date_fin, self.date_fin)
+            self.jours_absents[employe.id] += get_calendrier(employe.site_id).nb_jours_ouvrables(debut, fin)
+
+            jours = self.absents.get(employe.department_id)
+            if jours is None:
+                jours = self.absents[employe.department_id] = [set() for _ in range(self.nb_jours)]
+            for rang in range((debut - self.date_debut).days, (fin - self.date_debut).days + 1):
+                jours[rang].add(employe.id)
+
+        logger.debug(
+            f"Occupation {self.date_debut} - {self.date_fin}: {len(self.employes)} employés, "
+            f"{sum(len(liste) for liste in self.conges_par_employe.values())} congés"
+        )
+        return self
+
+    def _rang(self, jour: date) -> int:
+        return (jour - self.date_debut).days
+
+    def absents_le(self, jour: date, departement_id: Optional[int] = None) -> Set[int]:
+        """Employés en congé un jour donné (tous départements si departement_id est None)"""
+        rang = self._rang(jour)
+        if not 0 <= rang < self.nb_jours:
+            return set()
+        if departement_id is not None:
+            jours = self.absents.get(departement_id)
+            return set(jours[rang]) if jours else set()
+        return set().union(*(jours[rang] for jours in self.absents.values()))
+
+    def nb_absents_par_jour(self, departement_id: Optional[int] = None) -> List[int]:
+        if departement_id is not None:
+            jours = self.absents.get(departement_id)
+            return [len(absents) for absents in jours] if jours else [0] * self.nb_jours
+        totaux = [0] * self.nb_jours
+        for jours in self.absents.values():
+            for rang, absents in enumerate(jours):
+                totaux[rang] += len(absents)
+        return totaux
+
+    def pic_absences(self, date_debut: date, date_fin: date, departement_id: Optional[int],
+                     exclure: Optional[int] = None) -> int:
+        """Nombre maximal d'absents simultanés du département sur [date_debut, date_fin]"""
+        jours = self.absents.get(departement_id)
+        if not jours:
+            return 0
+        debut = max(self._rang(date_debut), 0)
+        fin = min(self._rang(date_fin), self.nb_jours - 1)
+        return max(
+            (len(jours[rang] - {exclure}) for rang in range(debut, fin + 1)),
+            default=0
+        )
+
+    def conflits(self, max_absents: Optional[Dict[Optional[int], int]] = None) -> List[Dict]:
+        """Jours ouvrables où un département dépasse son maximum d'absents simultanés"""
+        max_absents = max_absents or {}
+        calendrier = get_calendrier()
+        noms = {
+            employe.department_id: employe.department.name
+            for employe in self.employes.values() if employe.department_id
+        }
+        conflits = []
+        for departement_id, jours in self.absents.items():
+            for rang, absents in enumerate(jours):
+                jour = self.date_debut + timedelta(days=rang)
+                maximum = max_absents.get(departement_id, REGLE_PLANIFICATION_DEFAUT.max_absents)
+                if len(absents) > maximum and calendrier.est_ouvrable(jour):
+                    conflits.append({
+                        'date': jour,
+                        'departement': noms.get(departement_id),
+                        'nb_absents': len(absents),
+                    })
+        return sorted(conflits, key=lambda conflit: (conflit['date'], conflit['departement'] or ''))
+
+    def jours(self) -> List[Dict]:
+        """Jours de la période pour l'en-tête du planning"""
+        calendrier = get_calendrier()
+        nb_absents = self.nb_absents_par_jour()
+        jours = []
+        for rang in range(self.nb_jours):
+            jour = self.date_debut + timedelta(days=rang)
+            jours.append({
+                'date': jour,
+                'weekend': jour.weekday() >= 5,
+                'ferie': calendrier.est_ferie(jour),
+                'nb_absents': nb_absents[rang],
+            })
+        return jours
+
+    def conges_json(self) -> str:
+        """Congés de la période au format attendu par le calendrier (JavaScript)"""
+        return json.dumps([
+            {
+                'id': conge.id,
+                'numero_demande': conge.numero_demande,
+                'date_debut': conge.date_debut.isoformat(),
+                'date_fin': conge.date_fin.isoformat(),
+                'nb_jours_ouvrables': float(conge.nb_jours_ouvrables),
+                'statut': conge.statut,
+                'employe': {
+                    'id': conge.employe.id,
+                    'first_name': conge.employe.first_name,
+                    'last_name': conge.employe.last_name,
+                },
+                'type_conge': {
+                    'code': conge.type_conge.code,
+                    'libelle': conge.type_conge.libelle,
+                    'couleur_affichage': conge.type_conge.couleur_affichage,
+                },
+            }
+            for conges in self.conges_par_employe.values()
+            for conge in conges
+        ])
@@ -0,0 +1,204 @@
+# paie/services/prevision_presence.py
+# Prévision de présence et de retards par département pour les prochains jours
+
+from datetime import date, timedelta
+import logging
+from typing import Dict, List, Optional
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.db.models.functions import ExtractIsoWeekDay, ExtractMonth
+from django.utils import timezone
+
+from ..models import Department, DemandeConge, Employee, PresenceJournaliere, ReglePointage
+from .gestionnaire_pointage import STATUTS_CONGE_APPROUVE, get_parametre_pointage
+
+logger = logging.getLogger(__name__)
+
+CLE_PREVISION = 'paie:prevision_presence:{jour}'
+DUREE_CACHE_PREVISION = 60 * 60 * 24
+
+STATUTS_PRESENT = ['PRESENT', 'PARTIEL', 'TELETRAVAIL', 'MISSION']
+STATUTS_ABSENCE_PREVUE = ['CONGE', 'MALADIE']
+
+# Poids (en jours observés) du taux global dans le lissage des taux par département
+LISSAGE = 10
+
+
+def _lisser(nb_succes: float, nb_essais: float, taux_reference: float) -> float:
+    """Taux observé ramené vers un taux de référence quand l'historique est maigre"""
+    return (nb_succes + LISSAGE * taux_reference) / (nb_essais + LISSAGE)
+
+
+class ModelePrevisionPresence:
+    """
+    Taux de présence et de retard par (département, jour de semaine), corrigés
+    d'un facteur saisonnier par (département, mois)
+
+    Tous les départements sont ajustés ensemble : une requête groupée sur
+    l'historique, puis des tables de taux remplies en une passe.
+    """
+
+    def __init__(self, reference: date = None, historique_jours: int = None):
+        self.reference = reference or date.today()
+        self.historique_jours = historique_jours or get_parametre_pointage('PREVISION_HISTORIQUE_JOURS')
+
+        # (departement_id, jour_semaine) -> taux ; (departement_id, mois) -> facteur
+        self.taux_presence: Dict[tuple, float] = {}
+        self.taux_retard: Dict[tuple, float] = {}
+        self.facteur_saison: Dict[tuple, float] = {}
+        self.taux_presence_global: Dict[int, float] = {}
+        self.taux_retard_global: Dict[int, float] = {}
+
+    def ajuster(self) -> 'ModelePrevisionPresence':
+        regle = ReglePointage.objects.filter(actif=True, date_debut__lte=self.reference).order_by('-date_debut').first()
+        tolerance = regle.tolerance_retard_minutes if regle else 10
+
+        lignes = PresenceJournaliere.objects.filter(
+            date__gte=self.reference - timedelta(days=self.historique_jours),
+            date__lt=self.reference,
+            employe__department__isnull=False
+        ).annotate(
+            jour_semaine=ExtractIsoWeekDay('date'),
+            mois=ExtractMonth('date')
+        ).order_by().values('employe__department_id', 'jour_semaine', 'mois').annotate(
+            nb_lignes=Count('id'),
+            nb_presents=Count('id', filter=Q(statut_jour__in=STATUTS_PRESENT)),
+            nb_absences_prevues=Count('id', filter=Q(statut_jour__in=STATUTS_ABSENCE_PREVUE)),
+            nb_retards=Count('id', filter=Q(statut_jour__in=STATUTS_PRESENT, retard_minutes__gt=tolerance))
+        )
+
+        # Cumuls : [attendus (hors congés), présents, retards]
+        par_jour: Dict[tuple, List[int]] = {}
+        par_mois: Dict[tuple, List[int]] = {}
+        par_departement: Dict[int, List[int]] = {}
+        globaux: Dict[int, List[int]] = {}
+        for ligne in lignes:
+            departement_id = ligne['employe__department_id']
+            valeurs = (
+                ligne['nb_lignes'] - ligne['nb_absences_prevues'],
+                ligne['nb_presents'],
+                ligne['nb_retards'],
+            )
+            for table, cle in (
+                (par_jour, (departement_id, ligne['jour_semaine'])),
+                (par_mois, (departement_id, ligne['mois'])),
+                (par_departement, departement_id),
+                (globaux, ligne['jour_semaine']),
+            ):
+                cumul = table.setdefault(cle, [0, 0, 0])
+                for i, valeur in enumerate(valeurs):
+                    cumul[i] += valeur
+
+        for jour_semaine, (attendus, presents, retards) in globaux.items():
+            self.taux_presence_global[jour_semaine] = presents / attendus if attendus else 0.0
+            self.taux_retard_global[jour_semaine] = retards / presents if presents else 0.0
+
+        for (departement_id, jour_semaine), (attendus, presents, retards) in par_jour.items():
+            cle = (departement_id, jour_semaine)
+            self.taux_presence[cle] = _lisser(presents, attendus, self.taux_presence_global[jour_semaine])
+            self.taux_retard[cle] = _lisser(retards, presents, self.taux_retard_global[jour_semaine])
+
+        for (departement_id, mois), (attendus, presents, _) in par_mois.items():
+            total_attendus, total_presents, _ = par_departement[departement_id]
+            taux_departement = total_presents / total_attendus if total_attendus else 0.0
+            if taux_departement:
+                taux_mois = _lisser(presents, attendus, taux_departement)
+                self.facteur_saison[(departement_id, mois)] = taux_mois / taux_departement
+
+        return self
+
+    def prevoir_taux(self, departement_id: int, jour: date) -> tuple:
+        """(taux de présence, taux de retard) prévus pour un département à une date"""
+        jour_semaine = jour.isoweekday()
+        taux_presence = self.taux_presence.get(
+            (departement_id, jour_semaine), self.taux_presence_global.get(jour_semaine, 0.0)
+        )
+        taux_presence *= self.facteur_saison.get((departement_id, jour.month), 1.0)
+        taux_retard = self.taux_retard.get(
+            (departement_id, jour_semaine), self.taux_retard_global.get(jour_semaine, 0.0)
+        )
+        return min(taux_presence, 1.0), taux_retard
+
+
+class PrevisionPresence:
+    """Prévisions par département, calculées une fois par jour et servies depuis le cache"""
+
+    def __init__(self, reference: date = None):
+        self.reference = reference or date.today()
+
+    def get_previsions(self, nb_jours: int = 14, departement_id: Optional[int] = None) -> Dict:
+        """Prévisions des nb_jours à venir (depuis le cache du jour si disponible)"""
+        previsions = cache.get(CLE_PREVISION.format(jour=self.reference.isoformat()))
+        if previsions is None:
+            previsions = self.calculer()
+
+        departements = [
+            {**departement, 'jours': departement['jours'][:nb_jours]}
+            for departement in previsions['departements']
+            if departement_id is None or departement['departement_id'] == departement_id
+        ]
+        return {**previsions, 'nb_jours': min(nb_jours, previsions['nb_jours']), 'departements': departements}
+
+    def calculer(self) -> Dict:
+        """Ajuste le modèle, projette l'horizon complet et met le résultat en cache"""
+        nb_jours = get_parametre_pointage('PREVISION_HORIZON_MAX_JOURS')
+        debut = self.reference
+        fin = debut + timedelta(days=nb_jours - 1)
+
+        modele = ModelePrevisionPresence(self.reference).ajuster()
+
+        effectifs = dict(
+            Employee.objects.filter(is_active=True, department__isnull=False)
+            .order_by().values_list('department_id').annotate(nb=Count('id'))
+        )
+
+        # Congés déjà approuvés sur l'horizon, décomptés jour par jour
+        en_conge: Dict[tuple, int] = {}
+        for departement_id, date_debut, date_fin in DemandeConge.objects.filter(
+            statut__in=STATUTS_CONGE_APPROUVE,
+            date_debut__lte=fin,
+            date_fin__gte=debut,
+            employe__is_active=True,
+            employe__department__isnull=False
+        ).values_list('employe__department_id', 'date_debut', 'date_fin'):
+            jour = max(date_debut, debut)
+            while jour <= min(date_fin, fin):
+                en_conge[(departement_id, jour)] = en_conge.get((departement_id, jour), 0) + 1
+                jour += timedelta(days=1)
+
+        jours = [debut + timedelta(days=i) for i in range(nb_jours)]
+        departements = []
+        for departement in Department.objects.filter(id__in=effectifs).order_by('name'):
+            effectif = effectifs[departement.id]
+            previsions_jours = []
+            for jour in jours:
+                nb_conges = min(en_conge.get((departement.id, jour), 0), effectif)
+                taux_presence, taux_retard = modele.prevoir_taux(departement.id, jour)
+                presents_prevus = (effectif - nb_conges) * taux_presence
+                previsions_jours.append({
+                    'date': jour.isoformat(),
+                    'jour_semaine': jour.isoweekday(),
+                    'en_conge': nb_conges,
+                    'taux_presence': round(presents_prevus / effectif * 100, 1) if effectif else 0,
+                    'presents_prevus': round(presents_prevus, 1),
+                    'taux_retard': round(taux_retard * 100, 1),
+                    'retards_prevus': round(presents_prevus * taux_retard, 1),
+                })
+            departements.append({
+                'departement_id': departement.id,
+                'departement': departement.name,
+                'effectif': effectif,
+                'jours': previsions_jours,
+            })
+
+        previsions = {
+            'genere_le': timezone.now().isoformat(),
+            'date_debut': debut.isoformat(),
+            'nb_jours': nb_jours,
+            'historique_jours': modele.historique_jours,
+            'departements': departements,
+        }
+        cache.set(CLE_PREVISION.format(jour=self.reference.isoformat()), previsions, DUREE_CACHE_PREVISION)
+        logger.info(f"Prévisions de présence calculées pour {len(departements)} départements")
+        return previsions
@@ -0,0 +1,209 @@
+# paie/services/provision_conges.py
+# Provision pour congés payés : jours restants × taux journalier, par employé, département et site
+
+from calendar import monthrange
+from collections import defaultdict, namedtuple
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+import logging
+from typing import Dict, Iterator, List, Optional
+
+from django.db import transaction
+from django.db.models import Sum
+
+from ..models import DemandeConge, Employee, ProvisionConges, SoldeConge, TypeConge
+from .acquisition_conges import jours_acquis_lot
+from .calendrier_ouvrable import get_calendrier
+from .journal_soldes import STATUTS_DECOMPTES
+
+logger = logging.getLogger(__name__)
+
+CENTIEME = Decimal('0.01')
+
+CHAMPS_EMPLOYE = (
+    'id', 'matricule', 'last_name', 'first_name', 'salary', 'hire_date',
+    'department_id', 'department__name', 'site_id', 'site__name',
+)
+
+LigneProvision = namedtuple('LigneProvision', [
+    'employe_id', 'matricule', 'nom', 'prenom', 'departement_id', 'departement', 'site_id', 'site',
+    'salaire', 'jours_ouvrables_mois', 'taux_journalier', 'jours_restants', 'montant',
+])
+
+ENTETES_EXPORT = [
+    'Matricule', 'Nom', 'Prénom', 'Département', 'Site', 'Salaire de base',
+    'Jours ouvrables du mois', 'Taux journalier', 'Jours restants', 'Provision',
+]
+
+
+def get_types_provisionnes():
+    """Congés payés acquis : types légaux rémunérés"""
+    return TypeConge.objects.filter(actif=True, categorie='LEGAL', remunere=True)
+
+
+class CalculProvisionConges:
+    """
+    Provision pour congés payés arrêtée à la fin d'un mois
+
+    Pour chaque employé actif : jours acquis à la date d'arrêté (forme close),
+    plus reports et ajustements de SoldeConge, moins les jours décomptés des
+    congés commencés avant l'arrêté. Le taux journalier est le salaire de base
+    divisé par les jours ouvrables du mois sur le calendrier du site, pondéré
+    par le taux de rémunération du type de congé.
+
+    Trois requêtes quel que soit l'effectif : employés, soldes de l'année et
+    jours pris groupés par (employé, type).
+    """
+
+    def __init__(self, annee: int, mois: int, employes=None):
+        self.annee = annee
+        self.mois = mois
+        self.premier_jour = date(annee, mois, 1)
+        self.date_arrete = date(annee, mois, monthrange(annee, mois)[1])
+        self.employes_query = employes if employes is not None else Employee.objects.filter(is_active=True)
+        self.lignes: List[LigneProvision] = []
+
+    def _jours_ouvrables_mois(self, site_id: Optional[int]) -> int:
+        return get_calendrier(site_id).nb_jours_ouvrables(self.premier_jour, self.date_arrete)
+
+    def calculer(self) -> 'CalculProvisionConges':
+        types_conges = list(get_types_provisionnes())
+        employes = list(self.employes_query.filter(hire_date__lte=self.date_arrete).order_by(
+            'department__name', 'last_name', 'first_name'
+        ).values_list(*CHAMPS_EMPLOYE))
+        ids_employes = self.employes_query.order_by().values('id')
+
+        soldes = {
+            (employe_id, type_id): reportes + ajustement
+            for employe_id, type_id, reportes, ajustement in SoldeConge.objects.filter(
+                employe_id__in=ids_employes,
+                type_conge__in=types_conges,
+                annee=self.annee
+            ).values_list('employe_id', 'type_conge_id', 'jours_reportes', 'ajustement_manuel')
+        }
+        jours_pris = {
+            (employe_id, type_id): total
+            for employe_id, type_id, total in DemandeConge.objects.filter(
+                employe_id__in=ids_employes,
+                type_conge__in=types_conges,
+                statut__in=STATUTS_DECOMPTES,
+                date_debut__year=self.annee,
+                date_debut__lte=self.date_arrete
+            ).order_by().values_list('employe_id', 'type_conge_id').annotate(total=Sum('nb_jours_ouvrables'))
+        }
+
+        # Jours restants pondérés par le taux de rémunération, un vecteur par type
+        dates_embauche = [employe[5] for employe in employes]
+        jours_restants = [Decimal('0')] * len(employes)
+        jours_remuneres = [Decimal('0')] * len(employes)
+        for type_conge in types_conges:
+            taux_remuneration = type_conge.taux_remuneration / 100
+            acquisitions = jours_acquis_lot(
+                dates_embauche, self.annee, self.date_arrete,
+                type_conge.jours_acquis_par_mois, type_conge.anciennete_minimum_mois
+            )
+            for rang, (employe, acquis) in enumerate(zip(employes, acquisitions)):
+                cle = (employe[0], type_conge.id)
+                restants = max(acquis + soldes.get(cle, 0) - (jours_pris.get(cle) or 0), Decimal('0'))
+                jours_restants[rang] += restants
+                jours_remuneres[rang] += restants * taux_remuneration
+
+        jours_ouvrables = {}
+        self.lignes = []
+        for (employe_id, matricule, nom, prenom, salaire, _, departement_id, departement,
+             site_id, site), restants, remuneres in zip(employes, jours_restants, jours_remuneres):
+            if site_id not in jours_ouvrables:
+                jours_ouvrables[site_id] = self._jours_ouvrables_mois(site_id)
+            nb_jours = jours_ouvrables[site_id]
+            taux_journalier = (salaire / nb_jours).quantize(CENTIEME, rounding=ROUND_HALF_UP) if nb_jours else Decimal('0')
+            self.lignes.append(LigneProvision(
+                employe_id, matricule, nom, prenom, departement_id, departement or '', site_id, site or '',
+                salaire, nb_jours, taux_journalier, restants.quantize(CENTIEME, rounding=ROUND_HALF_UP),
+                (remuneres * taux_journalier).quantize(CENTIEME, rounding=ROUND_HALF_UP),
+            ))
+
+        logger.debug(f"Provision congés {self.mois:02d}/{self.annee}: {len(self.lignes)} employés")
+        return self
+
+    def totaux_par(self, *axes: str) -> List[Dict]:
+        """
+        Totaux regroupés par axes parmi 'departement' et 'site'
+
+        Returns:
+            Liste de dicts (identifiants et noms des axes, nb_employes, jours_restants, montant)
+        """
+        totaux = defaultdict(lambda: {'nb_employes': 0, 'jours_restants': Decimal('0'), 'montant': Decimal('0')})
+        for ligne in self.lignes:
+            cle = tuple((getattr(ligne, f'{axe}_id'), getattr(ligne, axe)) for axe in axes)
+            total = totaux[cle]
+            total['nb_employes'] += 1
+            total['jours_restants'] += ligne.jours_restants
+            total['montant'] += ligne.montant
+
+        resultats = []
+        for cle, total in totaux.items():
+            resultat = {}
+            for axe, (identifiant, nom) in zip(axes, cle):
+                resultat[f'{axe}_id'] = identifiant
+                resultat[axe] = nom
+            resultat.update(total)
+            resultats.append(resultat)
+        return sorted(resultats, key=lambda resultat: [resultat[axe] for axe in axes])
+
+    def total(self) -> Dict:
+        return self.totaux_par()[0] if self.lignes else {
+            'nb_employes': 0, 'jours_restants': Decimal('0'), 'montant': Decimal('0')
+        }
+
+    def lignes_export(self) -> Iterator[list]:
+        """En-tête puis une ligne par employé, pour un export CSV ou Excel"""
+        yield ENTETES_EXPORT
+        for ligne in self.lignes:
+            yield [
+                ligne.matricule, ligne.nom, ligne.prenom, ligne.departement, ligne.site, ligne.salaire,
+                ligne.jours_ouvrables_mois, ligne.taux_journalier, ligne.jours_restants, ligne.montant,
+            ]
+
+
+@transaction.atomic
+def enregistrer_instantane(annee: int, mois: int) -> CalculProvisionConges:
+    """Calcule la provision du mois et remplace son instantané (une ligne par département et site)"""
+    calcul = CalculProvisionConges(annee, mois).calculer()
+
+    ProvisionConges.objects.filter(annee=annee, mois=mois).delete()
+    ProvisionConges.objects.bulk_create([
+        ProvisionConges(
+            annee=annee,
+            mois=mois,
+            departement_id=total['departement_id'],
+            site_id=total['site_id'],
+            nb_employes=total['nb_employes'],
+            jours_restants=total['jours_restants'],
+            montant=total['montant'],
+        )
+        for total in calcul.totaux_par('departement', 'site')
+    ])
+    return calcul
+
+
+def get_evolution_provision(nb_mois: int = 12, departement_id: Optional[int] = None,
+                            site_id: Optional[int] = None) -> List[Dict]:
+    """Instantanés des derniers mois enregistrés, du plus ancien au plus récent"""
+    instantanes = ProvisionConges.objects.all()
+    if departement_id is not None:
+        instantanes = instantanes.filter(departement_id=departement_id)
+    if site_id is not None:
+        instantanes = instantanes.filter(site_id=site_id)
+
+    mois = list(instantanes.order_by('-annee', '-mois').values('annee', 'mois').annotate(
+        nb_employes=Sum('nb_employes'),
+        jours_restants=Sum('jours_restants'),
+        montant=Sum('montant')
+    )[:nb_mois])
+    mois.reverse()
+
+    precedent = None
+    for instantane in mois:
+        instantane['variation'] = instantane['montant'] - precedent if precedent is not None else None
+        precedent = instantane['montant']
+    return mois
@@ -0,0 +1,211 @@
+# paie/services/regles_conges.py
+# Règles de validation des congés (RegleConge) compilées en validateurs, en mémoire du processus
+
+from collections import defaultdict, namedtuple
+from datetime import date, datetime, timedelta
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+from django.db.models import Count
+
+from ..models import Employee, RegleConge
+from .generations import CompteurGeneration
+from .index_conges import STATUTS_ACCORDES, get_index_conges
+
+logger = logging.getLogger(__name__)
+
+CLE_GENERATION_REGLES_CONGES = 'paie:regles_conges:generation'
+
+# Paramètres reconnus d'une RegleConge de type VALIDATION :
+#   max_jours_consecutifs    : durée maximale d'une demande, en jours calendaires
+#   delai_minimum_demande    : préavis minimum, en jours avant le début du congé
+#   periodes_interdites      : [{"debut": "2025-12-20", "fin": "2026-01-05", "libelle": "Inventaire"}],
+#                              au format "MM-JJ" pour une période qui revient chaque année
+#   min_jours_entre_demandes : écart minimum avec les autres congés (accordés ou en attente) de l'employé
+#   quota_departement_pct    : part maximale de l'effectif du département en congé accordé le même jour,
+#                              demandeur compris (au moins une personne)
+
+DemandeAValider = namedtuple('DemandeAValider', 'employe type_conge date_debut date_fin aujourd_hui')
+
+# Retourne le message d'erreur, ou None si la demande respecte la règle
+Validateur = Callable[[DemandeAValider], Optional[str]]
+
+
+_generation = CompteurGeneration(CLE_GENERATION_REGLES_CONGES)
+
+
+def get_generation_regles_conges() -> int:
+    return _generation.lire()
+
+
+def invalider_regles_conges():
+    """Appelé par les signaux de RegleConge et Employee : les règles sont recompilées au prochain contrôle"""
+    _generation.invalider()
+
+
+class ReglesValidationConges:
+    """
+    Règles de validation actives, compilées par type de congé
+
+    Les paramètres JSON de chaque RegleConge sont lus et contrôlés une fois ; une
+    demande est ensuite validée par les fonctions préparées pour son type, sans
+    requête (les absences du département sont lues sur l'index des congés).
+    """
+
+    def __init__(self):
+        self.generation = get_generation_regles_conges()
+        self.effectifs: Dict[Optional[int], int] = {}
+        # type_conge_id -> [(départements visés, vide pour tous ; validateur)]
+        self.validateurs: Dict[int, List[Tuple[frozenset, Validateur]]] = defaultdict(list)
+        self._compiler()
+
+    def est_perime(self) -> bool:
+        return self.generation != get_generation_regles_conges()
+
+    def _compiler(self):
+        compilateurs = {
+            'max_jours_consecutifs': self._compiler_max_jours_consecutifs,
+            'delai_minimum_demande': self._compiler_delai_minimum,
+            'periodes_interdites': self._compiler_periodes_interdites,
+            'min_jours_entre_demandes': self._compiler_min_jours_entre_demandes,
+            'quota_departement_pct': self._compiler_quota_departement,
+        }
+        regles = list(RegleConge.objects.filter(actif=True, type_regle='VALIDATION').prefetch_related(
+            'types_conge', 'departements'
+        ))
+
+        if any('quota_departement_pct' in (regle.parametres or {}) for regle in regles):
+            self.effectifs = dict(
+                Employee.objects.filter(is_active=True).order_by().values_list('department_id').annotate(
+                    nb=Count('id')
+                )
+            )
+
+        for regle in regles:
+            validateurs = []
+            for cle, valeur in (regle.parametres or {}).items():
+                compilateur = compilateurs.get(cle)
+                if compilateur is None:
+                    logger.warning(f"Règle congé {regle.code}: paramètre inconnu {cle}")
+                    continue
+                try:
+                    validateurs.append(compilateur(valeur))
+                except (AttributeError, KeyError, TypeError, ValueError) as e:
+                    logger.warning(f"Règle congé {regle.code}: paramètre {cle} invalide ({e})")
+
+            departements = frozenset(departement.id for departement in regle.departements.all())
+            for type_conge in regle.types_conge.all():
+                self.validateurs[type_conge.id].extend((departements, validateur) for validateur in validateurs)
+
+        logger.debug(f"Règles de validation congés compilées: {len(regles)} règle(s)")
+
+    def valider(self, employe, type_conge, date_debut: date, date_fin: date,
+                aujourd_hui: Optional[date] = None) -> List[str]:
+        """Erreurs de la demande au regard des règles de son type et du département de l'employé"""
+        demande = DemandeAValider(employe, type_conge, date_debut, date_fin, aujourd_hui or date.today())
+        erreurs = []
+        for departements, validateur in self.validateurs.get(type_conge.id, ()):
+            if departements and employe.department_id not in departements:
+                continue
+            erreur = validateur(demande)
+            if erreur:
+                erreurs.append(erreur)
+        return erreurs
+
+    @staticmethod
+    def _compiler_max_jours_consecutifs(valeur) -> Validateur:
+        maximum = int(valeur)
+
+        def valider(demande: DemandeAValider) -> Optional[str]:
+            if (demande.date_fin - demande.date_debut).days + 1 > maximum:
+                return f"Maximum {maximum} jours consécutifs autorisés"
+            return None
+        return valider
+
+    @staticmethod
+    def _compiler_delai_minimum(valeur) -> Validateur:
+        delai = int(valeur)
+
+        def valider(demande: DemandeAValider) -> Optional[str]:
+            if (demande.date_debut - demande.aujourd_hui).days < delai:
+                return f"Demande doit être faite {delai} jours à l'avance"
+            return None
+        return valider
+
+    @staticmethod
+    def _compiler_periodes_interdites(valeur) -> Validateur:
+        # Périodes datées : (début, fin) ; récurrentes : ((mois, jour) de début, (mois, jour) de fin)
+        datees = []
+        annuelles = []
+        for periode in valeur:
+            libelle = periode.get('libelle') or 'période interdite'
+            if len(periode['debut']) == 5:
+                debut = datetime.strptime(f"2001-{periode['debut']}", '%Y-%m-%d').date()
+                fin = datetime.strptime(f"2001-{periode['fin']}", '%Y-%m-%d').date()
+                annuelles.append(((debut.month, debut.day), (fin.month, fin.day), libelle))
+            else:
+                debut = datetime.strptime(periode['debut'], '%Y-%m-%d').date()
+                fin = datetime.strptime(periode['fin'], '%Y-%m-%d').date()
+                if fin < debut:
+                    raise ValueError(f"{libelle}: fin avant début")
+                datees.append((debut, fin, libelle))
+
+        def valider(demande: DemandeAValider) -> Optional[str]:
+            for debut, fin, libelle in datees:
+                if debut <= demande.date_fin and fin >= demande.date_debut:
+                    return f"Congés impossibles du {debut} au {fin} ({libelle})"
+            for (mois_debut, jour_debut), (mois_fin, jour_fin), libelle in annuelles:
+                # Une période "12-20" -> "01-05" chevauche le changement d'année
+                for annee in range(demande.date_debut.year - 1, demande.date_fin.year + 1):
+                    debut = date(annee, mois_debut, jour_debut)
+                    fin = date(annee + ((mois_fin, jour_fin) < (mois_debut, jour_debut)), mois_fin, jour_fin)
+                    if debut <= demande.date_fin and fin >= demande.date_debut:
+                        return f"Congés impossibles du {debut} au {fin} ({libelle})"
+            return None
+        return valider
+
+    @staticmethod
+    def _compiler_min_jours_entre_demandes(valeur) -> Validateur:
+        ecart = timedelta(days=int(valeur))
+
+        def valider(demande: DemandeAValider) -> Optional[str]:
+            employe = demande.employe
+            if get_index_conges().demandes_employe(
+                employe.id, employe.department_id, demande.date_debut - ecart, demande.date_fin + ecart
+            ):
+                return f"Au moins {ecart.days} jours requis entre deux congés"
+            return None
+        return valider
+
+    def _compiler_quota_departement(self, valeur) -> Validateur:
+        pourcentage = float(valeur)
+        effectifs = self.effectifs
+
+        def valider(demande: DemandeAValider) -> Optional[str]:
+            employe = demande.employe
+            if not employe.department_id:
+                return None
+            effectif = effectifs.get(employe.department_id, 0)
+            maximum = max(1, int(effectif * pourcentage / 100))
+            nb_absents = get_index_conges().pic_absences(
+                employe.department_id, demande.date_debut, demande.date_fin,
+                exclure=employe.id, statuts=STATUTS_ACCORDES
+            )
+            if nb_absents + 1 > maximum:
+                return (
+                    f"Quota d'absences du département atteint ({nb_absents} absent(s) le même jour, "
+                    f"maximum {maximum} sur {effectif})"
+                )
+            return None
+        return valider
+
+
+_regles: Optional[ReglesValidationConges] = None
+
+
+def get_regles_validation_conges() -> ReglesValidationConges:
+    """Règles compilées partagées dans le processus tant qu'aucune règle ni affectation n'a changé"""
+    global _regles
+    if _regles is None or _regles.est_perime():
+        _regles = ReglesValidationConges()
+    return _regles
@@ -0,0 +1,126 @@
+# paie/services/resolveur_horaires.py
+# Résolution en mémoire des horaires de travail effectifs (index d'intervalles par employé)
+
+from bisect import bisect_right
+from datetime import date, timedelta
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db.models import Q
+
+from ..models import HoraireTravail
+from .generations import CompteurGeneration
+
+logger = logging.getLogger(__name__)
+
+CLE_GENERATION_HORAIRES = 'paie:horaires:generation'
+
+
+_generation = CompteurGeneration(CLE_GENERATION_HORAIRES)
+
+
+def get_generation_horaires() -> int:
+    """Numéro de génération courant des affectations d'horaires"""
+    return _generation.lire()
+
+
+def invalider_cache_horaires():
+    """Invalide tous les résolveurs construits avant cet appel (génération changée aussi au commit)"""
+    _generation.invalider()
+
+
+class ResolveurHoraires:
+    """
+    Index des HoraireTravail actifs d'une fenêtre de dates
+
+    Toutes les affectations de la fenêtre sont chargées en une requête. Pour chaque
+    employé, les intervalles sont aplatis en segments disjoints triés : la question
+    "quel horaire le jour D ?" se résout par recherche dichotomique, en O(log n).
+    En cas de chevauchement, l'horaire commencé le plus récemment l'emporte,
+    comme dans GestionnairePointage._get_horaire_employe.
+    """
+
+    def __init__(self, date_debut: date, date_fin: date = None, employes_ids: Iterable[int] = None):
+        self.date_debut = date_debut
+        self.date_fin = date_fin or date_debut
+        self.employes_ids = set(employes_ids) if employes_ids is not None else None
+        self.generation = get_generation_horaires()
+
+        # employe_id -> (débuts des segments, horaire de chaque segment)
+        self._index: Dict[int, Tuple[List[date], List[Optional[HoraireTravail]]]] = {}
+        self._charger()
+
+    def _charger(self):
+        """Charge les affectations de la fenêtre et construit l'index"""
+        horaires_query = HoraireTravail.objects.filter(
+            Q(date_fin__isnull=True) | Q(date_fin__gte=self.date_debut),
+            actif=True,
+            date_debut__lte=self.date_fin
+        ).select_related('employe', 'plage_horaire').order_by('employe_id', 'date_debut')
+
+        if self.employes_ids is not None:
+            horaires_query = horaires_query.filter(employe_id__in=self.employes_ids)
+
+        par_employe: Dict[int, List[HoraireTravail]] = {}
+        for horaire in horaires_query:
+            par_employe.setdefault(horaire.employe_id, []).append(horaire)
+
+        for employe_id, horaires in par_employe.items():
+            self._index[employe_id] = self._construire_segments(horaires)
+
+    @staticmethod
+    def _construire_segments(horaires: List[HoraireTravail]) -> Tuple[List[date], List[Optional[HoraireTravail]]]:
+        """Aplatit des intervalles (éventuellement chevauchants) en segments disjoints"""
+        bornes = set()
+        for horaire in horaires:
+            bornes.add(horaire.date_debut)
+            if horaire.date_fin and horaire.date_fin < date.max:
+                bornes.add(horaire.date_fin + timedelta(days=1))
+
+        debuts: List[date] = []
+        valeurs: List[Optional[HoraireTravail]] = []
+        for borne in sorted(bornes):
+            couvrants = [
+                h for h in horaires
+                if h.date_debut <= borne and (h.date_fin is None or h.date_fin >= borne)
+            ]
+            horaire = max(couvrants, key=lambda h: h.date_debut) if couvrants else None
+            if valeurs and valeurs[-1] is horaire:
+                continue
+            debuts.append(borne)
+            valeurs.append(horaire)
+
+        return debuts, valeurs
+
+    def couvre(self, date_debut: date, date_fin: date = None, employe_id: int = None) -> bool:
+        """Indique si la fenêtre (et le périmètre d'employés) a été chargée"""
+        date_fin = date_fin or date_debut
+        if date_debut < self.date_debut or date_fin > self.date_fin:
+            return False
+        if employe_id is not None and self.employes_ids is not None:
+            return employe_id in self.employes_ids
+        return True
+
+    def est_perime(self) -> bool:
+        """Vrai si une affectation a été modifiée depuis la construction"""
+        return self.generation != get_generation_horaires()
+
+    def get_horaire(self, employe_id: int, jour: date) -> Optional[HoraireTravail]:
+        """Horaire effectif d'un employé à une date de la fenêtre"""
+        segments = self._index.get(employe_id)
+        if not segments:
+            return None
+        debuts, valeurs = segments
+        position = bisect_right(debuts, jour) - 1
+        if position < 0:
+            return None
+        return valeurs[position]
+
+    def horaires_du_jour(self, jour: date) -> Dict[int, HoraireTravail]:
+        """Horaire effectif de chaque employé indexé à une date donnée"""
+        horaires = {}
+        for employe_id in self._index:
+            horaire = self.get_horaire(employe_id, jour)
+            if horaire is not None:
+                horaires[employe_id] = horaire
+        return horaires
@@ -0,0 +1,146 @@
+# paie/services/statistiques_conges.py
+# Statistiques du module congés : compteurs par (type, département) en une requête, en cache courte durée
+
+from collections import defaultdict
+from datetime import date, timedelta
+import logging
+from typing import Dict, List, Optional
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.db.models.functions import TruncMonth
+
+from ..models import DemandeConge
+from .generations import CompteurGeneration
+from .index_conges import STATUTS_EN_ATTENTE
+
+logger = logging.getLogger(__name__)
+
+CLE_GENERATION_STATISTIQUES_CONGES = 'paie:statistiques_conges:generation'
+CLE_STATISTIQUES = 'paie:statistiques_conges:{generation}:{jour}'
+# Filet de sécurité : les tableaux de bord tolèrent quelques minutes de retard
+DUREE_CACHE = 5 * 60
+
+NB_MOIS_EVOLUTION = 6
+NB_TOP_TYPES = 5
+
+COMPTEURS = ['total', 'en_attente', 'mois', 'annee', 'approuvees', 'refusees']
+
+
+_generation = CompteurGeneration(CLE_GENERATION_STATISTIQUES_CONGES)
+
+
+def get_generation_statistiques_conges() -> int:
+    return _generation.lire()
+
+
+def invalider_statistiques_conges():
+    """Appelé à chaque création ou changement de statut d'une demande"""
+    _generation.invalider()
+
+
+def _taux_approbation(compteurs: Dict) -> float:
+    traitees = compteurs['approuvees'] + compteurs['refusees']
+    return round(compteurs['approuvees'] / traitees * 100, 1) if traitees else 0
+
+
+def _compteurs_par_groupe(aujourd_hui: date) -> List[Dict]:
+    """Tous les compteurs par (type de congé, département), en une seule requête d'agrégats conditionnels"""
+    cette_annee = Q(date_creation__year=aujourd_hui.year)
+    return list(DemandeConge.objects.order_by().values(
+        'type_conge_id', 'type_conge__libelle', 'type_conge__couleur_affichage',
+        'employe__department_id', 'employe__department__name'
+    ).annotate(
+        total=Count('id'),
+        en_attente=Count('id', filter=Q(statut__in=STATUTS_EN_ATTENTE)),
+        mois=Count('id', filter=cette_annee & Q(date_creation__month=aujourd_hui.month)),
+        annee=Count('id', filter=cette_annee),
+        approuvees=Count('id', filter=Q(statut='APPROUVEE')),
+        refusees=Count('id', filter=Q(statut='REFUSEE'))
+    ))
+
+
+def _evolution(aujourd_hui: date) -> List[Dict]:
+    evolution = DemandeConge.objects.filter(
+        date_creation__gte=aujourd_hui - timedelta(days=30 * NB_MOIS_EVOLUTION)
+    ).annotate(
+        mois=TruncMonth('date_creation')
+    ).values('mois').annotate(
+        nombre_demandes=Count('id'),
+        approuvees=Count('id', filter=Q(statut='APPROUVEE')),
+        refusees=Count('id', filter=Q(statut='REFUSEE'))
+    ).order_by('mois')
+    return [
+        {
+            'mois': item['mois'].strftime('%Y-%m'),
+            'demandes': item['nombre_demandes'],
+            'approuvees': item['approuvees'],
+            'refusees': item['refusees'],
+        }
+        for item in evolution
+    ]
+
+
+def calculer_statistiques_conges(aujourd_hui: Optional[date] = None) -> Dict:
+    """
+    Compteurs globaux, répartitions par type et par département, évolution mensuelle
+
+    Les totaux et les deux répartitions sont sommés en Python à partir des
+    compteurs par (type, département) : deux requêtes en tout, évolution comprise.
+    """
+    aujourd_hui = aujourd_hui or date.today()
+    totaux = dict.fromkeys(COMPTEURS, 0)
+    par_type = defaultdict(lambda: dict.fromkeys(COMPTEURS, 0))
+    par_departement = defaultdict(lambda: dict.fromkeys(COMPTEURS, 0))
+
+    for groupe in _compteurs_par_groupe(aujourd_hui):
+        type_conge = par_type[groupe['type_conge_id']]
+        type_conge['type'] = groupe['type_conge__libelle']
+        type_conge['couleur'] = groupe['type_conge__couleur_affichage']
+        departement = par_departement[groupe['employe__department_id']]
+        departement['departement'] = groupe['employe__department__name'] or 'Sans département'
+        for compteur in COMPTEURS:
+            totaux[compteur] += groupe[compteur]
+            type_conge[compteur] += groupe[compteur]
+            departement[compteur] += groupe[compteur]
+
+    repartition_types = []
+    for type_id, compteurs in par_type.items():
+        compteurs['type_id'] = type_id
+        compteurs['taux_approbation'] = _taux_approbation(compteurs)
+        repartition_types.append(compteurs)
+    repartition_departements = []
+    for departement_id, compteurs in par_departement.items():
+        compteurs['departement_id'] = departement_id
+        compteurs['taux_approbation'] = _taux_approbation(compteurs)
+        repartition_departements.append(compteurs)
+
+    top_types = sorted(
+        (compteurs for compteurs in repartition_types if compteurs['annee']),
+        key=lambda compteurs: -compteurs['annee']
+    )[:NB_TOP_TYPES]
+
+    return {
+        'demandes_total': totaux['total'],
+        'demandes_en_attente': totaux['en_attente'],
+        'demandes_mois': totaux['mois'],
+        'taux_approbation': _taux_approbation(totaux),
+        'evolution': _evolution(aujourd_hui),
+        'top_types_conges': [
+            {'type': compteurs['type'], 'couleur': compteurs['couleur'], 'count': compteurs['annee']}
+            for compteurs in top_types
+        ],
+        'par_type': sorted(repartition_types, key=lambda compteurs: compteurs['type']),
+        'par_departement': sorted(repartition_departements, key=lambda compteurs: compteurs['departement']),
+    }
+
+
+def get_statistiques_conges() -> Dict:
+    """Statistiques partagées entre les appels tant qu'aucune demande n'a changé (et au plus DUREE_CACHE)"""
+    aujourd_hui = date.today()
+    cle = CLE_STATISTIQUES.format(generation=get_generation_statistiques_conges(), jour=aujourd_hui.isoformat())
+    statistiques = cache.get(cle)
+    if statistiques is None:
+        statistiques = calculer_statistiques_conges(aujourd_hui)
+        cache.set(cle, statistiques, DUREE_CACHE)
+    return statistiques
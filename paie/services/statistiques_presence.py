@@ -0,0 +1,310 @@
+# paie/services/statistiques_presence.py
+# Agrégats quotidiens des présences par (jour, département, site) : mise à jour et lectures
+
+from collections import defaultdict
+from datetime import date, timedelta
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+
+from ..models import Employee, PresenceJournaliere, StatistiquePresenceJour
+
+logger = logging.getLogger(__name__)
+
+CHAMPS_STATUT = {
+    'PRESENT': 'nb_presents',
+    'ABSENT': 'nb_absents',
+    'PARTIEL': 'nb_partiels',
+    'CONGE': 'nb_conges',
+    'MALADIE': 'nb_maladies',
+    'MISSION': 'nb_missions',
+    'TELETRAVAIL': 'nb_teletravail',
+}
+
+# Statuts comptés comme présents (un retard n'a de sens que pour eux)
+STATUTS_PRESENT = ['PRESENT', 'PARTIEL', 'MISSION', 'TELETRAVAIL']
+
+# (champ, libellé, minutes min, minutes max)
+TRANCHES_RETARD = [
+    ('nb_retards_5', '1-5', 1, 5),
+    ('nb_retards_15', '6-15', 6, 15),
+    ('nb_retards_30', '16-30', 16, 30),
+    ('nb_retards_60', '31-60', 31, 60),
+    ('nb_retards_plus', '60+', 61, None),
+]
+
+CHAMPS_COMPTEURS = [
+    'nb_lignes', *CHAMPS_STATUT.values(), 'nb_retards',
+    *(champ for champ, _, _, _ in TRANCHES_RETARD), 'minutes_retard'
+]
+CHAMPS_DUREES = ['heures_travaillees', 'heures_theoriques', 'heures_supplementaires']
+
+GRANULARITES = {
+    'jour': None,
+    'semaine': TruncWeek,
+    'mois': TruncMonth,
+}
+
+
+def _agregats_presences() -> Dict:
+    """Agrégats d'une ligne de StatistiquePresenceJour, calculés sur PresenceJournaliere"""
+    en_retard = Q(statut_jour__in=STATUTS_PRESENT, retard_minutes__gt=0)
+    agregats = {
+        'nb_lignes': Count('id'),
+        'nb_retards': Count('id', filter=en_retard),
+        'minutes_retard': Sum('retard_minutes', filter=en_retard),
+    }
+    for statut, champ in CHAMPS_STATUT.items():
+        agregats[champ] = Count('id', filter=Q(statut_jour=statut))
+    for champ, _, minimum, maximum in TRANCHES_RETARD:
+        filtre = Q(statut_jour__in=STATUTS_PRESENT, retard_minutes__gte=minimum)
+        if maximum is not None:
+            filtre &= Q(retard_minutes__lte=maximum)
+        agregats[champ] = Count('id', filter=filtre)
+    for champ in CHAMPS_DUREES:
+        agregats[champ] = Sum(champ)
+    return agregats
+
+
+def _construire_ligne(jour: date, departement_id: Optional[int], site_id: Optional[int],
+                      valeurs: Dict) -> StatistiquePresenceJour:
+    return StatistiquePresenceJour(
+        date=jour,
+        departement_id=departement_id,
+        site_id=site_id,
+        **{champ: valeurs[champ] or 0 for champ in CHAMPS_COMPTEURS},
+        **{champ: valeurs[champ] or timedelta(0) for champ in CHAMPS_DUREES}
+    )
+
+
+@transaction.atomic
+def reconstruire_statistiques(date_debut: date, date_fin: date = None) -> int:
+    """
+    Recalcule toutes les lignes d'une période en une requête groupée
+
+    Returns:
+        Nombre de lignes (jour, département, site) écrites
+    """
+    from .gestionnaire_pointage import get_parametre_pointage
+
+    date_fin = date_fin or date_debut
+    groupes = PresenceJournaliere.objects.filter(
+        date__range=[date_debut, date_fin]
+    ).order_by().values('date', 'employe__department_id', 'employe__site_id').annotate(**_agregats_presences())
+
+    lignes = [
+        _construire_ligne(groupe['date'], groupe['employe__department_id'], groupe['employe__site_id'], groupe)
+        for groupe in groupes
+    ]
+
+    StatistiquePresenceJour.objects.filter(date__range=[date_debut, date_fin]).delete()
+    StatistiquePresenceJour.objects.bulk_create(lignes, batch_size=get_parametre_pointage('BATCH_SIZE'))
+
+    logger.info(f"Statistiques de présence reconstruites du {date_debut} au {date_fin}: {len(lignes)} lignes")
+    return len(lignes)
+
+
+Cellule = Tuple[date, Optional[int], Optional[int]]
+
+# Présences modifiées dans la transaction en cours du thread, recalculées ensemble après validation
+_en_attente = threading.local()
+
+
+def _ecrire_cellule(jour: date, departement_id: Optional[int], site_id: Optional[int], valeurs: Dict):
+    """
+    Écrit ou supprime la ligne d'une cellule
+
+    update_or_create verrouille la ligne existante et reprend la lecture si une
+    transaction concurrente l'a créée entre-temps (contrainte d'unicité).
+    """
+    cellule = {'date': jour, 'departement_id': departement_id, 'site_id': site_id}
+    if not valeurs['nb_lignes']:
+        StatistiquePresenceJour.objects.filter(**cellule).delete()
+        return
+    ligne = _construire_ligne(jour, departement_id, site_id, valeurs)
+    StatistiquePresenceJour.objects.update_or_create(
+        **cellule,
+        defaults={champ: getattr(ligne, champ) for champ in CHAMPS_COMPTEURS + CHAMPS_DUREES}
+    )
+
+
+@transaction.atomic
+def rafraichir_cellule(jour: date, departement_id: Optional[int], site_id: Optional[int]):
+    """Recalcule la ligne d'un (jour, département, site) depuis ses présences"""
+    valeurs = PresenceJournaliere.objects.filter(
+        date=jour,
+        employe__department_id=departement_id,
+        employe__site_id=site_id
+    ).aggregate(**_agregats_presences())
+    _ecrire_cellule(jour, departement_id, site_id, valeurs)
+
+
+@transaction.atomic
+def rafraichir_cellules(cellules: Iterable[Cellule]):
+    """Recalcule plusieurs cellules : une requête groupée par (département, site)"""
+    jours_par_affectation = defaultdict(set)
+    for jour, departement_id, site_id in cellules:
+        jours_par_affectation[(departement_id, site_id)].add(jour)
+
+    for (departement_id, site_id), jours in jours_par_affectation.items():
+        if len(jours) == 1:
+            rafraichir_cellule(next(iter(jours)), departement_id, site_id)
+            continue
+        groupes = {
+            groupe['date']: groupe
+            for groupe in PresenceJournaliere.objects.filter(
+                date__in=jours,
+                employe__department_id=departement_id,
+                employe__site_id=site_id
+            ).order_by().values('date').annotate(**_agregats_presences())
+        }
+        for jour in jours:
+            _ecrire_cellule(jour, departement_id, site_id, groupes.get(jour, {'nb_lignes': 0}))
+
+
+def _presences_en_attente():
+    if not hasattr(_en_attente, 'cellules'):
+        # Cellules connues, et (employé, jour) dont l'affectation reste à lire
+        _en_attente.cellules = set()
+        _en_attente.employes = set()
+    return _en_attente.cellules, _en_attente.employes
+
+
+def signaler_presence(presence: PresenceJournaliere):
+    """
+    Note une présence modifiée (signal de PresenceJournaliere)
+
+    Les cellules sont recalculées une seule fois après la validation de la
+    transaction, même si la présence a été enregistrée plusieurs fois. Une
+    erreur de recalcul est journalisée sans remonter à l'appelant, dont
+    l'écriture est déjà validée.
+    """
+    cellules, employes = _presences_en_attente()
+    if PresenceJournaliere.employe.is_cached(presence):
+        cellules.add((presence.date, presence.employe.department_id, presence.employe.site_id))
+    else:
+        employes.add((presence.employe_id, presence.date))
+    transaction.on_commit(rafraichir_presences_en_attente, robust=True)
+
+
+def rafraichir_presences_en_attente():
+    cellules, employes = _presences_en_attente()
+    if not cellules and not employes:
+        return
+    a_rafraichir = set(cellules)
+    en_attente = set(employes)
+    cellules.clear()
+    employes.clear()
+
+    if en_attente:
+        affectations = {
+            employe_id: (departement_id, site_id)
+            for employe_id, departement_id, site_id in Employee.objects.filter(
+                id__in={employe_id for employe_id, _ in en_attente}
+            ).values_list('id', 'department_id', 'site_id')
+        }
+        a_rafraichir.update(
+            (jour, *affectations[employe_id]) for employe_id, jour in en_attente if employe_id in affectations
+        )
+    rafraichir_cellules(a_rafraichir)
+
+
+def reaffecter_employe(employe_id: int, ancienne: Tuple[Optional[int], Optional[int]],
+                       nouvelle: Tuple[Optional[int], Optional[int]]):
+    """Changement de département ou de site : les présences de l'employé quittent leurs anciennes cellules"""
+    jours = set(PresenceJournaliere.objects.filter(employe_id=employe_id).values_list('date', flat=True))
+    rafraichir_cellules(
+        [(jour, *ancienne) for jour in jours] + [(jour, *nouvelle) for jour in jours]
+    )
+
+
+def _formater(valeurs: Dict) -> Dict:
+    """Totaux bruts -> indicateurs (taux, moyennes, heures décimales, répartition des retards)"""
+    compteurs = {champ: valeurs.get(champ) or 0 for champ in CHAMPS_COMPTEURS}
+    heures = {
+        champ: round((valeurs.get(champ) or timedelta(0)).total_seconds() / 3600, 2)
+        for champ in CHAMPS_DUREES
+    }
+
+    # Mêmes conventions que les prévisions : congés et maladies ne sont pas attendus
+    attendus = compteurs['nb_lignes'] - compteurs['nb_conges'] - compteurs['nb_maladies']
+    presents = (compteurs['nb_presents'] + compteurs['nb_partiels']
+                + compteurs['nb_missions'] + compteurs['nb_teletravail'])
+
+    return {
+        'nb_presences': compteurs['nb_lignes'],
+        'par_statut': {statut: compteurs[champ] for statut, champ in CHAMPS_STATUT.items()},
+        'taux_presence': round(presents / attendus * 100, 1) if attendus > 0 else 0,
+        'retards': {
+            'total': compteurs['nb_retards'],
+            'taux': round(compteurs['nb_retards'] / presents * 100, 1) if presents else 0,
+            'moyenne_minutes': round(compteurs['minutes_retard'] / compteurs['nb_retards'], 1)
+            if compteurs['nb_retards'] else 0,
+            'repartition': {libelle: compteurs[champ] for champ, libelle, _, _ in TRANCHES_RETARD},
+        },
+        'heures': {
+            'travaillees': heures['heures_travaillees'],
+            'theoriques': heures['heures_theoriques'],
+            'supplementaires': heures['heures_supplementaires'],
+            'moyenne_par_presence': round(heures['heures_travaillees'] / presents, 2) if presents else 0,
+        },
+    }
+
+
+def _totaux() -> Dict:
+    return {champ: Sum(champ) for champ in CHAMPS_COMPTEURS + CHAMPS_DUREES}
+
+
+def _filtrer(date_debut: date, date_fin: date, departement_id: int = None, site_id: int = None):
+    query = StatistiquePresenceJour.objects.filter(date__range=[date_debut, date_fin])
+    if departement_id is not None:
+        query = query.filter(departement_id=departement_id)
+    if site_id is not None:
+        query = query.filter(site_id=site_id)
+    return query
+
+
+def get_tendances(date_debut: date, date_fin: date, granularite: str = 'semaine',
+                  departement_id: int = None, site_id: int = None) -> List[Dict]:
+    """
+    Série des indicateurs par jour, semaine ou mois
+
+    Lue sur les lignes agrégées : quelques centaines de lignes pour plusieurs mois.
+    """
+    if granularite not in GRANULARITES:
+        raise ValueError(f"Granularité inconnue: {granularite}")
+
+    troncature = GRANULARITES[granularite]
+    periodes = _filtrer(date_debut, date_fin, departement_id, site_id).annotate(
+        periode=troncature('date') if troncature else F('date')
+    ).order_by('periode').values('periode').annotate(**_totaux())
+
+    return [
+        {'periode': periode['periode'].isoformat(), **_formater(periode)}
+        for periode in periodes
+    ]
+
+
+def get_statistiques_departement(departement_id: int, date_debut: date, date_fin: date) -> Dict:
+    """Totaux d'un département sur une période, détaillés par site et par jour"""
+    query = _filtrer(date_debut, date_fin, departement_id)
+
+    par_site = [
+        {'site_id': site['site_id'], 'site': site['site__name'], **_formater(site)}
+        for site in query.order_by('site__name').values('site_id', 'site__name').annotate(**_totaux())
+    ]
+
+    return {
+        **_formater(query.aggregate(**_totaux())),
+        'par_site': par_site,
+        'par_jour': get_tendances(date_debut, date_fin, 'jour', departement_id=departement_id),
+    }
+
+
+def get_statistiques_jour(jour: date) -> Dict:
+    """Indicateurs consolidés d'une journée (tous départements et sites)"""
+    return _formater(StatistiquePresenceJour.objects.filter(date=jour).aggregate(**_totaux()))
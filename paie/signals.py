@@ -1,8 +1,21 @@
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save, post_migrate
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save, post_delete, post_migrate, pre_save
 from django.dispatch import receiver
 
-from .models import UserProfile
+from .models import (
+    UserProfile, DemandeConge, Employee, HoraireTravail, JourFerie, PlageHoraire, Pointage,
+    PresenceJournaliere, RegleConge, ReglePointage, TypeConge
+)
+from .services.calendrier_ouvrable import invalider_calendrier
+from .services.flux_conges import invalider_flux_conges
+from .services.index_conges import invalider_index_conges
+from .services.file_pointage import invalider_etat_jour
+from .services.moteur_alertes import invalider_regles_alertes
+from .services.regles_conges import invalider_regles_conges
+from .services.resolveur_horaires import invalider_cache_horaires
+from .services.statistiques_conges import invalider_statistiques_conges
+from .services.statistiques_presence import reaffecter_employe, signaler_presence
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -22,3 +35,117 @@ def create_profiles_for_existing_users(sender, **kwargs):
         from django.contrib.auth.models import User
         for user in User.objects.all():
             UserProfile.objects.get_or_create(user=user)
+
+
+@receiver([post_save, post_delete], sender=HoraireTravail)
+@receiver([post_save, post_delete], sender=PlageHoraire)
+def invalider_horaires(sender, **kwargs):
+    """
+    Invalide les index d'horaires en cache dès qu'une affectation ou une plage change
+    (api_assign_horaire_employe, api_end_horaire_employe, admin...).
+    """
+    invalider_cache_horaires()
+
+
+@receiver([post_save, post_delete], sender=Pointage)
+def invalider_etat_pointage(sender, instance, **kwargs):
+    """
+    Invalide l'état du jour utilisé par le pointage différé dès qu'un pointage
+    est créé, corrigé ou supprimé.
+    """
+    invalider_etat_jour(instance.employe_id, instance.heure_pointage.date())
+
+
+@receiver([post_save, post_delete], sender=ReglePointage)
+def invalider_regles_pointage(sender, **kwargs):
+    """Les moteurs d'alertes en mémoire recompilent leurs règles au lot suivant."""
+    invalider_regles_alertes()
+
+
+@receiver([post_save, post_delete], sender=PresenceJournaliere)
+def mettre_a_jour_statistiques_presence(sender, instance, **kwargs):
+    """
+    Recalcule la ligne (jour, département, site) de la présence une fois la
+    transaction validée, une fois par cellule et par transaction. Les écritures
+    en masse (validation par lot) appellent reconstruire_statistiques directement.
+    """
+    signaler_presence(instance)
+
+
+@receiver(pre_save, sender=Employee)
+def memoriser_affectation_employe(sender, instance, **kwargs):
+    """Affectation avant modification, pour rafraîchir les anciennes cellules de présence"""
+    champs = kwargs.get('update_fields')
+    if champs is not None and not {'department', 'site'} & set(champs):
+        return
+    if instance.pk and not kwargs.get('raw'):
+        instance._affectation_precedente = Employee.objects.filter(pk=instance.pk).values_list(
+            'department_id', 'site_id'
+        ).first()
+
+
+@receiver(post_save, sender=Employee)
+def reaffecter_statistiques_presence(sender, instance, created, **kwargs):
+    """Les présences d'un employé qui change de département ou de site changent de cellule"""
+    ancienne = getattr(instance, '_affectation_precedente', None)
+    nouvelle = (instance.department_id, instance.site_id)
+    if created or ancienne is None or ancienne == nouvelle:
+        return
+    employe_id = instance.id
+    transaction.on_commit(lambda: reaffecter_employe(employe_id, ancienne, nouvelle), robust=True)
+
+
+@receiver([post_save, post_delete], sender=JourFerie)
+def invalider_jours_feries(sender, **kwargs):
+    """Les calendriers ouvrables reconstruisent leurs sommes cumulées au prochain appel."""
+    invalider_calendrier()
+
+
+@receiver([post_save, post_delete], sender=DemandeConge)
+@receiver([post_save, post_delete], sender=RegleConge)
+@receiver([post_save, post_delete], sender=Employee)
+@receiver(m2m_changed, sender=RegleConge.types_conge.through)
+@receiver(m2m_changed, sender=RegleConge.departements.through)
+def invalider_conges_planifies(sender, **kwargs):
+    """
+    Les index de congés par département et les règles de planification sont
+    rechargés au prochain contrôle de conflits (demande, affectation ou règle modifiée).
+    """
+    invalider_index_conges()
+
+
+@receiver([post_save, post_delete], sender=RegleConge)
+@receiver([post_save, post_delete], sender=Employee)
+@receiver(m2m_changed, sender=RegleConge.types_conge.through)
+@receiver(m2m_changed, sender=RegleConge.departements.through)
+def invalider_regles_validation_conges(sender, **kwargs):
+    """Règles de validation recompilées au prochain contrôle (règle modifiée ou effectifs des départements)"""
+    invalider_regles_conges()
+
+
+@receiver([post_save, post_delete], sender=DemandeConge)
+def invalider_flux_calendrier_demande(sender, instance, **kwargs):
+    """
+    Pages du calendrier et flux ICS du département de l'employé reconstruits au
+    prochain appel ; sans employé chargé, tous les flux sont invalidés plutôt
+    que de relire son département
+    """
+    if DemandeConge.employe.is_cached(instance):
+        invalider_flux_conges([instance.employe.department_id])
+    else:
+        invalider_flux_conges()
+
+
+@receiver([post_save, post_delete], sender=Employee)
+@receiver([post_save, post_delete], sender=TypeConge)
+def invalider_flux_calendrier(sender, **kwargs):
+    """Noms, départements et couleurs apparaissent dans tous les flux du calendrier"""
+    invalider_flux_conges()
+
+
+@receiver([post_save, post_delete], sender=DemandeConge)
+@receiver([post_save, post_delete], sender=Employee)
+@receiver([post_save, post_delete], sender=TypeConge)
+def invalider_statistiques_demandes_conges(sender, **kwargs):
+    """Compteurs du tableau de bord recalculés au prochain appel (statut, type ou département modifié)"""
+    invalider_statistiques_conges()
@@ -0,0 +1,138 @@
+# paie/tests/test_acquisition_conges.py
+# Acquisition des congés en forme close : parité avec l'ancien calcul de GestionnaireConges
+
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+from fractions import Fraction
+
+from django.test import SimpleTestCase
+
+from paie.services.acquisition_conges import (
+    anciennete_mois, jours_acquis, jours_acquis_lot, mois_acquisition
+)
+
+
+def ancien_jours_acquis(date_embauche, annee, aujourd_hui, jours_par_mois, anciennete_minimum_mois=0):
+    """Calcul d'origine (_calculer_jours_acquis et méthodes associées), date du jour en paramètre"""
+    if jours_par_mois <= 0 or not date_embauche:
+        return Decimal('0')
+
+    date_debut = max(date_embauche, date(annee, 1, 1))
+    if int((date_debut - date_embauche).days / 30.44) < anciennete_minimum_mois:
+        return Decimal('0')
+
+    date_fin_calcul = min(aujourd_hui, date(annee, 12, 31))
+    if date_fin_calcul < date_debut:
+        mois = 0
+    elif date_debut.day == 1:
+        mois = (date_fin_calcul.year - date_debut.year) * 12 + date_fin_calcul.month - date_debut.month + 1
+    else:
+        if date_debut.month == 12:
+            jours_dans_mois = (date(date_debut.year + 1, 1, 1) - date(date_debut.year, 12, 1)).days
+        else:
+            jours_dans_mois = (date(date_debut.year, date_debut.month + 1, 1)
+                               - date(date_debut.year, date_debut.month, 1)).days
+        jours_travailles = jours_dans_mois - date_debut.day + 1
+        if date_fin_calcul.month == date_debut.month:
+            jours_travailles = date_fin_calcul.day - date_debut.day + 1
+        mois = float(Decimal(str(jours_travailles)) / Decimal(str(jours_dans_mois)))
+
+    return (Decimal(str(mois)) * jours_par_mois).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+TAUX = [Decimal('1.5'), Decimal('2.5'), Decimal('1.83'), Decimal('2')]
+ARRETS = [date(2026, 1, 1), date(2026, 3, 31), date(2026, 6, 15), date(2026, 10, 19), date(2026, 12, 31)]
+
+
+class PariteAncienCalculTests(SimpleTestCase):
+    """Cas où la forme close doit redonner exactement l'ancien résultat"""
+
+    def assertParite(self, date_embauche, annee=2026, anciennete_minimum_mois=0):
+        for taux in TAUX:
+            for arret in ARRETS:
+                with self.subTest(embauche=date_embauche, arret=arret, taux=taux):
+                    self.assertEqual(
+                        jours_acquis(date_embauche, annee, arret, taux, anciennete_minimum_mois),
+                        ancien_jours_acquis(date_embauche, annee, arret, taux, anciennete_minimum_mois)
+                    )
+
+    def test_embauche_le_premier_du_mois(self):
+        for mois in (1, 3, 6, 12):
+            self.assertParite(date(2026, mois, 1))
+
+    def test_embauche_annee_precedente(self):
+        for date_embauche in (date(2019, 7, 14), date(2025, 1, 1), date(2025, 12, 31)):
+            self.assertParite(date_embauche)
+
+    def test_arret_avant_embauche(self):
+        self.assertParite(date(2027, 2, 1))
+        self.assertEqual(jours_acquis(date(2026, 11, 15), 2026, date(2026, 10, 19), Decimal('2.5')), Decimal('0'))
+
+    def test_embauche_en_cours_de_mois_arretee_dans_le_mois(self):
+        for arret in (date(2026, 3, 15), date(2026, 3, 20), date(2026, 3, 31)):
+            for taux in TAUX:
+                with self.subTest(arret=arret, taux=taux):
+                    self.assertEqual(
+                        jours_acquis(date(2026, 3, 15), 2026, arret, taux),
+                        ancien_jours_acquis(date(2026, 3, 15), 2026, arret, taux)
+                    )
+
+    def test_anciennete_minimum(self):
+        # Loin des limites de mois, les deux définitions de l'ancienneté coïncident
+        self.assertParite(date(2024, 6, 15), anciennete_minimum_mois=12)
+        self.assertParite(date(2025, 6, 15), anciennete_minimum_mois=12)
+        self.assertParite(date(2025, 6, 15), anciennete_minimum_mois=6)
+
+    def test_taux_nul(self):
+        self.assertEqual(jours_acquis(date(2020, 1, 1), 2026, date(2026, 6, 1), Decimal('0')), Decimal('0'))
+        self.assertEqual(jours_acquis(None, 2026, date(2026, 6, 1), Decimal('1.5')), Decimal('0'))
+
+
+class EcartsVoulusTests(SimpleTestCase):
+    """Écarts assumés avec l'ancien calcul"""
+
+    def test_embauche_en_cours_de_mois_acquiert_les_mois_suivants(self):
+        # L'ancien calcul ne retenait que le prorata du premier mois pour toute l'année (1,37 jour)
+        self.assertEqual(ancien_jours_acquis(date(2026, 3, 15), 2026, date(2026, 10, 19), Decimal('2.5')),
+                         Decimal('1.37'))
+        self.assertEqual(mois_acquisition(date(2026, 3, 15), 2026, date(2026, 10, 19)), 7 + Fraction(17, 31))
+        self.assertEqual(jours_acquis(date(2026, 3, 15), 2026, date(2026, 10, 19), Decimal('2.5')),
+                         Decimal('18.87'))
+        self.assertEqual(jours_acquis(date(2026, 3, 1), 2026, date(2026, 10, 19), Decimal('2.5')),
+                         Decimal('20.00'))
+
+    def test_arrondi_demi_centieme(self):
+        # 1/30 de mois à 0,15 jour/mois vaut exactement 0,005 : arrondi au centième supérieur
+        self.assertEqual(jours_acquis(date(2026, 4, 30), 2026, date(2026, 4, 30), Decimal('0.15')), Decimal('0.01'))
+        self.assertEqual(ancien_jours_acquis(date(2026, 4, 30), 2026, date(2026, 4, 30), Decimal('0.15')),
+                         Decimal('0.00'))
+        # Valeur exacte sans ambiguïté : 14/28 de mois à 1,25 = 0,625
+        self.assertEqual(jours_acquis(date(2026, 2, 15), 2026, date(2026, 2, 28), Decimal('1.25')), Decimal('0.63'))
+        self.assertEqual(jours_acquis(date(2026, 2, 15), 2026, date(2026, 2, 28), Decimal('1.24')), Decimal('0.62'))
+
+    def test_anciennete_en_mois_calendaires(self):
+        self.assertEqual(anciennete_mois(date(2025, 1, 15), date(2026, 1, 14)), 11)
+        self.assertEqual(anciennete_mois(date(2025, 1, 15), date(2026, 1, 15)), 12)
+        self.assertEqual(anciennete_mois(date(2026, 1, 31), date(2026, 2, 28)), 1)
+        self.assertEqual(anciennete_mois(date(2026, 1, 31), date(2026, 2, 27)), 0)
+        self.assertEqual(anciennete_mois(date(2026, 5, 1), date(2026, 4, 1)), 0)
+        # 365 jours : 11 mois avec la moyenne de 30,44 jours, 12 mois calendaires
+        self.assertEqual(anciennete_mois(date(2026, 1, 1), date(2027, 1, 1)), 12)
+        self.assertEqual(
+            jours_acquis(date(2026, 1, 1), 2027, date(2027, 12, 31), Decimal('1.5'), anciennete_minimum_mois=12),
+            Decimal('18.00')
+        )
+        self.assertEqual(
+            ancien_jours_acquis(date(2026, 1, 1), 2027, date(2027, 12, 31), Decimal('1.5'), anciennete_minimum_mois=12),
+            Decimal('0')
+        )
+
+
+class LotTests(SimpleTestCase):
+
+    def test_lot_identique_au_calcul_unitaire(self):
+        dates = [date(2026, 3, 15), None, date(2020, 1, 1), date(2026, 3, 15), date(2026, 11, 2)]
+        self.assertEqual(
+            jours_acquis_lot(dates, 2026, date(2026, 10, 19), Decimal('1.5'), 0),
+            [jours_acquis(d, 2026, date(2026, 10, 19), Decimal('1.5')) for d in dates]
+        )
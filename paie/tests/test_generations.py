@@ -0,0 +1,37 @@
+# paie/tests/test_generations.py
+# Compteurs de génération : changement immédiat, puis au commit
+
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase, override_settings
+
+from paie.services.generations import CompteurGeneration
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CompteurGenerationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.compteur = CompteurGeneration('paie:test:generation')
+
+    def test_cle_absente_repart_au_dela_des_generations_servies(self):
+        generation = self.compteur.lire()
+        self.compteur.incrementer()
+        cache.clear()
+        self.assertGreater(self.compteur.lire(), generation + 1)
+
+    def test_invalidation_repetee_au_commit(self):
+        generation = self.compteur.lire()
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            with transaction.atomic():
+                self.compteur.invalider()
+                pendant = self.compteur.lire()
+        self.assertEqual(pendant, generation + 1)
+
+        # Un autre processus reconstruit à partir des lignes d'avant le commit...
+        perimee = self.compteur.lire()
+        for callback in callbacks:
+            callback()
+        # ...et sa reconstruction est périmée au commit
+        self.assertNotEqual(self.compteur.lire(), perimee)
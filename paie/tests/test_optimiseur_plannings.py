@@ -0,0 +1,101 @@
+# paie/tests/test_optimiseur_plannings.py
+# Écriture des plannings optimisés : les horaires auxquels des présences sont rattachées sont conservés
+
+from datetime import date, time, timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+
+from paie.models import Employee, HoraireTravail, PlageHoraire, PresenceJournaliere
+from paie.services.optimiseur_plannings import OptimiseurPlannings
+
+
+class AppliquerPlanningsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.matin = PlageHoraire.objects.create(
+            nom='Matin', heure_debut=time(8), heure_fin=time(16), jours_travailles=[1, 2, 3, 4, 5]
+        )
+        cls.soir = PlageHoraire.objects.create(
+            nom='Soir', heure_debut=time(14), heure_fin=time(22), jours_travailles=[1, 2, 3, 4, 5]
+        )
+
+    def _employe(self, numero):
+        return Employee.objects.create(
+            first_name=f'Prenom{numero}', last_name=f'Nom{numero}', email=f'employe{numero}@exemple.ma',
+            position='Agent', hire_date=date(2020, 1, 1), salary=Decimal('6000')
+        )
+
+    def _presences(self, employe, horaire, debut, nb_jours):
+        PresenceJournaliere.objects.bulk_create(
+            PresenceJournaliere(
+                employe=employe, date=debut + timedelta(days=i), horaire_travail=horaire, statut_jour='PRESENT'
+            )
+            for i in range(nb_jours)
+        )
+
+    def _appliquer(self, employes):
+        optimiseur = OptimiseurPlannings(2026, 3)
+        optimiseur.initiale = {employe.id: self.matin.id for employe in employes}
+        optimiseur.affectation = {employe.id: self.soir.id for employe in employes}
+        return optimiseur.appliquer()
+
+    def test_horaire_avec_presences_termine_sans_perte(self):
+        employe = self._employe(1)
+        horaire = HoraireTravail.objects.create(
+            employe=employe, plage_horaire=self.matin, date_debut=date(2026, 3, 1)
+        )
+        self._presences(employe, horaire, date(2026, 3, 2), 4)
+
+        resultat = self._appliquer([employe])
+
+        self.assertEqual(resultat['nb_termines'], 1)
+        self.assertEqual(
+            PresenceJournaliere.objects.filter(employe=employe, horaire_travail=horaire).count(), 4
+        )
+        horaire.refresh_from_db()
+        self.assertEqual(horaire.plage_horaire_id, self.matin.id)
+        self.assertEqual((horaire.date_debut, horaire.date_fin), (date(2026, 3, 1), date(2026, 3, 5)))
+
+        horaires = list(HoraireTravail.objects.filter(employe=employe).exclude(id=horaire.id).order_by('date_debut')
+                        .values_list('plage_horaire_id', 'date_debut', 'date_fin'))
+        self.assertEqual(horaires, [
+            (self.soir.id, date(2026, 3, 6), date(2026, 3, 31)),
+            (self.matin.id, date(2026, 4, 1), None),
+        ])
+
+    def test_mois_deja_pointe_ignore(self):
+        employe = self._employe(2)
+        horaire = HoraireTravail.objects.create(
+            employe=employe, plage_horaire=self.matin, date_debut=date(2026, 3, 1), date_fin=date(2026, 3, 31)
+        )
+        self._presences(employe, horaire, date(2026, 3, 1), 31)
+
+        resultat = self._appliquer([employe])
+
+        self.assertEqual(resultat['nb_ignores'], 1)
+        self.assertEqual(PresenceJournaliere.objects.filter(horaire_travail=horaire).count(), 31)
+        self.assertEqual(HoraireTravail.objects.filter(employe=employe).count(), 1)
+        horaire.refresh_from_db()
+        self.assertEqual((horaire.plage_horaire_id, horaire.date_fin), (self.matin.id, date(2026, 3, 31)))
+
+    def test_horaire_sans_presence_reporte_apres_le_mois(self):
+        employe = self._employe(3)
+        ancien = HoraireTravail.objects.create(
+            employe=employe, plage_horaire=self.matin, date_debut=date(2025, 1, 1)
+        )
+        self._presences(employe, ancien, date(2026, 2, 25), 10)
+        horaire = HoraireTravail.objects.create(
+            employe=employe, plage_horaire=self.matin, date_debut=date(2026, 3, 1)
+        )
+
+        resultat = self._appliquer([employe])
+
+        self.assertEqual(resultat['nb_reportes'], 1)
+        self.assertEqual(PresenceJournaliere.objects.filter(horaire_travail=ancien).count(), 10)
+        horaire.refresh_from_db()
+        self.assertEqual(horaire.date_debut, date(2026, 4, 1))
+        self.assertTrue(HoraireTravail.objects.filter(
+            employe=employe, plage_horaire=self.soir, date_debut=date(2026, 3, 1), date_fin=date(2026, 3, 31)
+        ).exists())
@@ -0,0 +1,146 @@
+# paie/tests/test_vues_conges.py
+# APIs congés : approbation en lot, export de la provision, calendrier et abonnements ICS
+
+from datetime import date, timedelta
+from decimal import Decimal
+import json
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from paie.models import Department, DemandeConge, Employee, TypeConge, UserProfile, UserRole
+from paie.services import flux_conges
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class VuesCongesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.departement = Department.objects.create(name='Production')
+        cls.employe = Employee.objects.create(
+            first_name='Salma', last_name='Idrissi', email='salma@exemple.ma', position='Agent',
+            hire_date=date(2018, 1, 1), salary=Decimal('8000'), department=cls.departement
+        )
+        cls.type_conge = TypeConge.objects.create(
+            code='CP', libelle='Congé payé', categorie='LEGAL', jours_acquis_par_mois=Decimal('1.5')
+        )
+        cls.rh = cls._utilisateur('rh', staff=True)
+        cls.salarie = cls._utilisateur('salarie', employe=cls.employe)
+
+    @staticmethod
+    def _utilisateur(nom, staff=False, employe=None):
+        # bulk_create : sans le signal qui crée un profil EMPLOYE sans fiche employé
+        User.objects.bulk_create([User(username=nom, is_staff=staff)])
+        utilisateur = User.objects.get(username=nom)
+        UserProfile.objects.create(
+            user=utilisateur, role=UserRole.RH if staff else UserRole.EMPLOYE, employee=employe
+        )
+        return utilisateur
+
+    def _demande(self, statut, debut=date(2026, 7, 6), fin=date(2026, 7, 10)):
+        return DemandeConge.objects.create(
+            employe=self.employe, type_conge=self.type_conge, date_debut=debut, date_fin=fin,
+            date_reprise=fin + timedelta(days=3), nb_jours_demandes=5, nb_jours_ouvrables=5, statut=statut
+        )
+
+    def test_approbation_en_lot(self):
+        demandes = [
+            self._demande('EN_ATTENTE_RH'),
+            self._demande('EN_ATTENTE_RH', date(2026, 8, 3), date(2026, 8, 7)),
+        ]
+        self.client.force_login(self.rh)
+
+        reponse = self.client.post(
+            reverse('paie:api_bulk_approve_leave_requests'),
+            json.dumps({'action': 'approve', 'demande_ids': [demande.id for demande in demandes]}),
+            content_type='application/json'
+        )
+
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(reponse.json()['traitees'], 2)
+        self.assertEqual(
+            set(DemandeConge.objects.filter(id__in=[d.id for d in demandes]).values_list('statut', flat=True)),
+            {'APPROUVEE'}
+        )
+
+        reponse = self.client.post(
+            reverse('paie:api_bulk_approve_leave_requests'),
+            json.dumps({'action': 'valider', 'demande_ids': [demandes[0].id]}),
+            content_type='application/json'
+        )
+        self.assertEqual(reponse.status_code, 400)
+
+    def test_export_provision(self):
+        url = reverse('paie:api_export_leave_liability')
+
+        self.client.force_login(self.salarie)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_login(self.rh)
+        reponse = self.client.get(url, {'annee': 2026, 'mois': 6, 'format': 'json'})
+        self.assertEqual(reponse.status_code, 200)
+        self.assertTrue(reponse.json()['success'])
+
+        reponse = self.client.get(url, {'annee': 2026, 'mois': 6})
+        self.assertEqual(reponse.status_code, 200)
+        self.assertTrue(reponse['Content-Type'].startswith('text/csv'))
+        self.assertIn('provision_conges_2026_06.csv', reponse['Content-Disposition'])
+
+    def test_donnees_calendrier_et_get_conditionnel(self):
+        demande = self._demande('APPROUVEE')
+        self.client.force_login(self.salarie)
+        url = reverse('paie:api_leave_calendar_data')
+
+        reponse = self.client.get(url, {'annee': 2026, 'mois': 7})
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual([evenement['id'] for evenement in json.loads(reponse.content)['events']], [demande.id])
+
+        reponse = self.client.get(url, {'annee': 2026, 'mois': 7}, HTTP_IF_NONE_MATCH=reponse['ETag'])
+        self.assertEqual(reponse.status_code, 304)
+
+        self.assertEqual(self.client.get(url, {'annee': 2026, 'mois': 13}).status_code, 400)
+
+    def test_abonnement_ics(self):
+        demande = self._demande('APPROUVEE', date.today(), date.today())
+        self.client.force_login(self.salarie)
+        url = reverse('paie:api_leave_calendar_feed_url')
+
+        autre = Department.objects.create(name='Logistique')
+        self.assertEqual(self.client.get(url, {'departement': autre.id}).status_code, 403)
+
+        reponse = self.client.get(url, {'departement': self.departement.id})
+        self.assertEqual(reponse.status_code, 200)
+        adresse = reponse.json()['url']
+
+        self.client.logout()
+        reponse = self.client.get(adresse)
+        self.assertEqual(reponse.status_code, 200)
+        self.assertTrue(reponse['Content-Type'].startswith('text/calendar'))
+        self.assertIn(f'UID:conge-{demande.id}@paie', reponse.content.decode())
+
+        jeton_altere = reverse('paie:leave_calendar_ics', args=['jeton-invalide'])
+        self.assertEqual(self.client.get(jeton_altere).status_code, 404)
+
+    def _adresse_flux(self):
+        self.client.force_login(self.salarie)
+        reponse = self.client.get(reverse('paie:api_leave_calendar_feed_url'), {'departement': self.departement.id})
+        self.client.logout()
+        return reponse.json()['url']
+
+    def test_abonnement_ics_expire(self):
+        adresse = self._adresse_flux()
+        self.assertEqual(self.client.get(adresse).status_code, 200)
+
+        with mock.patch.object(flux_conges, 'DUREE_JETON', -1):
+            self.assertEqual(self.client.get(adresse).status_code, 404)
+
+    def test_abonnement_ics_revoque_au_changement_de_departement(self):
+        adresse = self._adresse_flux()
+        self.assertEqual(self.client.get(adresse).status_code, 200)
+
+        autre = Department.objects.create(name='Qualité')
+        Employee.objects.filter(id=self.employe.id).update(department=autre)
+        self.assertEqual(self.client.get(adresse).status_code, 404)
@@ -187,14 +187,18 @@ urlpatterns += [
     # API Demandes de Congés
     path('api/leave/create/', views.api_create_leave_request, name='api_create_leave_request'),
     path('api/leave/<int:demande_id>/approve/', views.api_approve_leave_request, name='api_approve_leave_request'),
+    path('api/leave/bulk-approve/', views.api_bulk_approve_leave_requests, name='api_bulk_approve_leave_requests'),
     path('api/leave/<int:demande_id>/cancel/', views.api_cancel_leave_request, name='api_cancel_leave_request'),
     
     # API Validation et Calculs
     path('api/leave/validate-dates/', views.api_validate_leave_dates, name='api_validate_leave_dates'),
     path('api/leave/employee/<int:employe_id>/balances/', views.api_employee_balances, name='api_employee_balances'),
+    path('api/leave/balances/<int:solde_id>/adjust/', views.api_adjust_leave_balance, name='api_adjust_leave_balance'),
     
     # API Données Calendrier et Statistiques
     path('api/leave/calendar-data/', views.api_leave_calendar_data, name='api_leave_calendar_data'),
+    path('api/leave/calendar-feed-url/', views.api_leave_calendar_feed_url, name='api_leave_calendar_feed_url'),
+    path('leave/calendar/<str:jeton>.ics', views.leave_calendar_ics, name='leave_calendar_ics'),
     path('api/leave/statistics/', views.api_leave_statistics, name='api_leave_statistics'),
     
     # API Gestion Types de Congés (pour RH)
@@ -206,6 +210,7 @@ urlpatterns += [
     # API Export/Import
     path('api/leave/export/planning/', views.api_export_leave_planning, name='api_export_leave_planning'),
     path('api/leave/export/balances/', views.api_export_leave_balances, name='api_export_leave_balances'),
+    path('api/leave/export/liability/', views.api_export_leave_liability, name='api_export_leave_liability'),
     path('api/leave/import/balances/', views.api_import_leave_balances, name='api_import_leave_balances'),
 ]
 
@@ -283,9 +288,8 @@ urlpatterns += [
          name='api_calculate_daily_hours'),
     
     # API Données Rapports
-    path('api/attendance/reports-data/', 
-    # views.api_attendance_reports_data,  # TODO: implement view
-         name='api_attendance_reports_data'),
+    # path('api/attendance/reports-data/', views.api_attendance_reports_data,
+    #      name='api_attendance_reports_data'),  # TODO: implement view
     
     # API Validation Présences
     path('api/attendance/validate-attendance/', 
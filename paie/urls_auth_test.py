@@ -24,6 +24,14 @@ urlpatterns = [
     path('api/attendance/presence-status/', views.api_get_presence_status, name='api_get_presence_status'),
     path('api/attendance/alertes/', views.api_list_alertes, name='api_alertes_pointage'),
     
+    # APIs congés : traitement en lot, soldes, provision, calendrier et abonnements ICS
+    path('api/leave/bulk-approve/', views.api_bulk_approve_leave_requests, name='api_bulk_approve_leave_requests'),
+    path('api/leave/balances/<int:solde_id>/adjust/', views.api_adjust_leave_balance, name='api_adjust_leave_balance'),
+    path('api/leave/export/liability/', views.api_export_leave_liability, name='api_export_leave_liability'),
+    path('api/leave/calendar-data/', views.api_leave_calendar_data, name='api_leave_calendar_data'),
+    path('api/leave/calendar-feed-url/', views.api_leave_calendar_feed_url, name='api_leave_calendar_feed_url'),
+    path('leave/calendar/<str:jeton>.ics', views.leave_calendar_ics, name='leave_calendar_ics'),
+    
     # SPA Content Routes essentielles (only existing views)
     path('spa/dashboard/', views.spa_dashboard, name='spa_dashboard'),
     path('spa/employees/list/', views.spa_employees_list, name='spa_employees_list'),
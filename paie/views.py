@@ -27,6 +27,8 @@ from .models import (
 from .forms import EmployeeForm, EmployeeSearchForm
 from .services.calculateur_paie import CalculateurPaieMaroc, CalculateurPeriode
 from .services.gestionnaire_conges import GestionnaireConges
+from .services.journal_soldes import ajuster_solde, comptabiliser_transition
+from .services.provision_conges import CalculProvisionConges, get_evolution_provision
 from django.shortcuts import render, get_object_or_404
 from django.http import JsonResponse, HttpResponse
 from django.contrib.auth.decorators import login_required, permission_required
@@ -47,7 +49,13 @@ from .models import (
     PlageHoraire, ReglePointage, ValidationPresence, AlertePresence,
     Department
 )
-from .services.gestionnaire_pointage import GestionnairePointage
+from .services.gestionnaire_pointage import GestionnairePointage, get_parametre_pointage
+from .services.archivage_pointage import ArchiveurPointages
+from .services.prevision_presence import PrevisionPresence
+from .services.optimiseur_plannings import OptimiseurPlannings
+from .services.statistiques_presence import (
+    get_statistiques_departement, get_statistiques_jour, get_tendances
+)
 
 logger = logging.getLogger(__name__)
 
@@ -1727,12 +1735,12 @@ def leave_calendar_content(request):
     annee_suivante = annee if mois < 12 else annee + 1
     
     # Types de congés pour légende
-    types_conges = TypeConge.objects.filter(is_active=True).order_by('ordre_affichage')
+    types_conges = TypeConge.objects.filter(actif=True).order_by('ordre_affichage')
     
     # Départements pour filtre
     departements = Employee.objects.filter(is_active=True).values_list(
         'department__name', flat=True
-    ).distinct().order_by('departement')
+    ).distinct().order_by('department__name')
     
     # Statistiques du mois
     total_jours_conges = sum(
@@ -1755,6 +1763,7 @@ def leave_calendar_content(request):
         'types_conges': types_conges,
         'departements': departements,
         'stats': stats_calendrier,
+        'conflits': planning['conflits'],
         'vue_courante': {
             'mois': mois,
             'annee': annee,
@@ -1794,43 +1803,39 @@ def leave_balances_content(request):
     
     employes = employes.order_by('last_name', 'first_name')
     
-    # Calculer soldes pour tous les employés
     gestionnaire = GestionnaireConges()
-    type_conge_obj = None
+    types_conges_soldes = None
     if type_conge_filtre:
-        type_conge_obj = get_object_or_404(TypeConge, id=type_conge_filtre)
+        types_conges_soldes = [get_object_or_404(TypeConge, id=type_conge_filtre)]
     
-    soldes_employes = []
-    total_acquis = 0
-    total_pris = 0
-    total_restants = 0
+    # Soldes manquants ouverts en un lot pour tous les employés filtrés :
+    # totaux et alertes portent alors sur le même ensemble que nb_employes
+    gestionnaire.ouvrir_soldes_manquants(annee, employes, types_conges_soldes)
     
-    for employe in employes:
-        try:
-            soldes = gestionnaire.calculer_soldes_employe(employe, annee, type_conge_obj)
-            
-            employe_soldes = {
-                'employe': employe,
-                'soldes': soldes,
-                'total_acquis': sum(s['jours_acquis'] for s in soldes.values()),
-                'total_pris': sum(s['jours_pris'] for s in soldes.values()),
-                'total_restants': sum(s['jours_restants'] for s in soldes.values()),
-            }
-            
-            soldes_employes.append(employe_soldes)
-            
-            total_acquis += employe_soldes['total_acquis']
-            total_pris += employe_soldes['total_pris'] 
-            total_restants += employe_soldes['total_restants']
-            
-        except Exception as e:
-            logger.warning(f"Erreur calcul solde {employe}: {e}")
-    
-    # Pagination
-    paginator = Paginator(soldes_employes, 20)
+    # Pagination sur les employés : seuls ceux de la page sont formatés
+    paginator = Paginator(employes, 20)
     page = request.GET.get('page', 1)
     soldes_page = paginator.get_page(page)
     
+    employes_page = list(soldes_page.object_list)
+    soldes_par_employe = gestionnaire.get_soldes_lot(
+        annee,
+        Employee.objects.filter(id__in=[employe.id for employe in employes_page]),
+        types_conges_soldes
+    )
+    
+    lignes = []
+    for employe in employes_page:
+        soldes = soldes_par_employe[employe.id]
+        lignes.append({
+            'employe': employe,
+            'soldes': soldes,
+            'total_acquis': sum(s['jours_acquis'] for s in soldes.values()),
+            'total_pris': sum(s['jours_pris'] for s in soldes.values()),
+            'total_restants': sum(s['jours_restants'] for s in soldes.values()),
+        })
+    soldes_page.object_list = lignes
+    
     # Données pour filtres
     departements = Employee.objects.filter(is_active=True).values_list(
         'department__name', flat=True
@@ -1838,8 +1843,13 @@ def leave_balances_content(request):
     
     types_conges = TypeConge.objects.filter(actif=True).order_by('ordre_affichage')
     
-    # Statistiques globales
-    nb_employes = len(soldes_employes)
+    # Statistiques globales, sur les soldes de tous les employés filtrés
+    totaux = gestionnaire.get_totaux_soldes(annee, employes, types_conges_soldes)
+    total_acquis = totaux['total_acquis']
+    total_pris = totaux['total_pris']
+    total_restants = totaux['total_restants']
+    
+    nb_employes = paginator.count
     stats_globales = {
         'nb_employes': nb_employes,
         'total_acquis': round(total_acquis, 1),
@@ -1850,20 +1860,15 @@ def leave_balances_content(request):
         'taux_utilisation': round(total_pris / max(total_acquis, 1) * 100, 1),
     }
     
-    # Alertes
-    alertes = []
-    for solde_emp in soldes_employes:
-        if solde_emp['total_restants'] < 0:
-            alertes.append(f"{solde_emp['employe']} a un solde négatif")
-        elif solde_emp['total_restants'] > 30:
-            alertes.append(f"{solde_emp['employe']} a beaucoup de congés non pris")
+    # Alertes (jours restants toujours positifs : seul le cumul excessif est signalé)
+    alertes = gestionnaire.get_alertes_soldes(annee, employes, types_conges_soldes)
     
     context = {
         'soldes_employes': soldes_page,
         'departements': departements,
         'types_conges': types_conges,
         'stats': stats_globales,
-        'alertes': alertes[:10],  # Max 10 alertes
+        'alertes': alertes,
         'filters': {
             'annee': annee,
             'departement': departement_filtre,
@@ -2203,6 +2208,50 @@ def api_approve_leave_request(request, demande_id):
             'error': f'Erreur système: {str(e)}'
         }, status=500)
 
+@login_required
+@require_http_methods(["POST"])
+def api_bulk_approve_leave_requests(request):
+    """API - Approuver ou refuser plusieurs demandes de congé"""
+    
+    try:
+        data = json.loads(request.body)
+        action = data.get('action')  # 'approve' ou 'reject'
+        demande_ids = data.get('demande_ids')
+        commentaire = data.get('commentaire', '')
+        
+        if (action not in ('approve', 'reject') or not isinstance(demande_ids, list) or not demande_ids
+                or not all(isinstance(demande_id, int) for demande_id in demande_ids)):
+            return JsonResponse({
+                'success': False,
+                'error': 'Paramètres invalides'
+            }, status=400)
+        
+        # Déterminer le rôle
+        role = 'RH' if request.user.is_staff else 'MANAGER'
+        
+        resultat = GestionnaireConges().traiter_demandes_lot(
+            demande_ids, action, request.user, commentaire, role
+        )
+        
+        return JsonResponse({
+            'success': True,
+            'traitees': resultat['traitees'],
+            'erreurs': resultat['erreurs'],
+            'resultats': resultat['resultats']
+        })
+        
+    except json.JSONDecodeError:
+        return JsonResponse({
+            'success': False,
+            'error': 'Paramètres invalides'
+        }, status=400)
+    except Exception as e:
+        logger.error(f"Erreur traitement en lot des demandes de congé: {e}")
+        return JsonResponse({
+            'success': False,
+            'error': f'Erreur système: {str(e)}'
+        }, status=500)
+
 @login_required
 @require_http_methods(["DELETE"])
 def api_cancel_leave_request(request, demande_id):
@@ -2229,6 +2278,9 @@ def api_cancel_leave_request(request, demande_id):
         demande.statut = 'ANNULEE'
         demande.save()
         
+        # Restituer les jours d'une demande déjà approuvée
+        comptabiliser_transition(demande, ancien_statut, request.user)
+        
         # Enregistrer l'action
         ApprobationConge.objects.create(
             demande=demande,
@@ -2255,77 +2307,10 @@ def api_cancel_leave_request(request, demande_id):
 @require_http_methods(["GET"])
 def api_leave_statistics(request):
     """API - Statistiques du module congés"""
+    from .services.statistiques_conges import get_statistiques_conges
     
     try:
-        # Période de référence
-        annee_courante = datetime.now().year
-        mois_courant = datetime.now().month
-        
-        # Statistiques générales
-        stats = {
-            'demandes_total': DemandeConge.objects.count(),
-            'demandes_en_attente': DemandeConge.objects.filter(
-                statut__in=['SOUMISE', 'EN_ATTENTE_MANAGER', 'EN_ATTENTE_RH']
-            ).count(),
-            'demandes_mois': DemandeConge.objects.filter(
-                date_creation__year=annee_courante,
-                date_creation__month=mois_courant
-            ).count(),
-            'taux_approbation': 0,
-        }
-        
-        # Calcul taux d'approbation
-        total_traitees = DemandeConge.objects.filter(
-            statut__in=['APPROUVEE', 'REFUSEE']
-        ).count()
-        
-        if total_traitees > 0:
-            approuvees = DemandeConge.objects.filter(statut='APPROUVEE').count()
-            stats['taux_approbation'] = round(approuvees / total_traitees * 100, 1)
-        
-        # Évolution sur 6 derniers mois
-        from django.db.models.functions import TruncMonth
-        
-        six_months_ago = date.today() - timedelta(days=180)
-        evolution = DemandeConge.objects.filter(
-            date_creation__gte=six_months_ago
-        ).annotate(
-            mois=TruncMonth('date_creation')
-        ).values('mois').annotate(
-            nombre_demandes=Count('id'),
-            approuvees=Count('id', filter=Q(statut='APPROUVEE')),
-            refusees=Count('id', filter=Q(statut='REFUSEE'))
-        ).order_by('mois')
-        
-        stats['evolution'] = [
-            {
-                'mois': item['mois'].strftime('%Y-%m'),
-                'demandes': item['nombre_demandes'],
-                'approuvees': item['approuvees'],
-                'refusees': item['refusees'],
-            }
-            for item in evolution
-        ]
-        
-        # Top types de congés
-        top_types = DemandeConge.objects.filter(
-            date_creation__year=annee_courante
-        ).values(
-            'type_conge__libelle', 'type_conge__couleur_affichage'
-        ).annotate(
-            count=Count('id')
-        ).order_by('-count')[:5]
-        
-        stats['top_types_conges'] = [
-            {
-                'type': item['type_conge__libelle'],
-                'couleur': item['type_conge__couleur_affichage'],
-                'count': item['count']
-            }
-            for item in top_types
-        ]
-        
-        return JsonResponse(stats)
+        return JsonResponse(get_statistiques_conges())
         
     except Exception as e:
         logger.error(f"Erreur statistiques congés: {e}")
@@ -2333,66 +2318,126 @@ def api_leave_statistics(request):
             'error': f'Erreur système: {str(e)}'
         }, status=500)
 
+def _acces_flux_calendrier(utilisateur, departement_id, employe_id):
+    """Hors RH : son propre calendrier ou celui de son département"""
+    if utilisateur.is_staff:
+        return True
+    profil = getattr(utilisateur, 'profile', None)
+    employe = profil.employee if profil else None
+    return employe is not None and employe.is_active and (
+        employe_id is None or employe_id == employe.id
+    ) and (
+        departement_id is None or departement_id == employe.department_id
+    )
+
+def _reponse_conditionnelle(request, page, content_type):
+    """Réponse 304 quand le client possède déjà cette version (ETag / Last-Modified)"""
+    from django.utils.cache import get_conditional_response
+    from django.utils.http import http_date
+    
+    derniere_modification = int(page.derniere_modification.timestamp())
+    response = get_conditional_response(request, etag=page.etag, last_modified=derniere_modification)
+    if response is None:
+        response = HttpResponse(page.contenu, content_type=content_type)
+    response['ETag'] = page.etag
+    response['Last-Modified'] = http_date(derniere_modification)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
 @login_required
 @require_http_methods(["GET"])
 def api_leave_calendar_data(request):
-    """API - Données du calendrier des congés"""
+    """API - Données du calendrier des congés (mises en cache par département et mois)"""
+    from .services.flux_conges import get_evenements_mois
     
     try:
         # Paramètres
-        mois = int(request.GET.get('mois', datetime.now().month))
-        annee = int(request.GET.get('annee', datetime.now().year))
-        departement = request.GET.get('departement')
+        try:
+            mois = int(request.GET.get('mois', datetime.now().month))
+            annee = int(request.GET.get('annee', datetime.now().year))
+            departement = request.GET.get('departement')
+            departement_id = int(departement) if departement else None
+            date(annee, mois, 1)
+        except ValueError:
+            return JsonResponse({'success': False, 'message': 'Paramètres invalides'}, status=400)
+        
+        page = get_evenements_mois(departement_id, annee, mois)
+        return _reponse_conditionnelle(request, page, 'application/json')
         
-        # Dates du mois
-        date_debut = date(annee, mois, 1)
-        if mois == 12:
-            date_fin = date(annee + 1, 1, 1) - timedelta(days=1)
+    except Exception as e:
+        logger.error(f"Erreur données calendrier: {e}")
+        return JsonResponse({
+            'success': False,
+            'error': f'Erreur système: {str(e)}'
+        }, status=500)
+
+@login_required
+@require_http_methods(["GET"])
+def api_leave_calendar_feed_url(request):
+    """API - Adresse d'abonnement ICS (Outlook, Google) d'un département ou d'un employé"""
+    from django.urls import reverse
+    from .services.flux_conges import signer_flux
+    
+    try:
+        try:
+            departement_id = int(request.GET['departement']) if request.GET.get('departement') else None
+            employe_id = int(request.GET['employe']) if request.GET.get('employe') else None
+        except ValueError:
+            return JsonResponse({'success': False, 'message': 'Paramètres invalides'}, status=400)
+        if (departement_id is None) == (employe_id is None):
+            return JsonResponse({'success': False, 'message': 'Paramètres invalides'}, status=400)
+        
+        if not _acces_flux_calendrier(request.user, departement_id, employe_id):
+            return JsonResponse({'success': False, 'message': 'Permissions insuffisantes'}, status=403)
+        
+        if departement_id is not None:
+            existe = Department.objects.filter(id=departement_id).exists()
         else:
-            date_fin = date(annee, mois + 1, 1) - timedelta(days=1)
-        
-        # Congés du mois
-        conges_query = DemandeConge.objects.filter(
-            statut__in=['APPROUVEE', 'EN_COURS'],
-            date_fin__gte=date_debut,
-            date_debut__lte=date_fin
-        ).select_related('employe', 'type_conge')
-        
-        if departement:
-            conges_query = conges_query.filter(employe__department=departement)
-        
-        # Formater pour le calendrier
-        events = []
-        for conge in conges_query:
-            events.append({
-                'id': conge.id,
-                'title': f"{conge.employe.nom} - {conge.type_conge.libelle}",
-                'start': conge.date_debut.isoformat(),
-                'end': (conge.date_fin + timedelta(days=1)).isoformat(),  # FullCalendar end is exclusive
-                'backgroundColor': conge.type_conge.couleur_affichage,
-                'borderColor': conge.type_conge.couleur_affichage,
-                'extendedProps': {
-                    'employe': f"{conge.employe.nom} {conge.employe.prenom}",
-                    'type_conge': conge.type_conge.libelle,
-                    'nb_jours': float(conge.nb_jours_ouvrables),
-                    'statut': conge.get_statut_display(),
-                    'motif': conge.motif,
-                }
-            })
+            existe = Employee.objects.filter(id=employe_id, is_active=True).exists()
+        if not existe:
+            return JsonResponse({'success': False, 'message': 'Calendrier introuvable'}, status=404)
         
+        jeton = signer_flux(request.user.id, departement_id=departement_id, employe_id=employe_id)
         return JsonResponse({
             'success': True,
-            'events': events,
-            'periode': f"{mois:02d}/{annee}"
+            'url': request.build_absolute_uri(reverse('paie:leave_calendar_ics', args=[jeton]))
         })
         
     except Exception as e:
-        logger.error(f"Erreur données calendrier: {e}")
+        logger.error(f"Erreur adresse flux calendrier: {e}")
         return JsonResponse({
             'success': False,
             'error': f'Erreur système: {str(e)}'
         }, status=500)
 
+@require_http_methods(["GET"])
+def leave_calendar_ics(request, jeton):
+    """Flux ICS des congés, accessible par jeton signé (les clients calendrier n'ont pas de session)"""
+    from django.http import Http404
+    from .services.flux_conges import get_flux_ics_departement, get_flux_ics_employe, lire_jeton
+    
+    # Jeton expiré, ou droits retirés au titulaire depuis sa délivrance
+    flux = lire_jeton(jeton)
+    titulaire = flux and User.objects.select_related('profile__employee').filter(
+        id=flux.get('utilisateur'), is_active=True
+    ).first()
+    if titulaire is None or not _acces_flux_calendrier(titulaire, flux.get('departement'), flux.get('employe')):
+        raise Http404("Flux calendrier inconnu")
+    
+    if flux.get('employe') is not None:
+        employe = get_object_or_404(
+            Employee.objects.only('id', 'first_name', 'last_name', 'department_id'),
+            id=flux['employe'], is_active=True
+        )
+        page = get_flux_ics_employe(employe)
+    else:
+        departement = get_object_or_404(Department, id=flux.get('departement'))
+        page = get_flux_ics_departement(departement.id, departement.name)
+    
+    response = _reponse_conditionnelle(request, page, 'text/calendar; charset=utf-8')
+    response['Content-Disposition'] = 'inline; filename="conges.ics"'
+    return response
+
 @login_required
 @require_http_methods(["GET"])
 def api_employee_balances(request, employe_id):
@@ -2440,6 +2485,51 @@ def api_employee_balances(request, employe_id):
             'error': f'Erreur système: {str(e)}'
         }, status=500)
 
+@login_required
+@require_http_methods(["POST"])
+def api_adjust_leave_balance(request, solde_id):
+    """API - Ajustement manuel d'un solde (RH), tracé au journal des mouvements"""
+    
+    if not request.user.is_staff:
+        return JsonResponse({
+            'success': False,
+            'error': 'Permissions insuffisantes'
+        }, status=403)
+    
+    try:
+        data = json.loads(request.body)
+        jours = Decimal(str(data.get('jours'))).quantize(Decimal('0.01'))
+        motif = str(data.get('motif') or '').strip()
+        if not jours or not motif or abs(jours) >= 1000:
+            raise ValueError(jours)
+    except (json.JSONDecodeError, ArithmeticError, ValueError):
+        return JsonResponse({
+            'success': False,
+            'error': 'Paramètres invalides'
+        }, status=400)
+    
+    solde = get_object_or_404(SoldeConge, id=solde_id)
+    try:
+        ajuster_solde(solde, jours, motif, user=request.user)
+        solde.refresh_from_db()
+        
+        return JsonResponse({
+            'success': True,
+            'solde': {
+                'id': solde.id,
+                'ajustement_manuel': float(solde.ajustement_manuel),
+                'jours_restants': float(solde.jours_restants),
+                'motif_ajustement': solde.motif_ajustement,
+            }
+        })
+        
+    except Exception as e:
+        logger.error(f"Erreur ajustement solde {solde_id}: {e}")
+        return JsonResponse({
+            'success': False,
+            'error': f'Erreur système: {str(e)}'
+        }, status=500)
+
 @login_required
 @require_http_methods(["POST"])
 def api_validate_leave_dates(request):
@@ -2451,8 +2541,22 @@ def api_validate_leave_dates(request):
         employe_id = data.get('employe_id')
         employe = get_object_or_404(Employee, id=employe_id, is_active=True)
         
+        try:
+            demande_data = {
+                **data,
+                'date_debut': datetime.strptime(data['date_debut'], '%Y-%m-%d').date(),
+                'date_fin': datetime.strptime(data['date_fin'], '%Y-%m-%d').date(),
+                'type_conge': TypeConge.objects.get(id=data.get('type_conge_id') or data.get('type_conge')),
+            }
+        except (KeyError, TypeError, ValueError, TypeConge.DoesNotExist):
+            return JsonResponse({
+                'valide': False,
+                'erreurs': ['Paramètres invalides'],
+                'warnings': []
+            }, status=400)
+        
         gestionnaire = GestionnaireConges()
-        validation = gestionnaire.valider_demande_conge(data, employe, request.user)
+        validation = gestionnaire.valider_demande_conge(demande_data, employe, request.user)
         
         return JsonResponse(validation)
         
@@ -3106,6 +3210,86 @@ def api_export_leave_balances(request):
     """API - Exporter soldes congés"""
     return JsonResponse({'success': True, 'export': 'data'})
 
+@login_required
+@require_http_methods(["GET"])
+def api_export_leave_liability(request):
+    """
+    API - Provision pour congés payés arrêtée à la fin d'un mois
+
+    format=csv (défaut) ou xlsx : détail par employé, écrit en flux ;
+    format=json : totaux par département et par site, et évolution des instantanés
+    """
+    if not request.user.is_staff:
+        return JsonResponse({
+            'success': False,
+            'message': 'Permissions insuffisantes'
+        }, status=403)
+    
+    try:
+        aujourd_hui = date.today()
+        annee = int(request.GET.get('annee', aujourd_hui.year))
+        mois = int(request.GET.get('mois', aujourd_hui.month))
+        format_export = request.GET.get('format', 'csv')
+        if not 1 <= mois <= 12 or format_export not in ('csv', 'xlsx', 'json'):
+            raise ValueError(format_export)
+    except ValueError:
+        return JsonResponse({
+            'success': False,
+            'message': 'Paramètres invalides'
+        }, status=400)
+    
+    try:
+        calcul = CalculProvisionConges(annee, mois).calculer()
+        nom_fichier = f"provision_conges_{annee}_{mois:02d}"
+        
+        if format_export == 'json':
+            return JsonResponse({
+                'success': True,
+                'date_arrete': calcul.date_arrete.isoformat(),
+                'total': calcul.total(),
+                'par_departement': calcul.totaux_par('departement'),
+                'par_site': calcul.totaux_par('site'),
+                'evolution': get_evolution_provision(),
+            })
+        
+        if format_export == 'csv':
+            import csv
+            from django.http import StreamingHttpResponse
+            
+            class Tampon:
+                def write(self, valeur):
+                    return valeur
+            
+            ecrivain = csv.writer(Tampon(), delimiter=';')
+            response = StreamingHttpResponse(
+                (ecrivain.writerow(ligne) for ligne in calcul.lignes_export()),
+                content_type='text/csv; charset=utf-8'
+            )
+            response['Content-Disposition'] = f'attachment; filename="{nom_fichier}.csv"'
+            return response
+        
+        # Classeur en écriture seule : les lignes sont sérialisées au fil de l'eau
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet(title=f"Provision {mois:02d}-{annee}")
+        for ligne in calcul.lignes_export():
+            ws.append(ligne)
+        
+        buffer = io.BytesIO()
+        wb.save(buffer)
+        response = HttpResponse(
+            buffer.getvalue(),
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+        response['Content-Disposition'] = f'attachment; filename="{nom_fichier}.xlsx"'
+        return response
+        
+    except Exception as e:
+        logger.error(f"Erreur dans api_export_leave_liability: {e}")
+        return JsonResponse({
+            'success': False,
+            'message': f'Erreur serveur: {str(e)}'
+        }, status=500)
+
 @login_required
 @require_http_methods(["POST"])
 def api_import_leave_balances(request):
@@ -3585,9 +3769,14 @@ def attendance_reports_content(request):
                     'employes': []
                 }
                 
-                for emp in employes_query:
-                    heures_sup = gestionnaire.calculer_heures_supplementaires(emp, date_debut, date_fin)
-                    if heures_sup['heures_sup_total'].total_seconds() > 0:
+                employes_rapport = employes_query.order_by('last_name', 'first_name')
+                heures_sup_par_employe = gestionnaire.calculer_heures_sup_lot(
+                    employes_rapport, date_debut, date_fin
+                )
+                
+                for emp in employes_rapport:
+                    heures_sup = heures_sup_par_employe.get(emp.id)
+                    if heures_sup and heures_sup['heures_sup_total'].total_seconds() > 0:
                         rapport_data['employes'].append({
                             'employe': emp,
                             'heures_sup': heures_sup
@@ -3980,7 +4169,7 @@ def api_attendance_reports_data(request):
                         'nom': emp_data['employe'].nom,
                         'prenom': emp_data['employe'].prenom,
                         'matricule': emp_data['employe'].matricule,
-                        'departement': emp_data['employe'].departement.nom if emp_data['employe'].departement else ''
+                        'departement': emp_data['employe'].department.name if emp_data['employe'].department else ''
                     },
                     'statistiques': emp_data['statistiques'],
                     'presences': [
@@ -4008,7 +4197,7 @@ def api_attendance_reports_data(request):
                 'statistiques': {
                     'total_employes': data['total_employes'],
                     'nb_presents': data['nb_presents'],
-                    'nb_absents': data['nb_absents'],
+                    'nb_absents': data['nb_absences'],
                     'nb_retards': data['nb_retards']
                 },
                 'retards': [
@@ -4081,7 +4270,8 @@ def api_validate_attendance(request):
         result = gestionnaire.valider_presence_journaliere(
             date_validation=date_validation,
             validee_par_id=request.user.id,
-            employes_ids=employes_ids if employes_ids else None
+            employes_ids=employes_ids if employes_ids else None,
+            mode_lot=True
         )
         
         return JsonResponse(result)
@@ -4290,9 +4480,11 @@ def export_attendance_pdf(request):
         date_fin = datetime.strptime(request.GET.get('date_fin', date.today().strftime('%Y-%m-%d')), '%Y-%m-%d').date()
         departement_id = request.GET.get('departement_id')
         
-        # Générer les données
+        # Générer les données (compteurs agrégés uniquement)
         gestionnaire = GestionnairePointage()
-        data = gestionnaire.generer_feuille_presence(date_debut, date_fin, departement_id)
+        data = gestionnaire.generer_feuille_presence(
+            date_debut, date_fin, departement_id, inclure_details=False
+        )
         
         # Créer le PDF
         buffer = io.BytesIO()
@@ -4422,9 +4614,11 @@ def export_attendance_excel(request):
         date_fin = datetime.strptime(request.GET.get('date_fin', date.today().strftime('%Y-%m-%d')), '%Y-%m-%d').date()
         departement_id = request.GET.get('departement_id')
         
-        # Générer les données
+        # Générer les données (compteurs agrégés, le détail est lu en flux plus bas)
         gestionnaire = GestionnairePointage()
-        data = gestionnaire.generer_feuille_presence(date_debut, date_fin, departement_id)
+        data = gestionnaire.generer_feuille_presence(
+            date_debut, date_fin, departement_id, inclure_details=False
+        )
         
         # Créer le fichier Excel
         wb = openpyxl.Workbook()
@@ -4450,7 +4644,7 @@ def export_attendance_excel(request):
             ws.cell(row=row, column=1, value=employe.nom)
             ws.cell(row=row, column=2, value=employe.prenom)
             ws.cell(row=row, column=3, value=employe.matricule)
-            ws.cell(row=row, column=4, value=employe.departement.nom if employe.departement else '')
+            ws.cell(row=row, column=4, value=employe.department.name if employe.department else '')
             ws.cell(row=row, column=5, value=stats['nb_presences'])
             ws.cell(row=row, column=6, value=stats['nb_absences'])
             ws.cell(row=row, column=7, value=stats['nb_retards'])
@@ -4469,6 +4663,29 @@ def export_attendance_excel(request):
             adjusted_width = min(max_length + 2, 50)
             ws.column_dimensions[column_letter].width = adjusted_width
         
+        # Feuille de détail alimentée en flux, ligne par ligne
+        ws_detail = wb.create_sheet("Détail")
+        headers_detail = ['Nom', 'Prénom', 'Matricule', 'Date', 'Statut', 'Arrivée', 'Sortie',
+                          'Heures travaillées', 'Retard (min)', 'Départ anticipé (min)']
+        ws_detail.append(headers_detail)
+        for cell in ws_detail[1]:
+            cell.font = header_font
+            cell.fill = header_fill
+        
+        for ligne in gestionnaire.iterer_lignes_presence(date_debut, date_fin, departement_id):
+            ws_detail.append([
+                ligne['employe__last_name'],
+                ligne['employe__first_name'],
+                ligne['employe__matricule'],
+                ligne['date'].strftime('%d/%m/%Y'),
+                ligne['statut_jour'],
+                timezone.localtime(ligne['heure_arrivee']).strftime('%H:%M') if ligne['heure_arrivee'] else '',
+                timezone.localtime(ligne['heure_sortie']).strftime('%H:%M') if ligne['heure_sortie'] else '',
+                str(ligne['heures_travaillees']),
+                ligne['retard_minutes'],
+                ligne['depart_anticipe_minutes'],
+            ])
+        
         # Sauvegarder dans un buffer
         buffer = io.BytesIO()
         wb.save(buffer)
@@ -4933,13 +5150,16 @@ def api_daily_stats(request):
             'employes_presents': statut_temps_reel['statistiques']['nb_presents'],
             'employes_absents': statut_temps_reel['statistiques']['nb_absents'],
             'employes_en_pause': statut_temps_reel['statistiques']['nb_en_pause'],
-            'total_employes': statut_temps_reel['statistiques']['total_employes'],
+            'total_employes': statut_temps_reel['total_employes'],
             'taux_presence': round(
                 (statut_temps_reel['statistiques']['nb_presents'] / 
-                 max(statut_temps_reel['statistiques']['total_employes'], 1)) * 100, 1
+                 max(statut_temps_reel['total_employes'], 1)) * 100, 1
             ),
         }
         
+        # Retards et heures de la journée, lus sur les agrégats quotidiens
+        stats['journee'] = get_statistiques_jour(aujourd_hui)
+        
         # Ajouter les alertes du jour
         alertes_jour = AlertePresence.objects.filter(
             date_concernee=aujourd_hui
@@ -4974,9 +5194,17 @@ def api_employee_stats(request, employe_id):
         date_fin = date.today()
         date_debut = date_fin - timedelta(days=30)
         
-        presences = PresenceJournaliere.objects.filter(
+        # Un seul agrégat sur les présences de la période
+        totaux = PresenceJournaliere.objects.filter(
             employe=employe,
             date__range=[date_debut, date_fin]
+        ).aggregate(
+            total=Count('id'),
+            presents=Count('id', filter=Q(statut_jour='PRESENT')),
+            absents=Count('id', filter=Q(statut_jour='ABSENT')),
+            retards=Count('id', filter=Q(retard_minutes__gt=0)),
+            heures_travaillees=Sum('heures_travaillees'),
+            heures_supplementaires=Sum('heures_supplementaires')
         )
         
         stats = {
@@ -4992,24 +5220,23 @@ def api_employee_stats(request, employe_id):
                 'nb_jours': (date_fin - date_debut).days + 1
             },
             'presences': {
-                'total': presences.count(),
-                'presents': presences.filter(statut_jour='PRESENT').count(),
-                'absents': presences.filter(statut_jour='ABSENT').count(),
-                'retards': presences.filter(retard_minutes__gt=0).count(),
+                'total': totaux['total'],
+                'presents': totaux['presents'],
+                'absents': totaux['absents'],
+                'retards': totaux['retards'],
                 'taux_presence': round(
-                    (presences.filter(statut_jour='PRESENT').count() / 
-                     max(presences.count(), 1)) * 100, 1
+                    (totaux['presents'] / max(totaux['total'], 1)) * 100, 1
                 )
             },
             'heures': {
-                'total_travaillees': sum(
-                    p.heures_travaillees.total_seconds() / 3600 
-                    for p in presences if p.heures_travaillees
+                'total_travaillees': (
+                    totaux['heures_travaillees'].total_seconds() / 3600
+                    if totaux['heures_travaillees'] else 0
                 ),
                 'moyenne_par_jour': 0,
-                'heures_supplementaires': sum(
-                    p.heures_supplementaires.total_seconds() / 3600 
-                    for p in presences if p.heures_supplementaires
+                'heures_supplementaires': (
+                    totaux['heures_supplementaires'].total_seconds() / 3600
+                    if totaux['heures_supplementaires'] else 0
                 )
             }
         }
@@ -5037,20 +5264,87 @@ def api_employee_stats(request, employe_id):
 @login_required
 @require_http_methods(["GET"])
 def api_department_stats(request, departement_id):
-    """API - Statistiques d'un département"""
-    return JsonResponse({
-        'success': True,
-        'stats': {'message': 'Statistiques département - fonction à implémenter'}
-    })
+    """API - Statistiques d'un département (30 derniers jours par défaut)"""
+    departement = get_object_or_404(Department, id=departement_id)
+
+    try:
+        date_fin = request.GET.get('date_fin')
+        date_fin = datetime.strptime(date_fin, '%Y-%m-%d').date() if date_fin else date.today()
+        date_debut = request.GET.get('date_debut')
+        date_debut = (datetime.strptime(date_debut, '%Y-%m-%d').date() if date_debut
+                      else date_fin - timedelta(days=30))
+    except ValueError:
+        return JsonResponse({
+            'success': False,
+            'message': 'Paramètres invalides'
+        }, status=400)
+
+    try:
+        stats = get_statistiques_departement(departement.id, date_debut, date_fin)
+
+        return JsonResponse({
+            'success': True,
+            'stats': {
+                'departement': {
+                    'id': departement.id,
+                    'nom': departement.name,
+                },
+                'periode': {
+                    'debut': date_debut.isoformat(),
+                    'fin': date_fin.isoformat(),
+                    'nb_jours': (date_fin - date_debut).days + 1
+                },
+                **stats
+            }
+        })
+
+    except Exception as e:
+        logger.error(f"Erreur dans api_department_stats: {e}")
+        return JsonResponse({
+            'success': False,
+            'message': f'Erreur serveur: {str(e)}'
+        }, status=500)
 
 
 @login_required
 @require_http_methods(["GET"])
 def api_attendance_trends(request):
-    """API - Tendances sur période"""
+    """API - Tendances sur période (par jour, semaine ou mois ; 90 derniers jours par défaut)"""
+    try:
+        date_fin = request.GET.get('date_fin')
+        date_fin = datetime.strptime(date_fin, '%Y-%m-%d').date() if date_fin else date.today()
+        date_debut = request.GET.get('date_debut')
+        date_debut = (datetime.strptime(date_debut, '%Y-%m-%d').date() if date_debut
+                      else date_fin - timedelta(days=90))
+        granularite = request.GET.get('granularite', 'semaine')
+        departement_id = request.GET.get('departement_id')
+        departement_id = int(departement_id) if departement_id else None
+        site_id = request.GET.get('site_id')
+        site_id = int(site_id) if site_id else None
+
+        tendances = get_tendances(date_debut, date_fin, granularite, departement_id, site_id)
+    except ValueError:
+        return JsonResponse({
+            'success': False,
+            'message': 'Paramètres invalides'
+        }, status=400)
+    except Exception as e:
+        logger.error(f"Erreur dans api_attendance_trends: {e}")
+        return JsonResponse({
+            'success': False,
+            'message': f'Erreur serveur: {str(e)}'
+        }, status=500)
+
     return JsonResponse({
         'success': True,
-        'trends': {'message': 'Tendances présence - fonction à implémenter'}
+        'trends': {
+            'date_debut': date_debut.isoformat(),
+            'date_fin': date_fin.isoformat(),
+            'granularite': granularite,
+            'departement_id': departement_id,
+            'site_id': site_id,
+            'periodes': tendances
+        }
     })
 
 
@@ -5077,11 +5371,48 @@ def api_bulk_import_pointages(request):
 @login_required
 @require_http_methods(["POST"])
 def api_cleanup_old_data(request):
-    """API - Nettoyage des données anciennes"""
-    return JsonResponse({
-        'success': True,
-        'message': 'Nettoyage données - fonction à implémenter'
-    })
+    """
+    API - Nettoyage des données anciennes (archivage des pointages hors rétention)
+
+    Simulation uniquement : l'archivage de plusieurs mois ne tient pas dans le
+    temps d'une requête HTTP et s'exécute par la commande archiver_pointages.
+    """
+    if not request.user.is_staff:
+        return JsonResponse({
+            'success': False,
+            'message': 'Permissions insuffisantes'
+        }, status=403)
+    
+    try:
+        data = json.loads(request.body) if request.body else {}
+        horizon_mois = data.get('horizon_mois')
+        if horizon_mois is not None:
+            horizon_mois = int(horizon_mois)
+            if horizon_mois < 1:
+                raise ValueError
+        
+        resultat = ArchiveurPointages().archiver(horizon_mois=horizon_mois, simulation=True)
+        commande = f"python manage.py archiver_pointages --horizon-mois {resultat['horizon_mois']}"
+        nb_pointages = sum(mois['nb_pointages'] for mois in resultat['mois'])
+        
+        return JsonResponse({
+            'success': True,
+            'message': f"{nb_pointages} pointages à archiver, à lancer par : {commande}",
+            'commande': commande,
+            'data': resultat
+        })
+        
+    except (json.JSONDecodeError, ValueError, TypeError):
+        return JsonResponse({
+            'success': False,
+            'message': 'Paramètres invalides'
+        }, status=400)
+    except Exception as e:
+        logger.error(f"Erreur dans api_cleanup_old_data: {e}")
+        return JsonResponse({
+            'success': False,
+            'message': f'Erreur serveur: {str(e)}'
+        }, status=500)
 
 
 @login_required
@@ -5155,18 +5486,86 @@ def api_schedule_planning(request):
 @login_required
 @require_http_methods(["GET"])
 def api_attendance_forecast(request):
-    """API - Prévisions de présence"""
-    return JsonResponse({
-        'success': True,
-        'forecast': {'message': 'Prévisions présence - fonction à implémenter'}
-    })
+    """API - Prévisions de présence et de retards par département"""
+    try:
+        nb_jours = int(request.GET.get('jours', 14))
+        departement_id = request.GET.get('departement_id')
+        departement_id = int(departement_id) if departement_id else None
+    except ValueError:
+        return JsonResponse({
+            'success': False,
+            'message': 'Paramètres invalides'
+        }, status=400)
+    
+    try:
+        nb_jours = max(1, min(nb_jours, get_parametre_pointage('PREVISION_HORIZON_MAX_JOURS')))
+        forecast = PrevisionPresence().get_previsions(nb_jours, departement_id)
+        
+        return JsonResponse({
+            'success': True,
+            'forecast': forecast
+        })
+        
+    except Exception as e:
+        logger.error(f"Erreur dans api_attendance_forecast: {e}")
+        return JsonResponse({
+            'success': False,
+            'message': f'Erreur serveur: {str(e)}'
+        }, status=500)
 
 
 @login_required
-@require_http_methods(["GET"])
+@require_http_methods(["GET", "POST"])
 def api_optimize_schedules(request):
-    """API - Optimisation des plannings"""
-    return JsonResponse({
-        'success': True,
-        'optimization': {'message': 'Optimisation plannings - fonction à implémenter'}
-    })
\ No newline at end of file
+    """
+    API - Optimisation des plannings d'un mois
+
+    GET : simulation (annee, mois, departement_id en paramètres)
+    POST : corps JSON avec en plus la couverture
+    ({departement_id: {plage_horaire_id: nb_minimum}}), les plages candidates
+    et appliquer=true pour enregistrer les affectations
+    """
+    if not request.user.is_staff:
+        return JsonResponse({
+            'success': False,
+            'message': 'Permissions insuffisantes'
+        }, status=403)
+    
+    try:
+        if request.method == 'POST':
+            data = json.loads(request.body) if request.body else {}
+        else:
+            data = request.GET
+        
+        aujourd_hui = date.today()
+        departement_id = data.get('departement_id')
+        plages_ids = data.get('plages_ids') if request.method == 'POST' else None
+        
+        optimiseur = OptimiseurPlannings(
+            annee=int(data.get('annee', aujourd_hui.year)),
+            mois=int(data.get('mois', aujourd_hui.month)),
+            couverture=data.get('couverture') if request.method == 'POST' else None,
+            departement_id=int(departement_id) if departement_id else None,
+            plages_ids=[int(p) for p in plages_ids] if plages_ids else None
+        )
+        resultat = optimiseur.optimiser()
+        
+        if request.method == 'POST' and data.get('appliquer'):
+            resultat['ecriture'] = optimiseur.appliquer(cree_par=request.user)
+        
+        return JsonResponse({
+            'success': True,
+            'optimization': resultat
+        })
+        
+    except (json.JSONDecodeError, ValueError, TypeError, AttributeError):
+        return JsonResponse({
+            'success': False,
+            'message': 'Paramètres invalides'
+        }, status=400)
+    except Exception as e:
+        logger.error(f"Erreur dans api_optimize_schedules: {e}")
+        return JsonResponse({
+            'success': False,
+            'message': f'Erreur serveur: {str(e)}'
+        }, status=500)
\ No newline at end of file
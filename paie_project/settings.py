@@ -89,6 +89,31 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Le cache doit être partagé entre tous les processus (serveurs web, worker
+# traiter_file_pointage) : état de pointage du jour, générations d'invalidation
+# des index et pages en cache. Le cache mémoire par défaut de Django est propre
+# à chaque processus et laisserait les autres workers sur des données périmées.
+# Redis si REDIS_URL est défini, sinon fichiers locaux (serveur unique).
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': BASE_DIR / 'cache',
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 